@@ -2,10 +2,9 @@ from django.shortcuts import render, redirect
 from django.contrib.auth import login
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.views.generic import TemplateView
-from django.utils import timezone
 
 from accounts.forms import UserRegistrationForm
-from core.models import Enrollment, Semester, Assignment
+from core.dashboard import student_summary
 
 
 def register(request):
@@ -38,21 +37,6 @@ class DashboardView(LoginRequiredMixin, TemplateView):
         user = self.request.user
 
         if user.role == 'student':
-            current_semester = Semester.objects.filter(is_current=True).first()
-            if current_semester:
-                current_courses = Enrollment.objects.filter(
-                    student=user,
-                    course_offering__semester=current_semester,
-                    is_active=True
-                )
-                context['current_courses_count'] = current_courses.count()
-            else:
-                context['current_courses_count'] = 0
-
-            
-            pending_assignments = Assignment.objects.filter(
-                due_date__gte=timezone.now().date()
-            ).count()
-            context['pending_assignments'] = pending_assignments
+            context.update(student_summary(user))
 
         return context
@@ -1,15 +1,26 @@
 # core/admin.py
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.core.exceptions import ValidationError
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import NullIf
+from django.utils import timezone
 from django.utils.html import format_html
 from .models import (
     Assignment, Faculty, Department, ProgramType, Program, Course, 
     CoursePrerequisite, ProgramCurriculum, Semester,
-    CourseOffering, Enrollment, ProgramEnrollment,FinanceRecord
+    CourseOffering, Enrollment, ProgramEnrollment,FinanceRecord,
+    LibraryResourceCache, OfferingMeeting, StudentAccount, TranscriptSummary, WaitlistEntry, AIJob, AIUsage
 )
+from .ai_metrics import LATENCY_BUCKETS_MS
+from .library_cache import invalidate_course_resources
+from .billing import charge_semester_fees, describe_charges
+from .prerequisite_graph import MAX_CHAIN_DEPTH, prerequisite_graph
 
 @admin.register(Faculty)
 class FacultyAdmin(admin.ModelAdmin):
     list_display = ('code', 'name', 'dean', 'created_at')
+    list_select_related = ('dean',)
     list_filter = ('created_at',)
     search_fields = ('code', 'name', 'dean__username', 'dean__first_name', 'dean__last_name')
     readonly_fields = ('created_at', 'updated_at')
@@ -29,6 +40,7 @@ class FacultyAdmin(admin.ModelAdmin):
 @admin.register(Department)
 class DepartmentAdmin(admin.ModelAdmin):
     list_display = ('faculty', 'code', 'name', 'head_of_department', 'created_at')
+    list_select_related = ('faculty', 'head_of_department')
     list_filter = ('faculty', 'created_at')
     search_fields = ('code', 'name', 'faculty__name', 'head_of_department__username')
     readonly_fields = ('created_at', 'updated_at')
@@ -61,8 +73,9 @@ class ProgramAdmin(admin.ModelAdmin):
     list_display = (
         'code', 'name', 'department', 'program_type', 'category',
         'tuition_fee', 'registration_fee', 'exam_fee', 'other_fees',
-        'is_active', 'total_credits'
+        'is_active', 'total_credits', 'current_students_count'
     )
+    list_select_related = ('department__faculty', 'program_type')
     list_filter = ('department', 'program_type', 'category', 'is_active')
     search_fields = ('code', 'name', 'department__name')
     readonly_fields = ('created_at', 'updated_at', 'current_students_count')
@@ -93,12 +106,43 @@ class ProgramAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            _current_students=Count('enrollments', filter=Q(enrollments__is_active=True))
+        )
+
     def current_students_count(self, obj):
-        return obj.current_students_count()
+        return obj._current_students
     current_students_count.short_description = 'Current Students'
+    current_students_count.admin_order_field = '_current_students'
+
+class CoursePrerequisiteForm(forms.ModelForm):
+    """Rejects prerequisites that would create a cycle or an impossibly long chain."""
+
+    class Meta:
+        model = CoursePrerequisite
+        fields = '__all__'
+
+    def clean(self):
+        cleaned_data = super().clean()
+        course = cleaned_data.get('course')
+        course_id = course.pk if course else self.instance.course_id  # inlines leave out 'course'
+        prerequisite = cleaned_data.get('prerequisite')
+        if course_id is None or prerequisite is None:
+            return cleaned_data
+
+        if prerequisite_graph.would_create_cycle(course_id, prerequisite.pk):
+            raise ValidationError(f"{prerequisite.code} already requires this course; that would create a cycle.")
+        depth = prerequisite_graph.chain_depth(prerequisite.pk)
+        if depth is not None and depth + 1 > MAX_CHAIN_DEPTH:
+            raise ValidationError(
+                f"This would make a prerequisite chain of {depth + 1} courses (the limit is {MAX_CHAIN_DEPTH})."
+            )
+        return cleaned_data
 
 class CoursePrerequisiteInline(admin.TabularInline):
     model = CoursePrerequisite
+    form = CoursePrerequisiteForm
     fk_name = 'course'
     extra = 1
     verbose_name = "Prerequisite"
@@ -107,10 +151,12 @@ class CoursePrerequisiteInline(admin.TabularInline):
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
     list_display = ('code', 'name', 'department', 'credits', 'level', 'course_type', 'is_active', 'enrolled_students_count')
+    list_select_related = ('department__faculty',)
     list_filter = ('department', 'level', 'course_type', 'is_active')
     search_fields = ('code', 'name', 'department__name')
     readonly_fields = ('created_at', 'updated_at', 'enrolled_students_count')
     inlines = [CoursePrerequisiteInline]
+    actions = ['clear_library_cache']
     fieldsets = (
         ('Basic Information', {
             'fields': ('department', 'code', 'name', 'description')
@@ -132,16 +178,34 @@ class CourseAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            _enrolled_students=Count('offerings__enrollments', filter=Q(offerings__enrollments__is_active=True))
+        )
+
     def enrolled_students_count(self, obj):
-        return obj.enrolled_students_count()
+        return obj._enrolled_students
     enrolled_students_count.short_description = 'Enrolled Students'
+    enrolled_students_count.admin_order_field = '_enrolled_students'
+
+    def clear_library_cache(self, request, queryset):
+        deleted = invalidate_course_resources(queryset)
+        self.message_user(request, f"Cleared {deleted} cached library recommendation(s).")
+    clear_library_cache.short_description = 'Clear cached AI library resources'
 
 @admin.register(CoursePrerequisite)
 class CoursePrerequisiteAdmin(admin.ModelAdmin):
-    list_display = ('course', 'prerequisite', 'is_mandatory', 'minimum_grade')
+    form = CoursePrerequisiteForm
+    list_display = ('course', 'prerequisite', 'is_mandatory', 'minimum_grade', 'chain_depth')
+    list_select_related = ('course', 'prerequisite')
     list_filter = ('is_mandatory',)
     search_fields = ('course__code', 'course__name', 'prerequisite__code', 'prerequisite__name')
 
+    def chain_depth(self, obj):
+        depth = prerequisite_graph.chain_depth(obj.course_id)
+        return "cycle" if depth is None else depth
+    chain_depth.short_description = 'Chain Depth'
+
 class ProgramCurriculumInline(admin.TabularInline):
     model = ProgramCurriculum
     extra = 1
@@ -151,6 +215,7 @@ class ProgramCurriculumInline(admin.TabularInline):
 @admin.register(ProgramCurriculum)
 class ProgramCurriculumAdmin(admin.ModelAdmin):
     list_display = ('program', 'course', 'semester', 'is_required', 'credits_contribution')
+    list_select_related = ('program', 'course')
     list_filter = ('program', 'semester', 'is_required')
     search_fields = ('program__code', 'program__name', 'course__code', 'course__name')
     list_editable = ('semester', 'is_required', 'credits_contribution')
@@ -161,6 +226,7 @@ class SemesterAdmin(admin.ModelAdmin):
     list_filter = ('is_current',)
     search_fields = ('name', 'code')
     readonly_fields = ('registration_status',)
+    actions = ['charge_fees']
     fieldsets = (
         ('Semester Information', {
             'fields': ('name', 'code', 'is_current')
@@ -185,6 +251,13 @@ class SemesterAdmin(admin.ModelAdmin):
             return format_html('<span style="color: red;">Registration Closed</span>')
     registration_status.short_description = 'Registration Status'
 
+    def charge_fees(self, request, queryset):
+        for semester in queryset:
+            charges = charge_semester_fees(semester)
+            level = messages.WARNING if charges.billed_upfront and not charges.charged else messages.SUCCESS
+            self.message_user(request, describe_charges(semester, charges), level)
+    charge_fees.short_description = 'Charge semester fees to active program enrollments'
+
 class EnrollmentInline(admin.TabularInline):
     model = Enrollment
     extra = 0
@@ -194,13 +267,21 @@ class EnrollmentInline(admin.TabularInline):
     verbose_name = "Student Enrollment"
     verbose_name_plural = "Student Enrollments"
 
+class OfferingMeetingInline(admin.TabularInline):
+    model = OfferingMeeting
+    extra = 0
+    fields = ('day', 'start_time', 'end_time', 'room')
+    verbose_name = "Meeting"
+    verbose_name_plural = "Weekly Meetings"
+
 @admin.register(CourseOffering)
 class CourseOfferingAdmin(admin.ModelAdmin):
     list_display = ('course', 'semester', 'section', 'lecturer', 'room', 'capacity', 'enrolled', 'available_seats_display', 'is_active')
+    list_select_related = ('course', 'semester', 'lecturer')
     list_filter = ('semester', 'course__department', 'is_active')
     search_fields = ('course__code', 'course__name', 'lecturer__username', 'lecturer__first_name')
     readonly_fields = ('enrolled', 'available_seats', 'is_full')
-    inlines = [EnrollmentInline]
+    inlines = [OfferingMeetingInline, EnrollmentInline]
     fieldsets = (
         ('Basic Information', {
             'fields': ('course', 'semester', 'section', 'is_active')
@@ -213,6 +294,38 @@ class CourseOfferingAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        offering = form.instance
+        if 'capacity' in form.changed_data:
+            # Extra seats go to the waitlist first
+            WaitlistEntry.objects.promote(offering)
+        meetings_edited = any(
+            formset.model is OfferingMeeting and formset.has_changed() for formset in formsets
+        )
+        # A new schedule text replaces the meetings parsed from the old one,
+        # unless the meetings themselves were edited in the same save
+        if ('schedule' in form.changed_data and not meetings_edited) or (
+            offering.schedule and not offering.meetings.exists()
+        ):
+            offering.sync_meetings_from_schedule()
+        else:
+            if 'semester' in form.changed_data:
+                offering.meetings.update(semester=offering.semester)
+            if 'room' in form.changed_data:
+                # Meetings that used the offering's room follow it; explicit rooms stay
+                old_room = form.initial.get('room')
+                offering.meetings.filter(Q(room=old_room) | Q(room__isnull=True) | Q(room='')).update(
+                    room=offering.room
+                )
+        if {'schedule', 'room', 'semester'} & set(form.changed_data):
+            for meeting in offering.meetings.select_related('offering'):
+                for other in meeting.room_conflicts():
+                    self.message_user(
+                        request, f"Room {meeting.room} clashes with {other.offering} on {meeting}.",
+                        level=messages.WARNING
+                    )
+
     def available_seats_display(self, obj):
         seats = obj.available_seats()
         if seats > 10:
@@ -223,6 +336,7 @@ class CourseOfferingAdmin(admin.ModelAdmin):
             color = 'red'
         return format_html(f'<span style="color: {color}; font-weight: bold;">{seats}</span>')
     available_seats_display.short_description = 'Available Seats'
+    available_seats_display.admin_order_field = F('capacity') - F('enrolled')
 
     def available_seats(self, obj):
         return obj.available_seats()
@@ -236,6 +350,7 @@ class CourseOfferingAdmin(admin.ModelAdmin):
 @admin.register(Enrollment)
 class EnrollmentAdmin(admin.ModelAdmin):
     list_display = ('student', 'course_offering', 'enrollment_date', 'grade', 'status', 'is_active')
+    list_select_related = ('student', 'course_offering__course', 'course_offering__semester')
     list_filter = ('course_offering__semester', 'grade', 'status', 'is_active')
     search_fields = ('student__username', 'student__first_name', 'student__last_name', 
                     'course_offering__course__code', 'course_offering__course__name')
@@ -262,6 +377,7 @@ class ProgramEnrollmentInline(admin.TabularInline):
 @admin.register(ProgramEnrollment)
 class ProgramEnrollmentAdmin(admin.ModelAdmin):
     list_display = ('student', 'program', 'enrollment_date', 'expected_graduation', 'status', 'current_semester', 'progress_display')
+    list_select_related = ('student', 'program')
     list_filter = ('program', 'status', 'is_active')
     search_fields = ('student__username', 'student__first_name', 'student__last_name', 
                     'program__code', 'program__name')
@@ -289,10 +405,13 @@ class ProgramEnrollmentAdmin(admin.ModelAdmin):
             color = 'red'
         return format_html(f'<span style="color: {color}; font-weight: bold;">{progress:.1f}%</span>')
     progress_display.short_description = 'Progress'
+    # credits_earned is kept current from the transcript, so progress needs no aggregate
+    progress_display.admin_order_field = F('credits_earned') * 1.0 / NullIf(F('program__total_credits'), 0)
 
     def credits_completed(self, obj):
         return obj.credits_completed()
     credits_completed.short_description = 'Credits Completed'
+    credits_completed.admin_order_field = 'credits_earned'
 
     def progress_percentage(self, obj):
         return obj.progress_percentage()
@@ -322,12 +441,13 @@ class FinanceRecordAdmin(admin.ModelAdmin):
         'description'
     )
     readonly_fields = ('balance_after', 'created_at', 'updated_at')
+    list_select_related = ('student', 'program')
     ordering = ('-transaction_date',)
     date_hierarchy = 'transaction_date'
 
     fieldsets = (
         ('Student & Program', {
-            'fields': ('student', 'program')
+            'fields': ('student', 'program', 'semester')
         }),
         ('Transaction Details', {
             'fields': ('transaction_type', 'description', 'amount')
@@ -341,14 +461,123 @@ class FinanceRecordAdmin(admin.ModelAdmin):
         }),
     )
     
+@admin.register(StudentAccount)
+class StudentAccountAdmin(admin.ModelAdmin):
+    list_display = ('student', 'program', 'opening_balance', 'billed_upfront', 'balance', 'updated_at')
+    list_filter = ('program', 'billed_upfront')
+    search_fields = ('student__username', 'student__first_name', 'student__last_name', 'program__code')
+    readonly_fields = ('student', 'program', 'opening_balance', 'billed_upfront', 'balance', 'updated_at')
+    list_select_related = ('student', 'program')
+
+@admin.register(TranscriptSummary)
+class TranscriptSummaryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'gpa', 'credits_earned', 'courses_completed', 'updated_at')
+    search_fields = ('student__username', 'student__first_name', 'student__last_name')
+    readonly_fields = ('student', 'credits_earned', 'graded_credits', 'quality_points', 'gpa',
+                       'courses_completed', 'updated_at')
+    list_select_related = ('student',)
+
 @admin.register(Assignment)
 class AssignmentAdmin(admin.ModelAdmin):
     list_display = ('title', 'lecturer', 'due_date', 'uploaded_at')
+    list_select_related = ('lecturer',)
     list_filter = ('due_date', 'uploaded_at', 'lecturer')
     search_fields = ('title', 'description', 'lecturer__username')
     ordering = ('-uploaded_at',)
 
+@admin.register(LibraryResourceCache)
+class LibraryResourceCacheAdmin(admin.ModelAdmin):
+    list_display = ('course', 'version', 'created_at', 'expires_at', 'is_expired')
+    list_filter = ('version', 'created_at')
+    search_fields = ('course__code', 'course__name')
+    readonly_fields = ('course', 'version', 'resources', 'created_at')
+    list_select_related = ('course',)
+    actions = ['invalidate']
+
+    def is_expired(self, obj):
+        return obj.is_expired()
+    is_expired.boolean = True
+    is_expired.short_description = 'Expired?'
+
+    def invalidate(self, request, queryset):
+        deleted, _ = queryset.delete()
+        self.message_user(request, f"Invalidated {deleted} cached library recommendation(s).")
+    invalidate.short_description = 'Invalidate selected cache entries'
+
+@admin.register(WaitlistEntry)
+class WaitlistEntryAdmin(admin.ModelAdmin):
+    list_display = ('offering', 'student', 'position', 'skipped_reason', 'created_at')
+    list_filter = ('offering__semester',)
+    search_fields = ('student__username', 'offering__course__code')
+    readonly_fields = ('created_at',)
+    list_select_related = ('offering__course', 'offering__semester', 'student')
+
+    def get_queryset(self, request):
+        ahead = WaitlistEntry.objects.filter(
+            offering=OuterRef('offering'), id__lte=OuterRef('id')
+        ).order_by().values('offering').annotate(count=Count('id')).values('count')
+        return super().get_queryset(request).annotate(_position=Subquery(ahead))
+
+    def position(self, obj):
+        return obj._position
+    position.admin_order_field = '_position'
+
+@admin.register(AIJob)
+class AIJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'user', 'status', 'attempts', 'queued_ms', 'run_ms', 'worker', 'created_at')
+    list_filter = ('status', 'kind', 'created_at')
+    search_fields = ('user__username', 'error')
+    readonly_fields = ('kind', 'user', 'payload', 'status', 'result', 'error', 'attempts', 'worker',
+                       'created_at', 'available_at', 'started_at', 'finished_at', 'run_ms')
+    list_select_related = ('user',)
+    actions = ['retry']
+
+    def queued_ms(self, obj):
+        return obj.queued_ms()
+    queued_ms.short_description = 'Queued (ms)'
+
+    def retry(self, request, queryset):
+        requeued = queryset.filter(status=AIJob.FAILED).update(
+            status=AIJob.QUEUED, attempts=0, error='', finished_at=None, available_at=timezone.now()
+        )
+        self.message_user(request, f"Requeued {requeued} failed job(s).")
+    retry.short_description = 'Retry selected failed jobs'
+
+@admin.register(AIUsage)
+class AIUsageAdmin(admin.ModelAdmin):
+    list_display = ('date', 'feature', 'requests', 'model_calls', 'cache_hits', 'fallbacks', 'errors',
+                    'prompt_tokens', 'response_tokens', 'p50_ms', 'p95_ms', 'average_ms', 'spend')
+    list_filter = ('feature', 'date')
+    date_hierarchy = 'date'
+    readonly_fields = [field.name for field in AIUsage._meta.fields]
+
+    def has_add_permission(self, request):
+        return False
+
+    def _latency(self, obj, percentile):
+        value = obj.latency_percentile(percentile)
+        if value is None and obj.model_calls:
+            return f'> {LATENCY_BUCKETS_MS[-1]}'
+        return value
+
+    def p50_ms(self, obj):
+        return self._latency(obj, 50)
+    p50_ms.short_description = 'p50 (ms)'
+
+    def p95_ms(self, obj):
+        return self._latency(obj, 95)
+    p95_ms.short_description = 'p95 (ms)'
+
+    def average_ms(self, obj):
+        return obj.average_latency()
+    average_ms.short_description = 'Avg (ms)'
+
+    def spend(self, obj):
+        return f'${obj.cost:.4f}'
+    spend.admin_order_field = 'cost'
+    spend.short_description = 'Spend (USD)'
+
 # Custom admin site header and title
 admin.site.site_header = "University AI Assistant Portal Administration"
 admin.site.site_title = "University Admin Portal"
-admin.site.index_title = "Welcome to University Administration"
\ No newline at end of file
+admin.site.index_title = "Welcome to University Administration"
@@ -1,24 +1,42 @@
 import re
-import google.genai as genai
+import json
+import logging
 from google.genai import types
-from django.conf import settings
+from core.ai_client import get_client
+from core.ai_metrics import ASSIGNMENT_CHAT
+from core.ai_limits import amodel_call, model_call, with_deadline
+from core.ai_stream import aiter_json_items
+
+MODEL = "gemini-2.0-flash"
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_TEXT = """
+[
+    {
+        "title": "General Guidance",
+        "description": "Our AI service is temporarily unavailable. Focus on your notes, textbooks, and online tutorials.",
+        "url": "https://www.google.com/search?q=assignment+help"
+    }
+]
+"""
 
 class AIAssignmentService:
-    def __init__(self):
-        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
+    @property
+    def client(self):
+        # Shared, lazily built client from the process-wide pool
+        return get_client()
 
-    def provide_guidance(self, student_text=None):
-        """
-        Returns AI-generated guidance, explanations, and tips for an assignment.
-        Does not automatically solve the assignment, but gives flexible support.
-        student_text: optional content student uploads (drafts, notes, code)
-        """
+    def _build_request(self, student_text=None, history=""):
         prompt = """
         You are an educational assistant helping a student understand and complete their assignment.
         Provide explanations, hints, strategies, and resources.
         It's okay to give example approaches or conceptual guidance,
         but do NOT simply provide the full answer.
         """
+        if history:
+            prompt += "\nConversation so far (use it to understand follow-up messages):\n" + history
+
         if student_text:
             prompt += f"\nThe student submitted the following content:\n{student_text}"
 
@@ -32,28 +50,82 @@ class AIAssignmentService:
 
         contents = [types.Content(role="user", parts=[types.Part.from_text(text=prompt)])]
         config = types.GenerateContentConfig(temperature=0.8, max_output_tokens=1200)
+        return contents, config
+
+    def _clean(self, text_output):
+        # Strip markdown code block formatting
+        return re.sub(r"^```json\s*|\s*```$", "", text_output.strip(), flags=re.MULTILINE)
+
+    def provide_guidance(self, student_text=None, history=""):
+        """
+        Returns AI-generated guidance, explanations, and tips for an assignment.
+        Does not automatically solve the assignment, but gives flexible support.
+        student_text: optional content student uploads (drafts, notes, code)
+        history: earlier turns of the conversation, from core.ai_memory
+        """
+        contents, config = self._build_request(student_text, history)
 
         text_output = ""
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=contents,
-                config=config
-            )
+            with model_call(ASSIGNMENT_CHAT, MODEL) as call:
+                response = self.client.models.generate_content(
+                    model=MODEL,
+                    contents=contents,
+                    config=with_deadline(config)
+                )
+                call.usage(response)
             text_output = response.text
         except Exception as e:
-            print("Gemini API error:", e)
-            text_output = """
-            [
-                {
-                    "title": "General Guidance",
-                    "description": "Our AI service is temporarily unavailable. Focus on your notes, textbooks, and online tutorials.",
-                    "url": "https://www.google.com/search?q=assignment+help"
-                }
-            ]
-            """
+            logger.warning("Gemini API error: %s", e)
+            text_output = FALLBACK_TEXT
 
-        # Strip markdown code block formatting
-        text_output = re.sub(r"^```json\s*|\s*```$", "", text_output.strip(), flags=re.MULTILINE)
+        return self._clean(text_output)
+
+    async def aprovide_guidance(self, student_text=None, history=""):
+        """
+        Async variant of provide_guidance() for ASGI views.
+        """
+        contents, config = self._build_request(student_text, history)
+
+        text_output = ""
+        try:
+            async with amodel_call(ASSIGNMENT_CHAT, MODEL) as call:
+                response = await self.client.aio.models.generate_content(
+                    model=MODEL,
+                    contents=contents,
+                    config=with_deadline(config)
+                )
+                call.usage(response)
+            text_output = response.text
+        except Exception as e:
+            logger.warning("Gemini API error: %s", e)
+            text_output = FALLBACK_TEXT
+
+        return self._clean(text_output)
+
+    async def astream_guidance(self, student_text=None, history=""):
+        """
+        Yields guidance items (title/description/url dicts) as soon as each
+        one is complete in the Gemini stream. Falls back to the static
+        guidance if the model fails before producing any item.
+        """
+        contents, config = self._build_request(student_text, history)
+
+        emitted = False
+        try:
+            # The slot is held until the stream is drained or abandoned
+            async with amodel_call(ASSIGNMENT_CHAT, MODEL, stream=True) as call:
+                chunks = await self.client.aio.models.generate_content_stream(
+                    model=MODEL,
+                    contents=contents,
+                    config=with_deadline(config)
+                )
+                async for item in aiter_json_items(call.atrack(chunks)):
+                    emitted = True
+                    yield item
+        except Exception as e:
+            logger.warning("Gemini API error: %s", e)
 
-        return text_output
+        if not emitted:
+            for item in json.loads(FALLBACK_TEXT):
+                yield item
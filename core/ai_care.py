@@ -1,23 +1,52 @@
 import re
-import google.genai as genai
+import json
+import logging
+from asgiref.sync import sync_to_async
 from google.genai import types
-from django.conf import settings
+from core.ai_client import get_client
+from core.ai_metrics import ACADEMIC_CHAT, record_event
+from core.ai_limits import amodel_call, model_call, with_deadline
+from core.ai_stream import aiter_json_items
+from core.ai_faq_cache import faq_cache, is_cacheable
+from core.ai_retrieval import academic_index, answer_fee_question
+
+MODEL = "gemini-2.0-flash"
+
+logger = logging.getLogger(__name__)
+
+# Portal records included in the prompt per question
+RETRIEVAL_TOP_K = 5
+
+FALLBACK_TEXT = """
+[
+    {
+        "title": "CUEA Guidance",
+        "description": "The AI service is temporarily unavailable. Please visit https://www.cuea.edu for official information.",
+        "url": "https://www.cuea.edu"
+    }
+]
+"""
 
 class AcademicAIService:
-    def __init__(self):
-        # Initialize cuea AI client
-        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
+    @property
+    def client(self):
+        # Shared, lazily built client from the process-wide pool
+        return get_client()
 
-    def provide_guidance(self, question_text=None):
-        """
-        Returns AI-generated guidance specifically about CUEA.
-        """
+    def _build_request(self, question_text=None, context=None, history=""):
         prompt = """
         You are an AI assistant for CUEA (Catholic University of Eastern Africa).
         Provide accurate, clear, and helpful answers to questions about CUEA programs, courses, faculties, departments, admission, and other academic information.
         Emphasize important terms using **bold**. Explain concepts clearly.
         """
 
+        if context:
+            prompt += "\nUse these records from the CUEA portal as the source of truth:\n"
+            prompt += "\n".join(f"- {line}" for line in context)
+
+        if history:
+            prompt += "\nConversation so far (use it to understand follow-up questions):\n" + history
+
         if question_text:
             prompt += f"\nUser question: {question_text}"
 
@@ -30,26 +59,127 @@ class AcademicAIService:
 
         contents = [types.Content(role="user", parts=[types.Part.from_text(text=prompt)])]
         config = types.GenerateContentConfig(temperature=0.8, max_output_tokens=1200)
+        return contents, config
+
+    def _prepare(self, question_text=None, history=""):
+        """
+        Returns (direct_answer, contents, config). Fee questions are answered
+        straight from the database; everything else gets the top matching
+        portal records as grounding. This is the only step touching the DB.
+        """
+        direct = answer_fee_question(question_text)
+        if direct is not None:
+            return json.dumps(direct), None, None
+
+        context = []
+        if question_text:
+            context = [summary for _, summary, _ in academic_index.search(question_text, RETRIEVAL_TOP_K)]
+        contents, config = self._build_request(question_text, context, history)
+        return None, contents, config
+
+    def _clean(self, text_output):
+        # Remove markdown code blocks if present
+        return re.sub(r"^```json\s*|\s*```$", "", text_output.strip(), flags=re.MULTILINE)
+
+    def provide_guidance(self, question_text=None, history=""):
+        """
+        Returns AI-generated guidance specifically about CUEA.
+        Near-duplicate questions are answered from the local FAQ cache,
+        except follow-ups (non-empty history), whose meaning depends on context.
+        """
+        cached = None if history else faq_cache.lookup(question_text)
+        if cached is not None:
+            record_event(ACADEMIC_CHAT, cache="hit")
+            return cached
+
+        direct, contents, config = self._prepare(question_text, history)
+        if direct is not None:
+            return direct
 
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=contents,
-                config=config
-            )
-            text_output = response.text
+            with model_call(ACADEMIC_CHAT, MODEL, cache=None if history else "miss") as call:
+                response = self.client.models.generate_content(
+                    model=MODEL,
+                    contents=contents,
+                    config=with_deadline(config)
+                )
+                call.usage(response)
+            text_output = self._clean(response.text)
+            if not history and is_cacheable(text_output):
+                faq_cache.store(question_text, text_output)
         except Exception as e:
-            print("Gemini API error:", e)
-            text_output = """
-            [
-                {
-                    "title": "CUEA Guidance",
-                    "description": "The AI service is temporarily unavailable. Please visit https://www.cuea.edu for official information.",
-                    "url": "https://www.cuea.edu"
-                }
-            ]
-            """
+            logger.warning("Gemini API error: %s", e)
+            text_output = self._clean(FALLBACK_TEXT)
 
-        # Remove markdown code blocks if present
-        text_output = re.sub(r"^```json\s*|\s*```$", "", text_output.strip(), flags=re.MULTILINE)
         return text_output
+
+    async def aprovide_guidance(self, question_text=None, history=""):
+        """
+        Async variant of provide_guidance() for ASGI views.
+        """
+        cached = None if history else faq_cache.lookup(question_text)
+        if cached is not None:
+            record_event(ACADEMIC_CHAT, cache="hit")
+            return cached
+
+        direct, contents, config = await sync_to_async(self._prepare)(question_text, history)
+        if direct is not None:
+            return direct
+
+        try:
+            async with amodel_call(ACADEMIC_CHAT, MODEL, cache=None if history else "miss") as call:
+                response = await self.client.aio.models.generate_content(
+                    model=MODEL,
+                    contents=contents,
+                    config=with_deadline(config)
+                )
+                call.usage(response)
+            text_output = self._clean(response.text)
+            if not history and is_cacheable(text_output):
+                faq_cache.store(question_text, text_output)
+        except Exception as e:
+            logger.warning("Gemini API error: %s", e)
+            text_output = self._clean(FALLBACK_TEXT)
+
+        return text_output
+
+    async def astream_guidance(self, question_text=None, history=""):
+        """
+        Yields guidance items (title/description/url dicts) as soon as each
+        one is complete in the Gemini stream. Falls back to the static
+        guidance if the model fails before producing any item.
+        """
+        cached = None if history else faq_cache.lookup(question_text)
+        if cached is not None:
+            record_event(ACADEMIC_CHAT, cache="hit")
+            for item in json.loads(cached):
+                yield item
+            return
+
+        direct, contents, config = await sync_to_async(self._prepare)(question_text, history)
+        if direct is not None:
+            for item in json.loads(direct):
+                yield item
+            return
+
+        items = []
+        try:
+            # The slot is held until the stream is drained or abandoned
+            async with amodel_call(ACADEMIC_CHAT, MODEL, stream=True, cache=None if history else "miss") as call:
+                chunks = await self.client.aio.models.generate_content_stream(
+                    model=MODEL,
+                    contents=contents,
+                    config=with_deadline(config)
+                )
+                async for item in aiter_json_items(call.atrack(chunks)):
+                    items.append(item)
+                    yield item
+        except Exception as e:
+            logger.warning("Gemini API error: %s", e)
+        else:
+            if items and not history:
+                faq_cache.store(question_text, json.dumps(items))
+
+        if not items:
+            for item in json.loads(FALLBACK_TEXT):
+                yield item
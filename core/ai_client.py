@@ -0,0 +1,83 @@
+import asyncio
+import atexit
+import logging
+import threading
+
+import httpx
+import google.genai as genai
+from google.genai import types
+from django.conf import settings
+
+# Keep-alive pool shared by every request made through one client, so the
+# TLS handshake to the Gemini endpoint is paid once per process instead of
+# once per chat message.
+POOL_LIMITS = dict(max_connections=20, max_keepalive_connections=10, keepalive_expiry=60)
+
+logger = logging.getLogger(__name__)
+
+_clients = {}
+_lock = threading.Lock()
+_shutdown_registered = False
+_closing = set()  # pending async closes, referenced until done
+
+
+def _build_client(api_key):
+    http_options = types.HttpOptions(
+        client_args={"limits": httpx.Limits(**POOL_LIMITS)},
+        async_client_args={"limits": httpx.Limits(**POOL_LIMITS)},
+    )
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def get_client(api_key=None):
+    """
+    Returns the process-wide Gemini client for the given API key.
+    The client is built lazily on first use and reused afterwards.
+    """
+    global _shutdown_registered
+    api_key = api_key or settings.GEMINI_API_KEY
+
+    client = _clients.get(api_key)
+    if client is not None:
+        return client
+
+    with _lock:
+        client = _clients.get(api_key)
+        if client is None:
+            client = _build_client(api_key)
+            _clients[api_key] = client
+            if not _shutdown_registered:
+                atexit.register(close_clients)
+                _shutdown_registered = True
+    return client
+
+
+def _close(client):
+    client.close()
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    if loop is None:
+        asyncio.run(client.aio.aclose())
+    else:
+        # Called from async code: the pool closes once the running loop gets to it
+        _closing.add(task := loop.create_task(client.aio.aclose()))
+        task.add_done_callback(_closing.discard)
+
+
+def close_clients():
+    """
+    Closes the sync and async transports of every pooled client and empties
+    the registry. Safe to call more than once; the next get_client() builds
+    a fresh client.
+    """
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+
+    for client in clients:
+        try:
+            _close(client)
+        except Exception as e:
+            logger.warning("Gemini client close error: %s", e)
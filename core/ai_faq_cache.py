@@ -0,0 +1,163 @@
+import json
+import math
+import re
+import threading
+import time
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+N_FEATURES = 2 ** 12
+
+STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "do", "does", "did",
+    "i", "me", "my", "we", "you", "your", "it", "its", "of", "for", "to", "in",
+    "on", "at", "and", "or", "can", "could", "would", "should", "please", "tell",
+    "about", "what", "whats", "how", "which", "there", "any", "with",
+}
+
+
+def normalize(text):
+    """Lowercases, strips punctuation and stopwords, and folds simple plurals."""
+    words = re.findall(r"[a-z0-9]+", (text or "").lower())
+    normalized = []
+    for word in words:
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        normalized.append(word)
+    return normalized
+
+
+class HashingVectorizer:
+    """
+    Maps text to a fixed-size, L2-normalised vector of hashed unigrams and
+    bigrams with sublinear term frequency. No vocabulary or network needed.
+    """
+
+    def __init__(self, n_features=N_FEATURES):
+        self.n_features = n_features
+
+    def features(self, text):
+        words = normalize(text)
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def transform(self, text):
+        counts = {}
+        for feature in self.features(text):
+            h = zlib.crc32(feature.encode("utf-8"))
+            index = h % self.n_features
+            sign = 1.0 if (h >> 31) & 1 == 0 else -1.0
+            counts[index] = counts.get(index, 0.0) + sign
+
+        vector = np.zeros(self.n_features, dtype=np.float32)
+        for index, value in counts.items():
+            vector[index] = math.copysign(1.0 + math.log(abs(value)), value) if value else 0.0
+
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+
+class FAQCache:
+    """
+    Answer cache for near-duplicate questions. Questions are embedded with
+    HashingVectorizer and matched by cosine similarity against a NumPy
+    matrix of stored questions.
+    Entries are evicted when older than max_age, when the cache is full
+    (oldest first), and all at once via clear() when portal data changes.
+    """
+
+    def __init__(self, threshold=0.85, max_age=24 * 3600, max_entries=1000):
+        self.threshold = threshold
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self.vectorizer = HashingVectorizer()
+        self._lock = threading.Lock()
+        self._reset()
+        self.hits = 0
+        self.misses = 0
+
+    def _reset(self):
+        self._matrix = np.zeros((0, self.vectorizer.n_features), dtype=np.float32)
+        self._answers = []
+        self._created = np.zeros(0, dtype=np.float64)
+
+    def _evict_expired(self, now):
+        if not len(self._answers):
+            return
+        keep = self._created > now - self.max_age
+        if keep.all():
+            return
+        self._matrix = self._matrix[keep]
+        self._created = self._created[keep]
+        self._answers = [a for a, k in zip(self._answers, keep) if k]
+
+    def lookup(self, question):
+        """Returns the cached answer for a similar question, or None."""
+        if not question:
+            return None
+        vector = self.vectorizer.transform(question)
+
+        with self._lock:
+            self._evict_expired(time.time())
+            if len(self._answers) and vector.any():
+                scores = self._matrix @ vector
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.hits += 1
+                    return self._answers[best]
+            self.misses += 1
+            return None
+
+    def store(self, question, answer):
+        if not question:
+            return
+        vector = self.vectorizer.transform(question)
+        if not vector.any():
+            return
+
+        with self._lock:
+            now = time.time()
+            self._evict_expired(now)
+            if len(self._answers) >= self.max_entries:
+                overflow = len(self._answers) - self.max_entries + 1
+                self._matrix = self._matrix[overflow:]
+                self._created = self._created[overflow:]
+                self._answers = self._answers[overflow:]
+
+            self._matrix = np.vstack([self._matrix, vector])
+            self._created = np.append(self._created, now)
+            self._answers.append(answer)
+
+    def clear(self):
+        with self._lock:
+            self._reset()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._answers),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+def is_cacheable(text_output):
+    """Only well-formed JSON answers are worth replaying."""
+    try:
+        return isinstance(json.loads(text_output), list)
+    except (TypeError, ValueError):
+        return False
+
+
+faq_cache = FAQCache(
+    threshold=getattr(settings, "FAQ_CACHE_THRESHOLD", 0.85),
+    max_age=getattr(settings, "FAQ_CACHE_MAX_AGE", 24 * 3600),
+    max_entries=getattr(settings, "FAQ_CACHE_MAX_ENTRIES", 1000),
+)
@@ -0,0 +1,351 @@
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+
+from django.conf import settings
+from google.genai import errors, types
+
+from core.ai_metrics import ModelCallRecord
+
+# Outbound Gemini calls allowed at once in this process, across every core/ai_* service
+MAX_CONCURRENT_CALLS = getattr(settings, "AI_MAX_CONCURRENT_CALLS", 8)
+# Seconds a call waits for a free slot before giving up with ModelBusy
+CALL_QUEUE_TIMEOUT = getattr(settings, "AI_CALL_QUEUE_TIMEOUT", 5)
+# Per-user request budget for the chat endpoints: sustained rate and burst size
+USER_RATE_PER_MINUTE = getattr(settings, "AI_USER_RATE_PER_MINUTE", 10)
+USER_BURST = getattr(settings, "AI_USER_BURST", 5)
+# Consecutive failed calls that open the circuit, and seconds it stays open before a probe
+BREAKER_FAILURES = getattr(settings, "AI_BREAKER_FAILURES", 5)
+BREAKER_RESET = getattr(settings, "AI_BREAKER_RESET", 30)
+# Per-call deadline in seconds: starts at TIMEOUT_INITIAL, then follows observed latency within [MIN, MAX]
+TIMEOUT_INITIAL = getattr(settings, "AI_TIMEOUT_INITIAL", 20)
+TIMEOUT_MIN = getattr(settings, "AI_TIMEOUT_MIN", 3)
+TIMEOUT_MAX = getattr(settings, "AI_TIMEOUT_MAX", 60)
+
+
+class ModelBusy(Exception):
+    """Raised when no model-call slot frees up in time; callers serve their fallback."""
+
+
+class CircuitOpen(ModelBusy):
+    """Raised without calling the model while the circuit breaker is open."""
+
+
+class TokenBucket:
+    """
+    Per-key token buckets held in process memory. Each key refills at `rate`
+    tokens per second up to `burst`; a request spends one token.
+    """
+
+    MAX_KEYS = 10000
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._buckets = {}  # key -> (tokens, last refill time)
+        self.limited = 0
+
+    def take(self, key):
+        """Spends a token for `key`. Returns 0 when allowed, else seconds until the next token."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0
+            else:
+                self._buckets[key] = (tokens, now)
+                self.limited += 1
+                wait = (1 - tokens) / self.rate
+            if len(self._buckets) > self.MAX_KEYS:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        # Buckets that have refilled completely behave exactly like new ones
+        full = [key for key, (tokens, updated) in self._buckets.items()
+                if tokens + (now - updated) * self.rate >= self.burst]
+        for key in full:
+            del self._buckets[key]
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class ModelCallLimiter:
+    """
+    Global cap on concurrent model calls. Callers queue for a slot for up to
+    `timeout` seconds, then get ModelBusy. Keeps counters for the stats view.
+    """
+
+    def __init__(self, limit, timeout):
+        self.limit = limit
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(limit)
+        self._lock = threading.Lock()
+        self.active = self.waiting = self.peak_waiting = 0
+        self.admitted = self.rejected = 0
+
+    def _queue(self):
+        with self._lock:
+            self.waiting += 1
+            self.peak_waiting = max(self.peak_waiting, self.waiting)
+
+    def _dequeue(self, acquired):
+        with self._lock:
+            self.waiting -= 1
+            if acquired:
+                self.active += 1
+                self.admitted += 1
+            else:
+                self.rejected += 1
+        if not acquired:
+            raise ModelBusy(f"All {self.limit} model call slots busy for {self.timeout}s")
+
+    def _release(self):
+        with self._lock:
+            self.active -= 1
+        self._slots.release()
+
+    @contextmanager
+    def slot(self):
+        self._queue()
+        self._dequeue(self._slots.acquire(timeout=self.timeout))
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """Async variant of slot(); polls so a cancelled request never leaks a slot."""
+        self._queue()
+        deadline = time.monotonic() + self.timeout
+        acquired = self._slots.acquire(blocking=False)
+        try:
+            while not acquired and time.monotonic() < deadline:
+                await asyncio.sleep(0.05)
+                acquired = self._slots.acquire(blocking=False)
+        except BaseException:
+            # Cancelled while waiting; no slot is held at this point
+            with self._lock:
+                self.waiting -= 1
+            raise
+        self._dequeue(acquired)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "active": self.active,
+                "waiting": self.waiting,
+                "peak_waiting": self.peak_waiting,
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+            }
+
+
+class CircuitBreaker:
+    """
+    Stops calling the model after `failures` consecutive failures. While open,
+    calls fail at once with CircuitOpen; after `reset_timeout` seconds one probe
+    call is let through (half-open) and its outcome closes or reopens the circuit.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half-open'
+
+    def __init__(self, failures, reset_timeout):
+        self.failure_threshold = failures
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = 0
+            self.probing = False
+            self.opened = self.short_circuited = 0
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+            if self.state == self.CLOSED:
+                return
+            if self.state == self.HALF_OPEN and not self.probing:
+                self.probing = True
+                return
+            self.short_circuited += 1
+        raise CircuitOpen(f"Model circuit {self.state}; serving fallback")
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self.probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def record_abandoned(self):
+        # The call never reached the model (or the caller went away): no verdict
+        with self._lock:
+            self.probing = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "opened": self.opened,
+                "short_circuited": self.short_circuited,
+            }
+
+
+class AdaptiveTimeout:
+    """
+    Call deadline that tracks observed latency the way TCP tracks round-trip
+    time: smoothed latency plus four times its mean deviation, clamped.
+    """
+
+    def __init__(self, initial, minimum, maximum):
+        self.initial, self.minimum, self.maximum = initial, minimum, maximum
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.smoothed = None
+            self.deviation = 0
+
+    def observe(self, seconds):
+        with self._lock:
+            if self.smoothed is None:
+                self.smoothed, self.deviation = seconds, seconds / 2
+            else:
+                self.deviation = 0.75 * self.deviation + 0.25 * abs(self.smoothed - seconds)
+                self.smoothed = 0.875 * self.smoothed + 0.125 * seconds
+
+    def current(self):
+        with self._lock:
+            if self.smoothed is None:
+                return self.initial
+            return min(self.maximum, max(self.minimum, self.smoothed + 4 * self.deviation))
+
+
+model_calls = ModelCallLimiter(MAX_CONCURRENT_CALLS, CALL_QUEUE_TIMEOUT)
+user_requests = TokenBucket(USER_RATE_PER_MINUTE / 60, USER_BURST)
+breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_RESET)
+deadline = AdaptiveTimeout(TIMEOUT_INITIAL, TIMEOUT_MIN, TIMEOUT_MAX)
+
+
+def _is_outage(error):
+    # Rejected requests (bad prompt, auth) mean the service is up; quota exhaustion does not
+    return not isinstance(error, errors.ClientError) or error.code == 429
+
+
+def with_deadline(config, seconds=None):
+    """A copy of the GenerateContentConfig with an explicit per-call deadline."""
+    timeout_ms = int((seconds or deadline.current()) * 1000)
+    return config.model_copy(update={"http_options": types.HttpOptions(timeout=timeout_ms)})
+
+
+def _record(error, started, stream):
+    if error is None:
+        breaker.record_success()
+        if not stream:
+            deadline.observe(time.monotonic() - started)
+    elif _is_outage(error):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+
+
+def _fail(call, error, fallback):
+    if isinstance(error, CircuitOpen):
+        call.fail("circuit_open", error, fallback)
+    elif isinstance(error, ModelBusy):
+        call.fail("busy", error, fallback)
+    else:
+        call.fail("error", error, fallback)
+
+
+@contextmanager
+def model_call(feature, model, stream=False, cache=None, fallback=True):
+    """
+    Guards and meters one outbound model call. Fails fast with CircuitOpen
+    while the breaker is open, holds a global slot, reports the outcome to
+    the breaker, and yields a ModelCallRecord for the caller to pass the
+    response (or stream) to. fallback: whether the caller serves a fallback
+    when the call fails.
+    """
+    call = ModelCallRecord(feature, model, cache=cache)
+    admitted = recorded = False
+    try:
+        breaker.before_call()
+        admitted = True
+        with model_calls.slot():
+            call.start()
+            try:
+                yield call
+            except Exception as e:
+                recorded = True
+                _record(e, call.started, stream)
+                raise
+            recorded = True
+            _record(None, call.started, stream)
+    except Exception as e:
+        _fail(call, e, fallback)
+        raise
+    except BaseException:
+        call.outcome = "abandoned"
+        raise
+    finally:
+        if admitted and not recorded:
+            breaker.record_abandoned()
+        call.finish()
+
+
+@asynccontextmanager
+async def amodel_call(feature, model, stream=False, cache=None, fallback=True):
+    call = ModelCallRecord(feature, model, cache=cache)
+    admitted = recorded = False
+    try:
+        breaker.before_call()
+        admitted = True
+        async with model_calls.aslot():
+            call.start()
+            try:
+                yield call
+            except Exception as e:
+                recorded = True
+                _record(e, call.started, stream)
+                raise
+            recorded = True
+            _record(None, call.started, stream)
+    except Exception as e:
+        _fail(call, e, fallback)
+        raise
+    except BaseException:
+        call.outcome = "abandoned"
+        raise
+    finally:
+        if admitted and not recorded:
+            breaker.record_abandoned()
+        call.finish()
@@ -0,0 +1,102 @@
+from django.conf import settings
+
+# Recent turns kept word for word; older ones are folded into the summary
+MEMORY_WINDOW = getattr(settings, "AI_MEMORY_WINDOW", 4)
+# Upper bound on the folded summary of older turns
+SUMMARY_TOKENS = getattr(settings, "AI_MEMORY_SUMMARY_TOKENS", 300)
+# Hard cap on message + conversation context sent with one request
+CONTEXT_TOKEN_BUDGET = getattr(settings, "AI_CONTEXT_TOKEN_BUDGET", 3000)
+# Part of that budget conversation history may use; the message keeps the rest
+# and history never gets more than half
+HISTORY_TOKENS = getattr(settings, "AI_MEMORY_HISTORY_TOKENS", 800)
+# Longest stored user message or answer in the window
+TURN_TOKENS = getattr(settings, "AI_MEMORY_TURN_TOKENS", 400)
+
+CHARS_PER_TOKEN = 4  # close enough for English text with Gemini's tokenizer
+
+
+def estimate_tokens(text):
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_tokens(text, tokens):
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    return text[:max(limit - 3, 0)].rstrip() + "..."
+
+
+def _compact_answer(responses):
+    """Guidance cards reduced to what a follow-up needs: their titles and the gist."""
+    if not isinstance(responses, list):
+        return truncate_tokens(str(responses), TURN_TOKENS)
+    parts = []
+    for item in responses:
+        if isinstance(item, dict):
+            title, description = item.get("title", ""), item.get("description", "")
+            parts.append(f"{title}: {truncate_tokens(description, 60)}" if description else title)
+    return truncate_tokens(" | ".join(parts), TURN_TOKENS)
+
+
+def _summary_line(turn):
+    question = " ".join(turn["user"].split()[:25])
+    topics = ", ".join(part.split(":")[0] for part in turn["assistant"].split(" | ") if part)
+    return f"Asked: {question} -> covered: {topics}" if topics else f"Asked: {question}"
+
+
+class ConversationMemory:
+    """
+    A chat's recent turns and a compact summary of older ones, kept in the
+    user's session under one key per channel ("academic", "assignment").
+    """
+
+    def __init__(self, session, channel):
+        self.session = session
+        self.key = f"ai_memory:{channel}"
+
+    def _load(self):
+        return self.session.get(self.key) or {"summary": [], "turns": []}
+
+    def prepare(self, message):
+        """
+        Returns (message, history, shortened) for the next request, together
+        within CONTEXT_TOKEN_BUDGET. History is limited to its smaller share:
+        newest turns win and the summary fills what is left. A message longer
+        than the rest is cut, and shortened tells the caller to say so.
+        """
+        remaining = min(HISTORY_TOKENS, CONTEXT_TOKEN_BUDGET // 2)
+        message_tokens = CONTEXT_TOKEN_BUDGET - remaining
+        shortened = estimate_tokens(message) > message_tokens
+        message = truncate_tokens(message, message_tokens)
+        memory = self._load()
+
+        recent = []
+        for turn in reversed(memory["turns"]):
+            text = f"Student: {turn['user']}\nAssistant: {turn['assistant']}"
+            if estimate_tokens(text) > remaining:
+                break
+            recent.insert(0, text)
+            remaining -= estimate_tokens(text)
+
+        parts = []
+        if memory["summary"] and remaining > 0:
+            summary = "Earlier in this conversation: " + "; ".join(memory["summary"])
+            parts.append(truncate_tokens(summary, remaining))
+        return message, "\n".join(parts + recent), shortened
+
+    def record(self, message, responses):
+        """Appends a turn, folding turns beyond the window into the summary."""
+        memory = self._load()
+        memory["turns"].append({
+            "user": truncate_tokens(message, TURN_TOKENS),
+            "assistant": _compact_answer(responses),
+        })
+        while len(memory["turns"]) > MEMORY_WINDOW:
+            memory["summary"].append(_summary_line(memory["turns"].pop(0)))
+        # Oldest summary lines go first once the summary outgrows its budget
+        while memory["summary"] and estimate_tokens("; ".join(memory["summary"])) > SUMMARY_TOKENS:
+            memory["summary"].pop(0)
+        self.session[self.key] = memory
+
+    def clear(self):
+        self.session.pop(self.key, None)
@@ -0,0 +1,236 @@
+import asyncio
+import atexit
+import json
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from decimal import Decimal
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# AI features, as reported in the structured log and the AIUsage table
+ACADEMIC_CHAT = 'academic_chat'
+ASSIGNMENT_CHAT = 'assignment_chat'
+LIBRARY_RESOURCES = 'library_resources'
+GENERATE_QUESTIONS = 'generate_questions'
+GENERATE_TIMETABLE = 'generate_timetable'
+
+# USD per million (prompt, response) tokens; thinking tokens bill as response tokens
+MODEL_PRICES = getattr(settings, "AI_MODEL_PRICES", {
+    "gemini-2.0-flash": (Decimal("0.10"), Decimal("0.40")),
+    "gemini-2.5-flash": (Decimal("0.30"), Decimal("2.50")),
+})
+# Seconds between writes of the in-memory counters to the AIUsage table
+FLUSH_INTERVAL = getattr(settings, "AI_USAGE_FLUSH_INTERVAL", 10)
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 5000, 7500, 10000, 15000, 20000, 30000, 60000)
+
+_source = ContextVar("ai_source", default="")
+
+
+def ai_source(view):
+    """Tags model calls and cache hits made while serving this view with its name."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            _source.set(view.__name__)
+            return await view(request, *args, **kwargs)
+    else:
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            # Left set after the view returns, so streamed calls are tagged too
+            _source.set(view.__name__)
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def set_source(name):
+    _source.set(name)
+
+
+def cost(model, prompt_tokens, response_tokens):
+    prompt_price, response_price = MODEL_PRICES.get(model, (Decimal(0), Decimal(0)))
+    return (prompt_tokens * prompt_price + response_tokens * response_price) / 1000000
+
+
+class ModelCallRecord:
+    """What one model call (or a request answered without one) cost."""
+
+    def __init__(self, feature, model="", cache=None):
+        self.feature = feature
+        self.model = model
+        self.cache = cache  # "hit", "miss", or None where no cache applies
+        self.source = _source.get()
+        self.outcome = "ok"
+        self.error = ""
+        self.fallback = False
+        self.prompt_tokens = self.response_tokens = 0
+        self.started = None
+        self.latency_ms = None
+
+    def start(self):
+        self.started = time.monotonic()
+
+    def usage(self, response):
+        """Takes token counts from a response or stream chunk's usage_metadata."""
+        meta = getattr(response, "usage_metadata", None)
+        if meta is not None:
+            # Stream chunks carry running totals, so the last chunk wins
+            self.prompt_tokens = meta.prompt_token_count or 0
+            self.response_tokens = (meta.candidates_token_count or 0) + (meta.thoughts_token_count or 0)
+
+    def track(self, chunks):
+        """Passes stream chunks through while recording their usage."""
+        for chunk in chunks:
+            self.usage(chunk)
+            yield chunk
+
+    async def atrack(self, chunks):
+        """Async variant of track() for client.aio streams."""
+        async for chunk in chunks:
+            self.usage(chunk)
+            yield chunk
+
+    def fail(self, outcome, error, fallback):
+        self.outcome = outcome
+        self.error = str(error)[:200]
+        self.fallback = fallback
+
+    def finish(self):
+        if self.started is not None:
+            self.latency_ms = int((time.monotonic() - self.started) * 1000)
+        record(self)
+
+    def as_dict(self):
+        return {
+            "feature": self.feature,
+            "source": self.source,
+            "model": self.model,
+            "outcome": self.outcome,
+            "cache": self.cache,
+            "fallback": self.fallback,
+            "prompt_tokens": self.prompt_tokens,
+            "response_tokens": self.response_tokens,
+            "latency_ms": self.latency_ms,
+            "cost_usd": float(cost(self.model, self.prompt_tokens, self.response_tokens)),
+            "error": self.error,
+        }
+
+
+def record_event(feature, outcome="ok", cache=None, fallback=False):
+    """Records a request answered without calling the model (cache hit, rate limit)."""
+    call = ModelCallRecord(feature, cache=cache)
+    call.outcome, call.fallback = outcome, fallback
+    record(call)
+
+
+def _empty_row():
+    return {
+        "requests": 0, "model_calls": 0, "errors": 0, "fallbacks": 0, "cache_hits": 0,
+        "prompt_tokens": 0, "response_tokens": 0, "latency_ms_total": 0, "cost": Decimal(0),
+        "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+    }
+
+
+def _on_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class UsageAggregator:
+    """
+    Sums records per (day, feature) in memory and adds them to the
+    AIUsage table every FLUSH_INTERVAL seconds, so a model call costs no
+    extra query of its own. Rows that fail to save are kept for the next flush.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._last_flush = time.monotonic()
+        self._flusher = None
+
+    def add(self, call):
+        key = (timezone.localdate(), call.feature)
+        with self._lock:
+            row = self._pending.get(key)
+            if row is None:
+                row = self._pending[key] = _empty_row()
+            row["requests"] += 1
+            row["errors"] += call.outcome not in ("ok", "rate_limited")
+            row["fallbacks"] += call.fallback
+            row["cache_hits"] += call.cache == "hit"
+            if call.latency_ms is not None:
+                row["model_calls"] += 1
+                row["prompt_tokens"] += call.prompt_tokens
+                row["response_tokens"] += call.response_tokens
+                row["latency_ms_total"] += call.latency_ms
+                row["cost"] += cost(call.model, call.prompt_tokens, call.response_tokens)
+                row["histogram"][bisect_left(LATENCY_BUCKETS_MS, call.latency_ms)] += 1
+            due = time.monotonic() - self._last_flush >= FLUSH_INTERVAL
+            if due:
+                self._last_flush = time.monotonic()
+        if not due:
+            return
+        if _on_event_loop():
+            # The ORM may not run on the event loop, so async views flush from a thread
+            self._flusher = threading.Thread(target=self._flush_in_thread, daemon=True)
+            self._flusher.start()
+        else:
+            self.flush()
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            connections.close_all()
+
+    def flush(self):
+        from .models import AIUsage
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._last_flush = time.monotonic()
+        failed = {}
+        for (day, feature), row in pending.items():
+            try:
+                with transaction.atomic():
+                    usage, _ = AIUsage.objects.select_for_update().get_or_create(date=day, feature=feature)
+                    usage.add(row)
+                    usage.save()
+            except Exception:
+                logger.exception("Could not save AI usage for %s on %s", feature, day)
+                failed[day, feature] = row
+        if failed:
+            self._restore(failed)
+
+    def _restore(self, failed):
+        """Puts unsaved rows back, adding to whatever was recorded meanwhile."""
+        with self._lock:
+            for key, row in failed.items():
+                current = self._pending.setdefault(key, _empty_row())
+                for field, value in row.items():
+                    if field == "histogram":
+                        current[field] = [a + b for a, b in zip(current[field], value)]
+                    else:
+                        current[field] += value
+
+
+usage = UsageAggregator()
+atexit.register(usage.flush)
+
+
+def record(call):
+    logger.info(json.dumps(call.as_dict()))
+    usage.add(call)
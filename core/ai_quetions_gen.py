@@ -1,13 +1,17 @@
-import os
-from google import genai
 from google.genai import types
 import json
 from django.utils.safestring import mark_safe
 import markdown
 import re
 
+from core.ai_client import get_client
+from core.ai_metrics import GENERATE_QUESTIONS
+from core.ai_limits import TIMEOUT_MAX, model_call, with_deadline
+
+MODEL = "gemini-2.5-flash"
+
 def generate_questions(course_name: str, topic: str, num_questions: int = 5) -> list:
-    client = genai.Client(api_key=os.environ.get("GEMINI_API_KEY"))
+    client = get_client()
 
     prompt_text = f"""
     You are an educational assistant.
@@ -27,14 +31,17 @@ def generate_questions(course_name: str, topic: str, num_questions: int = 5) ->
         thinking_config=types.ThinkingConfig(thinking_budget=-1)
     )
 
+    # ModelBusy and CircuitOpen propagate so the AI job is retried later.
+    # Thinking can delay the first chunk, so this call gets the longest deadline.
     response_text = ""
-    for chunk in client.models.generate_content_stream(
-        model="gemini-2.5-flash",
-        contents=contents,
-        config=generate_config
-    ):
-        if chunk.text:  # ✅ skip None
-            response_text += chunk.text
+    with model_call(GENERATE_QUESTIONS, MODEL, stream=True, fallback=False) as call:
+        for chunk in call.track(client.models.generate_content_stream(
+            model=MODEL,
+            contents=contents,
+            config=with_deadline(generate_config, TIMEOUT_MAX)
+        )):
+            if chunk.text:  # ✅ skip None
+                response_text += chunk.text
 
     # Clean up JSON
     response_text = response_text.strip()
@@ -0,0 +1,216 @@
+import math
+import re
+import threading
+from collections import Counter
+
+from core.ai_faq_cache import normalize
+from .models import (
+    Faculty, Department, Program, Course, ProgramCurriculum, Semester
+)
+
+FEE_WORDS = {"fee", "fees", "cost", "costs", "tuition", "price", "pay", "charge", "charges"}
+# Words common in fee questions that never single out one program
+PROGRAM_WORDS = {"program", "programme", "semester", "per", "total", "much", "student"}
+
+
+def _text(value, limit=200):
+    value = (value or "").strip()
+    return value if len(value) <= limit else value[:limit].rsplit(" ", 1)[0] + "..."
+
+
+def describe(instance):
+    """Returns (doc_id, summary) for a portal record, or None if unsupported."""
+    if isinstance(instance, Faculty):
+        summary = f"Faculty {instance.code} - {instance.name}. {_text(instance.description)}"
+    elif isinstance(instance, Department):
+        summary = (
+            f"Department {instance.code} - {instance.name}, "
+            f"Faculty {instance.faculty.code} - {instance.faculty.name}. {_text(instance.description)}"
+        )
+    elif isinstance(instance, Program):
+        summary = (
+            f"Program {instance.code} - {instance.name} ({instance.get_category_display()}), "
+            f"Department {instance.department.name}, {instance.duration} semesters, "
+            f"{instance.total_credits} credits. Fees per semester: {instance.total_fee_per_semester()} "
+            f"(tuition {instance.tuition_fee}, exam {instance.exam_fee}, other {instance.other_fees}); "
+            f"registration fee {instance.registration_fee}. {_text(instance.description)}"
+        )
+    elif isinstance(instance, Course):
+        summary = (
+            f"Course {instance.code} - {instance.name}, {instance.credits} credits, "
+            f"{instance.get_level_display()}, {instance.get_course_type_display()}, "
+            f"Department {instance.department.name}. {_text(instance.description)}"
+        )
+    elif isinstance(instance, ProgramCurriculum):
+        summary = (
+            f"Program {instance.program.code} - {instance.program.name} includes course "
+            f"{instance.course.code} - {instance.course.name} in semester {instance.semester} "
+            f"({'required' if instance.is_required else 'elective'}, {instance.credits_contribution} credits)."
+        )
+    elif isinstance(instance, Semester):
+        summary = (
+            f"Semester {instance.name} ({instance.code}){' - current semester' if instance.is_current else ''}: "
+            f"runs {instance.start_date} to {instance.end_date}, registration {instance.registration_start} "
+            f"to {instance.registration_end}, add/drop deadline {instance.add_drop_deadline}."
+        )
+    else:
+        return None
+    return f"{instance._meta.model_name}:{instance.pk}", summary
+
+
+class BM25Index:
+    """
+    In-memory BM25 index over short text documents. Documents can be
+    added, replaced and removed one at a time.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.docs = {}        # doc_id -> (summary, term counts, length)
+        self.postings = {}    # term -> {doc_id: term frequency}
+        self.total_length = 0
+
+    def __len__(self):
+        return len(self.docs)
+
+    def upsert(self, doc_id, summary):
+        self.remove(doc_id)
+        terms = Counter(normalize(summary))
+        length = sum(terms.values())
+        self.docs[doc_id] = (summary, terms, length)
+        self.total_length += length
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+    def remove(self, doc_id):
+        entry = self.docs.pop(doc_id, None)
+        if entry is None:
+            return
+        _, terms, length = entry
+        self.total_length -= length
+        for term in terms:
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+
+    def search(self, query, k=5):
+        """Returns up to k (doc_id, summary, score) tuples, best first."""
+        if not self.docs:
+            return []
+        n = len(self.docs)
+        avg_length = self.total_length / n or 1
+        scores = {}
+
+        for term in set(normalize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                length = self.docs[doc_id][2]
+                norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+        return [(doc_id, self.docs[doc_id][0], score) for doc_id, score in best]
+
+
+class AcademicIndex:
+    """
+    Lazily built BM25 index over the portal's academic records, kept in
+    sync through model save/delete signals (see core/signals.py).
+    """
+
+    def __init__(self):
+        self._index = BM25Index()
+        self._built = False
+        self._lock = threading.Lock()
+
+    def _querysets(self):
+        return (
+            Faculty.objects.all(),
+            Department.objects.select_related('faculty'),
+            Program.objects.filter(is_active=True).select_related('department'),
+            Course.objects.filter(is_active=True).select_related('department'),
+            ProgramCurriculum.objects.select_related('program', 'course'),
+            Semester.objects.all(),
+        )
+
+    def ensure_built(self):
+        if self._built:
+            return
+        with self._lock:
+            if self._built:
+                return
+            for queryset in self._querysets():
+                for instance in queryset:
+                    self._index.upsert(*describe(instance))
+            self._built = True
+
+    def update(self, instance):
+        if not self._built:
+            return  # picked up by the first full build
+        doc = describe(instance)
+        if doc is None:
+            return
+        with self._lock:
+            if getattr(instance, 'is_active', True):
+                self._index.upsert(*doc)
+            else:
+                self._index.remove(doc[0])
+
+    def remove(self, instance):
+        if not self._built:
+            return
+        with self._lock:
+            self._index.remove(f"{instance._meta.model_name}:{instance.pk}")
+
+    def search(self, query, k=5):
+        self.ensure_built()
+        with self._lock:
+            return self._index.search(query, k)
+
+
+academic_index = AcademicIndex()
+
+
+def answer_fee_question(question):
+    """
+    Answers "what are the fees for <program>" straight from Program rows.
+    Returns guidance items, or None when the question is not a fee question
+    or does not clearly name one program by its code or name.
+    """
+    words = set(re.findall(r"[a-z]+", (question or "").lower()))
+    if not words & FEE_WORDS:
+        return None
+    # Every program summary mentions fees, so rank on what else was asked
+    terms = [term for term in normalize(question) if term not in FEE_WORDS | PROGRAM_WORDS]
+    if not terms:
+        return None
+
+    program_hits = [
+        hit for hit in academic_index.search(" ".join(terms), k=10) if hit[0].startswith("program:")
+    ]
+    if not program_hits:
+        return None
+    # Ambiguous: two programs match equally well, let the model sort it out
+    if len(program_hits) > 1 and program_hits[1][2] >= program_hits[0][2] * 0.9:
+        return None
+
+    program = Program.objects.filter(pk=int(program_hits[0][0].split(":")[1])).first()
+    if program is None or not set(terms) & set(normalize(f"{program.code} {program.name}")):
+        return None
+
+    return [{
+        "title": f"Fees for {program.code} - {program.name}",
+        "description": (
+            f"The total fee per semester is **{program.total_fee_per_semester()}** "
+            f"(tuition {program.tuition_fee}, exam fee {program.exam_fee}, other fees {program.other_fees}). "
+            f"A one-time registration fee of **{program.registration_fee}** applies, and the full "
+            f"{program.duration}-semester program costs **{program.total_program_fee()}**."
+        ),
+        "url": "https://www.cuea.edu",
+    }]
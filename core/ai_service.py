@@ -1,20 +1,52 @@
 import os
 import json
+import logging
 import re
-import google.genai as genai
 from google.genai import types
-from django.conf import settings
+from core.ai_client import get_client
+from core.ai_metrics import LIBRARY_RESOURCES
+from core.ai_limits import model_call, with_deadline
+
+MODEL = "gemini-2.0-flash"
+
+logger = logging.getLogger(__name__)
+
+# Bump whenever the prompt changes so cached recommendations are refreshed
+PROMPT_VERSION = 1
+
+def _fallback_resources(course_name, description):
+    return [
+        {
+            "title": f"General resources for {course_name}",
+            "description": description,
+            "url": "https://www.google.com/search?q=" + course_name.replace(" ", "+")
+        }
+    ]
 
 class AIService:
-    def __init__(self):
-        # Initialize Gemini client
-        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
+    @property
+    def client(self):
+        # Shared, lazily built client from the process-wide pool
+        return get_client()
+
+    @property
+    def cache_version(self):
+        """Identifies the model/prompt pair that produced a cached answer."""
+        return f"{MODEL}:v{PROMPT_VERSION}"
 
     def fetch_online_resources(self, course_name, student):
         """
         Returns a list of recommended online resources for the given course.
         Ensures JSON parsing even if AI returns extra text.
         """
+        resources, _ = self.fetch_resources(course_name)
+        return resources
+
+    def fetch_resources(self, course_name):
+        """
+        Same as fetch_online_resources(), but also returns whether the list
+        came from the model (True) or is a fallback (False).
+        """
 
         # Prompt for Gemini
         prompt_text = f"""
@@ -41,7 +73,7 @@ class AIService:
 
         # Prepare request
         contents = [types.Content(role="user", parts=[types.Part.from_text(text=prompt_text)])]
-        
+
         # Use a simpler configuration without thinking budget
         config = types.GenerateContentConfig(
             temperature=0.7,
@@ -51,22 +83,21 @@ class AIService:
         # Collect response
         text_output = ""
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",  
-                contents=contents,
-                config=config
-            )
+            with model_call(LIBRARY_RESOURCES, MODEL) as call:
+                response = self.client.models.generate_content(
+                    model=MODEL,
+                    contents=contents,
+                    config=with_deadline(config)
+                )
+                call.usage(response)
             text_output = response.text
         except Exception as e:
-            print("Gemini API error:", e)
+            logger.warning("Gemini API error: %s", e)
             # Return a fallback resource on API error
-            return [
-                {
-                    "title": f"General resources for {course_name}",
-                    "description": "Our AI service is temporarily unavailable. Try searching online tutorials or textbooks.",
-                    "url": "https://www.google.com/search?q=" + course_name.replace(" ", "+")
-                }
-            ]
+            return _fallback_resources(
+                course_name,
+                "Our AI service is temporarily unavailable. Try searching online tutorials or textbooks."
+            ), False
 
         # Strip markdown code block if present
         text_output = re.sub(r"^```json\s*|\s*```$", "", text_output.strip(), flags=re.MULTILINE)
@@ -79,30 +110,23 @@ class AIService:
             text_output = ""
 
         # Parse JSON safely
-        resources = []
-        if text_output:
-            try:
-                resources = json.loads(text_output)
-                # Validate that we have at least one resource
-                if not resources or not isinstance(resources, list):
-                    raise json.JSONDecodeError("Empty or invalid resources", "", 0)
-            except json.JSONDecodeError:
-                # fallback resource if JSON is invalid
-                resources = [
-                    {
-                        "title": f"General resources for {course_name}",
-                        "description": "No specific online resources found. You can check Google Scholar, OpenCourseWare, or YouTube tutorials.",
-                        "url": "https://www.google.com/search?q=" + course_name.replace(" ", "+")
-                    }
-                ]
-        else:
+        if not text_output:
             # fallback if no text at all
-            resources = [
-                {
-                    "title": f"General resources for {course_name}",
-                    "description": "No online resources found. Try searching online tutorials or textbooks.",
-                    "url": "https://www.google.com/search?q=" + course_name.replace(" ", "+")
-                }
-            ]
-
-        return resources
\ No newline at end of file
+            return _fallback_resources(
+                course_name,
+                "No online resources found. Try searching online tutorials or textbooks."
+            ), False
+
+        try:
+            resources = json.loads(text_output)
+            # Validate that we have at least one resource
+            if not resources or not isinstance(resources, list):
+                raise json.JSONDecodeError("Empty or invalid resources", "", 0)
+        except json.JSONDecodeError:
+            # fallback resource if JSON is invalid
+            return _fallback_resources(
+                course_name,
+                "No specific online resources found. You can check Google Scholar, OpenCourseWare, or YouTube tutorials."
+            ), False
+
+        return resources, True
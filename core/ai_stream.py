@@ -0,0 +1,79 @@
+import json
+
+
+class JSONArrayStreamParser:
+    """
+    Incrementally parses a JSON array of objects arriving in text chunks.
+    feed() returns every object that became complete with the new chunk,
+    so callers can forward cards while the model is still generating.
+    Text before the opening '[' (e.g. a ```json fence) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.item_start = None
+
+    def feed(self, text):
+        self.buffer += text
+        items = []
+
+        while self.pos < len(self.buffer):
+            ch = self.buffer[self.pos]
+
+            if not self.started:
+                if ch == "[":
+                    self.started = True
+            elif self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.item_start = self.pos
+                self.depth += 1
+            elif ch == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    item = self._decode(self.buffer[self.item_start:self.pos + 1])
+                    if item is not None:
+                        items.append(item)
+                    self.item_start = None
+
+            self.pos += 1
+
+        # Drop text that can no longer be part of an unfinished item
+        if self.item_start is None:
+            self.buffer = ""
+            self.pos = 0
+        elif self.item_start > 0:
+            self.buffer = self.buffer[self.item_start:]
+            self.pos -= self.item_start
+            self.item_start = 0
+
+        return items
+
+    def _decode(self, raw):
+        try:
+            item = json.loads(raw)
+        except json.JSONDecodeError:
+            return None
+        return item if isinstance(item, dict) else None
+
+
+async def aiter_json_items(chunks):
+    """Yields complete objects from an async Gemini response stream as they arrive."""
+    parser = JSONArrayStreamParser()
+    async for chunk in chunks:
+        if chunk.text:
+            for item in parser.feed(chunk.text):
+                yield item
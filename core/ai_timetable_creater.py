@@ -1,51 +1,56 @@
-import re
-import google.genai as genai
+import json
+import logging
 from google.genai import types
-from django.conf import settings
+from core.ai_client import get_client
+from core.ai_metrics import GENERATE_TIMETABLE
+from core.ai_limits import model_call, with_deadline
+
+MODEL = "gemini-2.0-flash"
+
+logger = logging.getLogger(__name__)
 
 class TimetableAIService:
-    def __init__(self):
-        self.client = genai.Client(api_key=settings.GEMINI_API_KEY)
+    """
+    Optional explainer for timetables built by core.timetable_engine.
+    The schedule itself is computed locally; the model only describes it.
+    """
 
-    def create_timetable(self, courses):
-        """
-        Generates a personal timetable based on a list of courses.
-        courses: list of dicts with 'code', 'name', 'credits', 'preferred_times' (optional)
-        Returns JSON with day-wise schedule.
-        """
+    @property
+    def client(self):
+        # Shared, lazily built client from the process-wide pool
+        return get_client()
+
+    def _build_request(self, timetable, conflicts=None):
         prompt = """
-        You are a university AI assistant. Create a weekly timetable for a student.
-        - Input courses are listed with code, name, and credits.
-        - Avoid time conflicts.
-        - Distribute courses evenly across weekdays.
-        - Suggest ideal study times if no preference is given.
-        - Return JSON format: {"day": [{"time": "HH:MM-HH:MM", "course_code": "", "course_name": ""}]}
+        You are a university AI assistant. A student's weekly timetable is given below as JSON.
+        Entries with kind "class" are lectures; entries with kind "study" are suggested study blocks.
+        In a short paragraph, explain how the week is organised and give two or three practical study tips.
+        Do not change the timetable. Use **bold** for important words.
         """
 
-        prompt += "\nCourses:\n" + str(courses)
+        prompt += "\nTimetable:\n" + json.dumps(timetable)
+        if conflicts:
+            prompt += "\nThese courses have overlapping classes: " + ", ".join(f"{a} and {b}" for a, b in conflicts)
 
         contents = [types.Content(role="user", parts=[types.Part.from_text(text=prompt)])]
-        config = types.GenerateContentConfig(temperature=0.7, max_output_tokens=1200)
+        config = types.GenerateContentConfig(temperature=0.7, max_output_tokens=400)
+        return contents, config
+
+    def explain_timetable(self, timetable, conflicts=None):
+        """
+        Returns a short explanation of the timetable, or "" if the model fails.
+        """
+        contents, config = self._build_request(timetable, conflicts)
 
         try:
-            response = self.client.models.generate_content(
-                model="gemini-2.0-flash",
-                contents=contents,
-                config=config
-            )
-            text_output = response.text
+            with model_call(GENERATE_TIMETABLE, MODEL) as call:
+                response = self.client.models.generate_content(
+                    model=MODEL,
+                    contents=contents,
+                    config=with_deadline(config)
+                )
+                call.usage(response)
+            return (response.text or "").strip()
         except Exception as e:
-            print("Gemini API error:", e)
-            text_output = """
-            {
-                "Monday": [],
-                "Tuesday": [],
-                "Wednesday": [],
-                "Thursday": [],
-                "Friday": []
-            }
-            """
-
-        # Remove code block formatting if any
-        text_output = re.sub(r"^```json\s*|\s*```$", "", text_output.strip(), flags=re.MULTILINE)
-        return text_output
+            logger.warning("Gemini API error: %s", e)
+            return ""
@@ -0,0 +1,95 @@
+from collections import namedtuple
+
+from django.utils import timezone
+
+from . import models
+from .models import FinanceRecord, ProgramEnrollment, StudentAccount
+
+# skipped includes the billed_upfront enrollments
+Charges = namedtuple("Charges", ["charged", "skipped", "billed_upfront"])
+
+
+def charge_semester_fees(semester, batch_size=1000, dry_run=False):
+    """
+    Posts one semester fee charge (tuition + exam + other fees) for every
+    active program enrollment. Enrollments already charged for this
+    semester are skipped, so re-running is safe.
+
+    Accounts opened with the whole program fee (FEE_BILLING = "program")
+    already owe every semester and are skipped too; only accounts opened
+    under FEE_BILLING = "semester" are charged. Returns Charges.
+    """
+    already_charged = set(
+        FinanceRecord.objects.filter(semester=semester, transaction_type='fee')
+        .values_list('student_id', 'program_id')
+    )
+    billed_upfront = {
+        (student_id, program_id): upfront
+        for student_id, program_id, upfront in StudentAccount.objects.values_list(
+            'student_id', 'program_id', 'billed_upfront'
+        )
+    }
+    # Accounts opened by this run follow the current setting
+    new_accounts_upfront = models.FEE_BILLING == 'program'
+    enrollments = ProgramEnrollment.objects.filter(
+        is_active=True, status='active', program__isnull=False
+    ).values_list(
+        'student_id', 'program_id', 'program__code',
+        'program__tuition_fee', 'program__exam_fee', 'program__other_fees',
+    ).order_by('id')
+
+    charged = skipped = upfront = 0
+    batch = []
+    now = timezone.now()
+
+    for student_id, program_id, code, tuition, exam, other in enrollments.iterator(chunk_size=batch_size):
+        amount = tuition + exam + other
+        key = (student_id, program_id)
+        if key in already_charged or amount <= 0:
+            skipped += 1
+            continue
+        if billed_upfront.get(key, new_accounts_upfront):
+            skipped += 1
+            upfront += 1
+            continue
+        already_charged.add(key)
+        batch.append(FinanceRecord(
+            student_id=student_id,
+            program_id=program_id,
+            semester=semester,
+            transaction_type='fee',
+            description=f"{semester.name} fees ({code})",
+            amount=amount,
+            transaction_date=now,
+        ))
+        if len(batch) >= batch_size:
+            charged += _post(batch, batch_size, dry_run)
+            batch = []
+
+    if batch:
+        charged += _post(batch, batch_size, dry_run)
+    return Charges(charged, skipped, upfront)
+
+
+def describe_charges(semester, charges, dry_run=False):
+    """
+    One-line summary for the command and admin action. Says so when
+    accounts were left alone because they were billed for the whole
+    program up front, so "0 charged" is not read as success.
+    """
+    verb = "would charge" if dry_run else "charged"
+    text = f"{semester}: {verb} {charges.charged} enrollment(s), skipped {charges.skipped}"
+    if not charges.billed_upfront:
+        return text + "."
+    text += (f", of which {charges.billed_upfront} were billed for the whole program up front "
+             f"(FEE_BILLING = '{models.FEE_BILLING}').")
+    if not charges.charged:
+        text += (" No accounts were charged because of the billing mode; accounts opened while "
+                 "FEE_BILLING = 'semester' are the only ones billed per semester.")
+    return text
+
+
+def _post(batch, batch_size, dry_run):
+    if not dry_run:
+        FinanceRecord.objects.bulk_post(batch, batch_size=batch_size)
+    return len(batch)
@@ -0,0 +1,10 @@
+from .semesters import current_semester as get_current_semester
+
+
+def current_semester(request):
+    """Makes the (memoized) current semester available to every template."""
+    semester = get_current_semester()
+    return {
+        'current_semester': semester,
+        'registration_open': bool(semester and semester.is_registration_open()),
+    }
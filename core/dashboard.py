@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Assignment, Enrollment, TranscriptSummary
+from .semesters import current_semester
+
+# Entries are deleted by signals when enrollments or assignments change;
+# the TTL only bounds staleness for changes made outside the ORM, or on
+# other workers when the cache is per-process (see CACHES in settings).
+DASHBOARD_CACHE_TTL = getattr(settings, "DASHBOARD_CACHE_TTL", 300)
+
+
+def _student_key(user_id):
+    return f"dashboard:student:{user_id}"
+
+
+def _assignments_key():
+    return f"dashboard:pending_assignments:{timezone.now().date()}"
+
+
+def pending_assignments():
+    """Assignments not yet due. Shared by every student, so cached once."""
+    count = cache.get(_assignments_key())
+    if count is None:
+        count = Assignment.objects.filter(due_date__gte=timezone.now().date()).count()
+        cache.set(_assignments_key(), count, DASHBOARD_CACHE_TTL)
+    return count
+
+
+def student_summary(user):
+    """
+    The numbers on the student dashboard. Warm calls run no SQL: the
+    semester is memoized process-wide and the rest comes from the cache.
+    """
+    semester = current_semester()
+    semester_id = semester.pk if semester else None
+    summary = cache.get(_student_key(user.pk))
+
+    if summary is None or summary["semester_id"] != semester_id:
+        current_courses_count = 0
+        if semester:
+            current_courses_count = Enrollment.objects.filter(
+                student=user, course_offering__semester=semester, is_active=True
+            ).count()
+        transcript = TranscriptSummary.objects.filter(student=user).values('gpa', 'credits_earned').first()
+        summary = {
+            "semester_id": semester_id,
+            "current_courses_count": current_courses_count,
+            "transcript_summary": transcript,
+        }
+        cache.set(_student_key(user.pk), summary, DASHBOARD_CACHE_TTL)
+
+    return dict(summary, pending_assignments=pending_assignments())
+
+
+def invalidate_student(user_id):
+    cache.delete(_student_key(user_id))
+
+
+def invalidate_assignments():
+    cache.delete(_assignments_key())
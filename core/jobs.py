@@ -0,0 +1,95 @@
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from core.ai_metrics import set_source
+from core.ai_quetions_gen import generate_questions
+from core.ai_timetable_creater import TimetableAIService
+from core.library_cache import get_course_resources
+from core.timetable_engine import build_timetable, load_student_courses, timetable_payload
+from .models import AIJob, Course
+
+# Seconds before the first retry of a failed attempt; doubles on each further attempt
+RETRY_BACKOFF = getattr(settings, "AI_JOB_RETRY_BACKOFF", 5)
+# A job still "running" after this many seconds lost its worker and is handed back
+STALE_AFTER = getattr(settings, "AI_JOB_STALE_AFTER", 600)
+
+logger = logging.getLogger(__name__)
+
+timetable_ai = TimetableAIService()
+
+
+def run_questions(job):
+    payload = job.payload
+    questions = generate_questions(payload["course_name"], payload["topic"], payload["num_questions"])
+    return [str(q) for q in questions]
+
+
+def run_timetable(job):
+    timetable, conflicts = build_timetable(load_student_courses(job.user))
+    explanation = ""
+    if job.payload.get("explain"):
+        explanation = timetable_ai.explain_timetable(timetable, conflicts)
+    return timetable_payload(timetable, conflicts, explanation)
+
+
+def run_library(job):
+    return get_course_resources(Course.objects.get(pk=job.payload["course_id"]))
+
+
+# Job kind -> callable(job) returning a JSON-serialisable result
+HANDLERS = {
+    'questions': run_questions,
+    'timetable': run_timetable,
+    'library': run_library,
+}
+
+
+def run_job(job):
+    """
+    Runs one claimed job and records the outcome. A failed attempt goes back
+    on the queue with exponential backoff until max_attempts is reached.
+    """
+    set_source(f"ai_job:{job.kind}")
+    started = time.monotonic()
+    try:
+        result = HANDLERS[job.kind](job)
+    except Exception as e:
+        logger.warning("AI job %s (%s) attempt %s failed: %s", job.pk, job.kind, job.attempts, e)
+        fields = {'error': str(e) or e.__class__.__name__}
+        if job.attempts < job.max_attempts:
+            fields.update(status=AIJob.QUEUED,
+                          available_at=timezone.now() + timedelta(seconds=RETRY_BACKOFF * 2 ** (job.attempts - 1)))
+        else:
+            fields.update(status=AIJob.FAILED, finished_at=timezone.now())
+    else:
+        fields = {'status': AIJob.SUCCEEDED, 'result': result, 'error': '', 'finished_at': timezone.now()}
+
+    fields['run_ms'] = int((time.monotonic() - started) * 1000)
+    # Only the worker still holding the claim may record the outcome
+    AIJob.objects.filter(pk=job.pk, status=AIJob.RUNNING, worker=job.worker).update(**fields)
+
+
+def work(worker, stop, poll_interval=1.0, once=False):
+    """
+    Worker loop: claims and runs jobs until `stop` (a threading.Event) is set.
+    With once=True it returns as soon as the queue is empty.
+    """
+    while not stop.is_set():
+        close_old_connections()
+        job = AIJob.objects.claim(worker)
+        if job is None:
+            if once:
+                break
+            stop.wait(poll_interval)
+            continue
+        run_job(job)
+    close_old_connections()
+
+
+def requeue_stale_jobs():
+    return AIJob.objects.requeue_stale(timezone.now() - timedelta(seconds=STALE_AFTER))
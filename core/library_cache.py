@@ -0,0 +1,106 @@
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.ai_metrics import LIBRARY_RESOURCES, record_event
+from core.ai_service import AIService
+from .models import LibraryResourceCache
+
+CACHE_TTL = timedelta(seconds=getattr(settings, "LIBRARY_RESOURCE_CACHE_TTL", 7 * 24 * 3600))
+
+library_ai = AIService()
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one execution.
+    The first caller runs the function; everyone else waiting on that key
+    receives the same result (or exception) instead of repeating the call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = {"done": threading.Event(), "result": None, "error": None}
+                self._calls[key] = call
+
+        if not leader:
+            call["done"].wait()
+            if call["error"] is not None:
+                raise call["error"]
+            return call["result"]
+
+        try:
+            call["result"] = fn()
+        except Exception as e:
+            call["error"] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call["done"].set()
+        return call["result"]
+
+
+_flight = SingleFlight()
+
+
+def _lookup(course_id, version):
+    entry = LibraryResourceCache.objects.filter(
+        course_id=course_id, version=version, expires_at__gt=timezone.now()
+    ).only('resources').first()
+    return entry.resources if entry else None
+
+
+def _refresh(course, version):
+    # Another worker may have stored the answer while we were queued
+    resources = _lookup(course.pk, version)
+    if resources is not None:
+        return resources
+
+    resources, from_model = library_ai.fetch_resources(course.name)
+    if from_model:
+        # Only real model answers are cached; fallbacks retry on the next visit
+        LibraryResourceCache.objects.update_or_create(
+            course=course, version=version,
+            defaults={'resources': resources, 'expires_at': timezone.now() + CACHE_TTL}
+        )
+    return resources
+
+
+def cached_course_resources(course):
+    """The cached recommendations for a course, or None without calling the model."""
+    resources = _lookup(course.pk, library_ai.cache_version)
+    if resources is not None:
+        record_event(LIBRARY_RESOURCES, cache="hit")
+    return resources
+
+
+def get_course_resources(course):
+    """
+    Returns AI-recommended resources for a course, served from the cache
+    when a fresh entry exists for the current model/prompt version.
+    """
+    version = library_ai.cache_version
+    resources = _lookup(course.pk, version)
+    if resources is not None:
+        record_event(LIBRARY_RESOURCES, cache="hit")
+        return resources
+    return _flight.do((course.pk, version), lambda: _refresh(course, version))
+
+
+def invalidate_course_resources(courses=None):
+    """Drops cached recommendations for the given courses (all when None)."""
+    entries = LibraryResourceCache.objects.all()
+    if courses is not None:
+        entries = entries.filter(course__in=courses)
+    deleted, _ = entries.delete()
+    return deleted
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.billing import charge_semester_fees, describe_charges
+from core.models import Semester
+
+
+class Command(BaseCommand):
+    help = ("Charge one semester's fees to every active program enrollment (safe to re-run). "
+            "Accounts billed for the whole program up front, as every account is under the default "
+            "FEE_BILLING = 'program', are skipped.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('semester_code', help="Semester code, e.g. F2025")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Count the charges without posting them.")
+
+    def handle(self, *args, **options):
+        try:
+            semester = Semester.objects.get(code=options['semester_code'])
+        except Semester.DoesNotExist:
+            raise CommandError(f"No semester with code {options['semester_code']!r}")
+
+        charges = charge_semester_fees(
+            semester, batch_size=options['batch_size'], dry_run=options['dry_run']
+        )
+        style = self.style.WARNING if charges.billed_upfront and not charges.charged else self.style.SUCCESS
+        self.stdout.write(style(describe_charges(semester, charges, dry_run=options['dry_run'])))
@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+
+from core.models import TranscriptSummary
+
+
+class Command(BaseCommand):
+    help = "Recompute every student's transcript summary and program progress from their enrollments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        student_ids = list(
+            get_user_model().objects.filter(role='student').order_by('pk').values_list('pk', flat=True)
+        )
+        batch_size = options['batch_size']
+        for start in range(0, len(student_ids), batch_size):
+            TranscriptSummary.objects.refresh(student_ids[start:start + batch_size])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {len(student_ids)} transcript summaries."))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from core.models import StudentAccount
+
+
+class Command(BaseCommand):
+    help = "Verify every student fee balance against the FinanceRecord ledger."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fix',
+            action='store_true',
+            help="Overwrite stored balances with the recomputed values and open missing accounts.",
+        )
+
+    def handle(self, *args, **options):
+        mismatches = StudentAccount.objects.reconcile(fix=options['fix'])
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("All balances match the ledger."))
+            return
+
+        for (student_id, program_id), stored, expected in mismatches:
+            if stored is None:
+                self.stdout.write(f"student={student_id} program={program_id}: no account")
+            else:
+                self.stdout.write(
+                    f"student={student_id} program={program_id}: stored {stored}, ledger {expected}"
+                )
+
+        if options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"Corrected {len(mismatches)} account(s)."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"{len(mismatches)} account(s) disagree with the ledger. Re-run with --fix to correct them."
+            ))
@@ -0,0 +1,51 @@
+import os
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.jobs import requeue_stale_jobs, work
+
+SWEEP_INTERVAL = 60  # seconds between checks for jobs orphaned by a stopped worker
+
+
+class Command(BaseCommand):
+    help = "Run a pool of AI workers that process queued question, timetable and library jobs."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Worker threads in this process.")
+        parser.add_argument('--poll-interval', type=float, default=1.0,
+                            help="Seconds an idle worker waits before checking the queue again.")
+        parser.add_argument('--once', action='store_true', help="Drain the queue and exit.")
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} job(s) left running by a stopped worker.")
+
+        stop = threading.Event()
+        prefix = f"{socket.gethostname()}:{os.getpid()}"
+        threads = [
+            threading.Thread(
+                target=work, args=(f"{prefix}:{n}", stop, options['poll_interval'], options['once']), daemon=True
+            )
+            for n in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(self.style.SUCCESS(f"Started {len(threads)} AI worker(s)."))
+
+        last_sweep = time.monotonic()
+        try:
+            while any(thread.is_alive() for thread in threads):
+                for thread in threads:
+                    thread.join(timeout=1)
+                if not options['once'] and time.monotonic() - last_sweep >= SWEEP_INTERVAL:
+                    requeue_stale_jobs()
+                    last_sweep = time.monotonic()
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping workers after their current job...")
+            stop.set()
+            for thread in threads:
+                thread.join()
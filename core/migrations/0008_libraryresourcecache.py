@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-15 22:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_alter_financerecord_options_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryResourceCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.CharField(help_text='Model and prompt version that produced the answer', max_length=50)),
+                ('resources', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='cached_resources', to='core.course')),
+            ],
+            options={
+                'verbose_name': 'Library resource cache entry',
+                'verbose_name_plural': 'Library resource cache',
+                'ordering': ['-created_at'],
+                'unique_together': {('course', 'version')},
+            },
+        ),
+    ]
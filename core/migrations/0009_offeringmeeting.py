@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-15 22:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_libraryresourcecache'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfferingMeeting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('room', models.CharField(blank=True, help_text="Defaults to the offering's room", max_length=50, null=True)),
+                ('slot_mask', models.BigIntegerField(editable=False, help_text='Half-hour slots used within the day, one bit per slot')),
+                ('offering', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='meetings', to='core.courseoffering')),
+                ('semester', models.ForeignKey(editable=False, help_text='Copied from the offering for indexed lookups', on_delete=django.db.models.deletion.CASCADE, related_name='meetings', to='core.semester')),
+            ],
+            options={
+                'ordering': ['offering', 'day', 'start_time'],
+                'indexes': [models.Index(fields=['semester', 'room', 'day'], name='meeting_semester_room_day')],
+            },
+        ),
+    ]
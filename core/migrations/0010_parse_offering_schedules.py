@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-15 22:11
+
+from django.db import migrations
+
+from core.schedule import day_mask, parse_schedule
+
+
+def parse_existing_schedules(apps, schema_editor):
+    """Turns the free-text CourseOffering.schedule into OfferingMeeting rows."""
+    CourseOffering = apps.get_model('core', 'CourseOffering')
+    OfferingMeeting = apps.get_model('core', 'OfferingMeeting')
+
+    meetings = []
+    for offering in CourseOffering.objects.exclude(schedule__isnull=True).exclude(schedule=''):
+        for meeting in parse_schedule(offering.schedule):
+            meetings.append(OfferingMeeting(
+                offering_id=offering.pk,
+                semester_id=offering.semester_id,
+                day=meeting.day,
+                start_time=meeting.start,
+                end_time=meeting.end,
+                room=offering.room,
+                slot_mask=day_mask(meeting.start, meeting.end),
+            ))
+    OfferingMeeting.objects.bulk_create(meetings, batch_size=500)
+
+
+def remove_parsed_meetings(apps, schema_editor):
+    apps.get_model('core', 'OfferingMeeting').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_offeringmeeting'),
+    ]
+
+    operations = [
+        migrations.RunPython(parse_existing_schedules, remove_parsed_meetings),
+    ]
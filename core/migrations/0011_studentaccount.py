@@ -0,0 +1,60 @@
+# Generated by Django 5.2.5 on 2026-10-15 22:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def open_accounts_from_history(apps, schema_editor):
+    """Seeds one account per (student, program) from the existing ledger."""
+    FinanceRecord = apps.get_model('core', 'FinanceRecord')
+    Program = apps.get_model('core', 'Program')
+    StudentAccount = apps.get_model('core', 'StudentAccount')
+
+    totals = FinanceRecord.objects.values('student_id', 'program_id').annotate(
+        charges=Sum('amount', filter=Q(transaction_type__in=('fee', 'adjustment')), default=0),
+        credits=Sum('amount', filter=Q(transaction_type__in=('payment', 'refund')), default=0),
+    )
+    programs = Program.objects.in_bulk()
+
+    accounts = []
+    for row in totals:
+        program = programs.get(row['program_id'])
+        opening = 0
+        if program:
+            per_semester = program.tuition_fee + program.exam_fee + program.other_fees
+            opening = per_semester * program.duration + program.registration_fee
+        accounts.append(StudentAccount(
+            student_id=row['student_id'],
+            program_id=row['program_id'],
+            opening_balance=opening,
+            balance=opening + row['charges'] - row['credits'],
+        ))
+    StudentAccount.objects.bulk_create(accounts, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_parse_offering_schedules'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentAccount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('opening_balance', models.DecimalField(decimal_places=2, default=0, help_text='Total program fee when the account was opened', max_digits=10)),
+                ('balance', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('program', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='fee_accounts', to='core.program')),
+                ('student', models.ForeignKey(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='fee_accounts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('student', 'program')},
+            },
+        ),
+        migrations.RunPython(open_accounts_from_history, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-15 22:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_studentaccount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='financerecord',
+            name='semester',
+            field=models.ForeignKey(blank=True, help_text='Semester a fee charge belongs to', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='finance_records', to='core.semester'),
+        ),
+        migrations.AddConstraint(
+            model_name='financerecord',
+            constraint=models.UniqueConstraint(condition=models.Q(('semester__isnull', False), ('transaction_type', 'fee')), fields=('student', 'program', 'semester'), name='unique_semester_fee_charge'),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.5 on 2026-10-15 22:22
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+from core.transcripts import program_credits, summarize
+
+
+def build_summaries(apps, schema_editor):
+    """Summarises every student's existing enrollment history."""
+    Enrollment = apps.get_model('core', 'Enrollment')
+    ProgramEnrollment = apps.get_model('core', 'ProgramEnrollment')
+    ProgramCurriculum = apps.get_model('core', 'ProgramCurriculum')
+    TranscriptSummary = apps.get_model('core', 'TranscriptSummary')
+
+    history = {}
+    for student_id, *row in Enrollment.objects.values_list(
+        'student_id', 'course_offering__course_id', 'course_offering__course__credits',
+        'credits_earned', 'grade', 'status',
+    ):
+        history.setdefault(student_id, []).append(row)
+    summaries = {student_id: summarize(rows) for student_id, rows in history.items()}
+
+    TranscriptSummary.objects.bulk_create([
+        TranscriptSummary(
+            student_id=student_id,
+            credits_earned=summary.credits_earned,
+            graded_credits=summary.graded_credits,
+            quality_points=summary.quality_points,
+            gpa=summary.gpa,
+            courses_completed=summary.courses_completed,
+        )
+        for student_id, summary in summaries.items()
+    ], batch_size=500)
+
+    curricula = {}
+    for program_id, course_id in ProgramCurriculum.objects.values_list('program_id', 'course_id'):
+        curricula.setdefault(program_id, set()).add(course_id)
+    program_enrollments = list(ProgramEnrollment.objects.filter(student_id__in=summaries))
+    for program_enrollment in program_enrollments:
+        program_enrollment.credits_earned = program_credits(
+            summaries[program_enrollment.student_id].completed_courses,
+            curricula.get(program_enrollment.program_id, set()),
+        )
+    ProgramEnrollment.objects.bulk_update(program_enrollments, ['credits_earned'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_waitlistentry'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='programenrollment',
+            name='credits_earned',
+            field=models.IntegerField(default=0, editable=False, help_text='Curriculum credits completed, kept current from the transcript'),
+        ),
+        migrations.CreateModel(
+            name='TranscriptSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('credits_earned', models.IntegerField(default=0)),
+                ('graded_credits', models.IntegerField(default=0, help_text='Credits that count towards the GPA')),
+                ('quality_points', models.DecimalField(decimal_places=2, default=0, max_digits=8)),
+                ('gpa', models.DecimalField(decimal_places=2, default=0, max_digits=3)),
+                ('courses_completed', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.OneToOneField(limit_choices_to={'role': 'student'}, on_delete=django.db.models.deletion.CASCADE, related_name='transcript_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Transcript summaries',
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
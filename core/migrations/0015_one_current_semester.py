@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-15 22:25
+
+from django.db import migrations, models
+
+
+def keep_latest_current(apps, schema_editor):
+    """Leaves only the most recent semester marked current before the constraint is added."""
+    Semester = apps.get_model('core', 'Semester')
+    current = Semester.objects.filter(is_current=True).order_by('-start_date', '-pk')
+    latest = current.first()
+    if latest is not None:
+        current.exclude(pk=latest.pk).update(is_current=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_transcriptsummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_latest_current, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='semester',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_current', True)), fields=('is_current',), name='one_current_semester'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-15 22:26
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_one_current_semester'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='courseoffering',
+            index=models.Index(fields=['semester', 'is_active'], name='offering_semester_active'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student', 'is_active'], name='enrollment_student_active'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['course_offering', 'is_active'], name='enrollment_offering_active'),
+        ),
+        migrations.AddIndex(
+            model_name='financerecord',
+            index=models.Index(fields=['student', 'program'], name='finance_student_program'),
+        ),
+    ]
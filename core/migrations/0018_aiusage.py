@@ -0,0 +1,37 @@
+# Generated by Django 5.2.5 on 2026-10-15 22:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_aijob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AIUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('feature', models.CharField(max_length=30)),
+                ('requests', models.IntegerField(default=0)),
+                ('model_calls', models.IntegerField(default=0)),
+                ('errors', models.IntegerField(default=0)),
+                ('fallbacks', models.IntegerField(default=0)),
+                ('cache_hits', models.IntegerField(default=0)),
+                ('prompt_tokens', models.BigIntegerField(default=0)),
+                ('response_tokens', models.BigIntegerField(default=0)),
+                ('latency_ms_total', models.BigIntegerField(default=0)),
+                ('latency_histogram', models.JSONField(default=list, help_text='Model call counts per core.ai_metrics latency bucket')),
+                ('cost', models.DecimalField(decimal_places=6, default=0, help_text='USD', max_digits=12)),
+            ],
+            options={
+                'verbose_name': 'AI usage',
+                'verbose_name_plural': 'AI usage',
+                'ordering': ['-date', 'feature'],
+                'unique_together': {('date', 'feature')},
+            },
+        ),
+    ]
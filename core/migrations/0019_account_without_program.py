@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-15 22:47
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def merge_duplicate_accounts(apps, schema_editor):
+    """Keeps one account per student without a program, rebuilt from the ledger."""
+    FinanceRecord = apps.get_model('core', 'FinanceRecord')
+    StudentAccount = apps.get_model('core', 'StudentAccount')
+
+    duplicated = StudentAccount.objects.filter(program__isnull=True).values('student_id').annotate(
+        count=Count('id')
+    ).filter(count__gt=1).values_list('student_id', flat=True)
+    for student_id in list(duplicated):
+        keep, *extra = StudentAccount.objects.filter(student_id=student_id, program__isnull=True).order_by('id')
+        totals = FinanceRecord.objects.filter(student_id=student_id, program__isnull=True).aggregate(
+            charges=Sum('amount', filter=Q(transaction_type__in=('fee', 'adjustment')), default=0),
+            credits=Sum('amount', filter=Q(transaction_type__in=('payment', 'refund')), default=0),
+        )
+        keep.balance = keep.opening_balance + totals['charges'] - totals['credits']
+        keep.save(update_fields=['balance'])
+        StudentAccount.objects.filter(pk__in=[account.pk for account in extra]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_aiusage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_accounts, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='studentaccount',
+            name='program',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='fee_accounts', to='core.program'),
+        ),
+        migrations.AddConstraint(
+            model_name='studentaccount',
+            constraint=models.UniqueConstraint(condition=models.Q(('program__isnull', True)), fields=('student',), name='unique_account_without_program'),
+        ),
+    ]
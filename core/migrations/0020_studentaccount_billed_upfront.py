@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-15 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_account_without_program'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentaccount',
+            name='billed_upfront',
+            field=models.BooleanField(default=True, help_text='Opening balance covers every semester, so semester charges are skipped'),
+        ),
+        migrations.AlterField(
+            model_name='studentaccount',
+            name='opening_balance',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Fees owed when the account was opened: the whole program, or only registration', max_digits=10),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-15 23:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_studentaccount_billed_upfront'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='waitlistentry',
+            name='skipped_reason',
+            field=models.CharField(blank=True, help_text='Why the student was passed over when a seat last freed up', max_length=200),
+        ),
+    ]
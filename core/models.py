@@ -1,10 +1,23 @@
 # core/models.py
-from django.db import models
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import F, Q, Sum
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.utils import timezone
 from datetime import timedelta
 
+from django.core.exceptions import ValidationError
+
+from core.schedule import DAYS, SLOTS_PER_DAY, Meeting, day_mask, parse_schedule, week_mask
+from core.transcripts import program_credits, summarize
+from core.ai_metrics import LATENCY_BUCKETS_MS
+
+# "program": a new fee account owes the whole program fee up front.
+# "semester": it owes only the registration fee, and core.billing charges each semester.
+FEE_BILLING = getattr(settings, "FEE_BILLING", "program")
+
 class Faculty(models.Model):
     """Model representing university faculties"""
     code = models.CharField(max_length=10, unique=True, help_text="Faculty code (e.g., SCI, ENG, BUS)")
@@ -244,15 +257,30 @@ class Semester(models.Model):
 
     class Meta:
         ordering = ['-start_date']
+        constraints = [
+            # At most one current semester; also indexes the current-semester lookup
+            models.UniqueConstraint(fields=['is_current'], condition=Q(is_current=True),
+                                    name='one_current_semester'),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.code})"
 
     def save(self, *args, **kwargs):
-        # Ensure only one semester is marked as current
-        if self.is_current:
-            Semester.objects.filter(is_current=True).update(is_current=False)
-        super().save(*args, **kwargs)
+        # Ensure only one semester is marked as current. Cached copies are
+        # dropped by the post_save signal (core.semesters.forget_current_semester).
+        with transaction.atomic():
+            if self.is_current:
+                Semester.objects.filter(is_current=True).exclude(pk=self.pk).update(is_current=False)
+            super().save(*args, **kwargs)
+
+    def is_registration_open(self, date=None):
+        date = date or timezone.now().date()
+        return self.registration_start <= date <= self.registration_end
+
+    def is_add_drop_open(self, date=None):
+        date = date or timezone.now().date()
+        return self.registration_start <= date <= self.add_drop_deadline
 
 class CourseOffering(models.Model):
     """Model representing a specific offering of a course in a semester"""
@@ -276,6 +304,9 @@ class CourseOffering(models.Model):
     class Meta:
         unique_together = ['course', 'semester', 'section']
         ordering = ['semester', 'course', 'section']
+        indexes = [
+            models.Index(fields=['semester', 'is_active'], name='offering_semester_active'),
+        ]
 
     def __str__(self):
         return f"{self.course.code} - {self.section} ({self.semester.code})"
@@ -286,8 +317,152 @@ class CourseOffering(models.Model):
     def is_full(self):
         return self.enrolled >= self.capacity
 
+    def release_seat(self):
+        """Gives one seat back without touching any other column."""
+        CourseOffering.objects.filter(pk=self.pk, enrolled__gt=0).update(enrolled=F('enrolled') - 1)
+
+    def meeting_tuples(self):
+        """
+        Weekly meetings as core.schedule.Meeting tuples. Uses the structured
+        OfferingMeeting rows (prefetch 'meetings' to avoid a query) and
+        falls back to parsing the free-text schedule.
+        """
+        meetings = [Meeting(m.day, m.start_time, m.end_time) for m in self.meetings.all()]
+        return meetings or parse_schedule(self.schedule)
+
+    def week_mask(self):
+        return week_mask(self.meeting_tuples())
+
+    def sync_meetings_from_schedule(self):
+        """Replaces the structured meetings with those parsed from the schedule text."""
+        self.meetings.all().delete()
+        OfferingMeeting.objects.bulk_create([
+            OfferingMeeting(
+                offering=self, semester_id=self.semester_id, day=m.day,
+                start_time=m.start, end_time=m.end, room=self.room,
+                slot_mask=day_mask(m.start, m.end),
+            )
+            for m in parse_schedule(self.schedule)
+        ])
+
+    def clashing_offerings(self, student):
+        """Offerings the student is actively enrolled in this semester whose classes overlap this one."""
+        mask = self.week_mask()
+        if not mask:
+            return []
+        enrollments = Enrollment.objects.filter(
+            student=student, is_active=True, course_offering__semester_id=self.semester_id
+        ).exclude(course_offering=self).select_related('course_offering__course').prefetch_related(
+            'course_offering__meetings'
+        )
+        return [e.course_offering for e in enrollments if e.course_offering.week_mask() & mask]
+
+    def eligibility_error(self, student):
+        """Why the student may not take this offering (missing prerequisite, clash), or ""."""
+        from .prerequisites import evaluate_offerings
+
+        eligibility = evaluate_offerings(student, [self])[self.id]
+        if not eligibility.eligible:
+            return f"Missing prerequisite: {eligibility.missing[0].code}"
+        clashes = self.clashing_offerings(student)
+        if clashes:
+            return f"{self.course.code} clashes with {clashes[0].course.code} in your timetable."
+        return ""
+
+class OfferingMeeting(models.Model):
+    """Model representing one weekly class meeting of a course offering"""
+    DAY_CHOICES = [(index, name) for index, name in enumerate(DAYS)]
+
+    offering = models.ForeignKey(CourseOffering, on_delete=models.CASCADE, related_name='meetings')
+    semester = models.ForeignKey(Semester, on_delete=models.CASCADE, related_name='meetings',
+                                 editable=False, help_text="Copied from the offering for indexed lookups")
+    day = models.PositiveSmallIntegerField(choices=DAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    room = models.CharField(max_length=50, blank=True, null=True,
+                            help_text="Defaults to the offering's room")
+    slot_mask = models.BigIntegerField(editable=False,
+                                       help_text="Half-hour slots used within the day, one bit per slot")
+
+    class Meta:
+        ordering = ['offering', 'day', 'start_time']
+        indexes = [
+            models.Index(fields=['semester', 'room', 'day'], name='meeting_semester_room_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.offering} {self.get_day_display()} {self.start_time:%H:%M}-{self.end_time:%H:%M}"
+
+    def week_mask(self):
+        return self.slot_mask << (self.day * SLOTS_PER_DAY)
+
+    def room_conflicts(self):
+        """Other meetings booked in the same room, semester and day at an overlapping time."""
+        if not self.room:
+            return []
+        mask = day_mask(self.start_time, self.end_time)
+        others = OfferingMeeting.objects.filter(
+            semester_id=self.offering.semester_id, room=self.room, day=self.day
+        ).exclude(pk=self.pk).select_related('offering__course', 'offering__semester')
+        return [other for other in others if other.slot_mask & mask]
+
+    def clean(self):
+        if self.start_time and self.end_time and self.end_time <= self.start_time:
+            raise ValidationError("End time must be after start time.")
+        offering = getattr(self, 'offering', None)
+        if offering is None or not (self.start_time and self.end_time):
+            return
+        self.room = self.room or offering.room
+        conflicts = self.room_conflicts()
+        if conflicts:
+            raise ValidationError(
+                f"Room {self.room} is already booked at this time by {conflicts[0].offering}."
+            )
+
+    def save(self, *args, **kwargs):
+        self.semester_id = self.offering.semester_id
+        self.room = self.room or self.offering.room
+        self.slot_mask = day_mask(self.start_time, self.end_time)
+        super().save(*args, **kwargs)
+
+class EnrollmentManager(models.Manager):
+    def reserve(self, student, offering):
+        """
+        Takes a seat in the offering and enrolls the student in one transaction.
+        The seat is claimed with a conditional UPDATE (enrolled < capacity), so
+        concurrent registrations can never oversubscribe a section.
+        Returns (enrollment, result) where result is one of Enrollment.RESERVED,
+        Enrollment.FULL or Enrollment.ALREADY_ENROLLED.
+        """
+        with transaction.atomic():
+            # Claim the seat first: it takes the write lock on the offering row
+            taken = CourseOffering.objects.filter(
+                pk=offering.pk, enrolled__lt=F('capacity')
+            ).update(enrolled=F('enrolled') + 1)
+            if not taken:
+                return None, Enrollment.FULL
+
+            enrollment = self.filter(student=student, course_offering=offering).first()
+            if enrollment is None:
+                enrollment = Enrollment(student=student, course_offering=offering, status='registered')
+            elif enrollment.is_active:
+                transaction.set_rollback(True)
+                return enrollment, Enrollment.ALREADY_ENROLLED
+            else:
+                # Re-registering after a drop reuses the withdrawn row
+                enrollment.is_active = True
+                enrollment.status = 'registered'
+                enrollment.grade = ''
+            enrollment.save(take_seat=False)
+        return enrollment, Enrollment.RESERVED
+
+
 class Enrollment(models.Model):
     """Model representing student enrollment in courses"""
+    RESERVED = 'reserved'
+    FULL = 'full'
+    ALREADY_ENROLLED = 'already_enrolled'
+
     GRADE_CHOICES = (
         ('A', 'A (Excellent)'),
         ('B', 'B (Good)'),
@@ -315,19 +490,108 @@ class Enrollment(models.Model):
                                     ('failed', 'Failed')])
     credits_earned = models.IntegerField(blank=True, null=True)
 
+    objects = EnrollmentManager()
+
     class Meta:
         unique_together = ['student', 'course_offering']
         ordering = ['-enrollment_date']
+        indexes = [
+            models.Index(fields=['student', 'is_active'], name='enrollment_student_active'),
+            models.Index(fields=['course_offering', 'is_active'], name='enrollment_offering_active'),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.course_offering.course.code}"
 
-    def save(self, *args, **kwargs):
-        # Update enrolled count in course offering
-        if self.is_active and self.pk is None:
-            self.course_offering.enrolled += 1
-            self.course_offering.save()
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._transcript_state = instance._transcript_fields()
+        return instance
+
+    def _transcript_fields(self):
+        # Read through __dict__ so deferred fields are not loaded just for this
+        return tuple(self.__dict__.get(name) for name in ('grade', 'status', 'is_active', 'credits_earned'))
+
+    def affects_transcript(self):
+        """True if saving this enrollment changes the student's transcript summary."""
+        before = getattr(self, '_transcript_state', None)
+        if before is None:
+            return bool(self.grade) or self.status == 'completed'
+        return before != self._transcript_fields()
+
+    def save(self, *args, take_seat=True, **kwargs):
+        # Update enrolled count in course offering; Enrollment.objects.reserve()
+        # has already claimed the seat and passes take_seat=False
+        if take_seat and self.is_active and self.pk is None:
+            CourseOffering.objects.filter(pk=self.course_offering_id).update(enrolled=F('enrolled') + 1)
+        refresh_transcript = self.affects_transcript()
         super().save(*args, **kwargs)
+        self._transcript_state = self._transcript_fields()
+        if refresh_transcript:
+            TranscriptSummary.objects.refresh([self.student_id])
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        TranscriptSummary.objects.refresh([self.student_id])
+        return result
+
+class WaitlistManager(models.Manager):
+    def join(self, student, offering):
+        """Queues the student for a full offering. Returns (entry, created)."""
+        return self.get_or_create(student=student, offering=offering)
+
+    def promote(self, offering):
+        """
+        Moves students from the waitlist into free seats, in FIFO order,
+        until the offering is full or the queue is empty. Students who now
+        miss a prerequisite or have a clashing class are passed over and keep
+        their place, marked with the reason. Runs as one transaction; call it
+        in the same transaction that frees the seat so nobody else can take
+        it first. Returns the new enrollments.
+        """
+        promoted = []
+        with transaction.atomic():
+            queue = self.select_for_update().filter(offering=offering).select_related('student').order_by('id')
+            for entry in queue:
+                problem = offering.eligibility_error(entry.student)
+                if problem:
+                    if entry.skipped_reason != problem:
+                        entry.skipped_reason = problem
+                        entry.save(update_fields=['skipped_reason'])
+                    continue
+                enrollment, result = Enrollment.objects.reserve(entry.student, offering)
+                if result == Enrollment.FULL:
+                    break
+                entry.delete()
+                if result == Enrollment.RESERVED:
+                    promoted.append(enrollment)
+        return promoted
+
+
+class WaitlistEntry(models.Model):
+    """Model representing a student's place in the queue for a full course offering"""
+    offering = models.ForeignKey(CourseOffering, on_delete=models.CASCADE, related_name='waitlist')
+    student = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                limit_choices_to={'role': 'student'},
+                                related_name='waitlist_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+    skipped_reason = models.CharField(max_length=200, blank=True,
+                                      help_text="Why the student was passed over when a seat last freed up")
+
+    objects = WaitlistManager()
+
+    class Meta:
+        unique_together = ['offering', 'student']
+        ordering = ['offering', 'id']  # Queue order is insertion order
+        verbose_name_plural = "Waitlist entries"
+
+    def __str__(self):
+        return f"{self.student.username} - {self.offering.course.code} (waitlist)"
+
+    def position(self):
+        """1-based place in the queue."""
+        return WaitlistEntry.objects.filter(offering_id=self.offering_id, id__lte=self.id).count()
 
 class ProgramEnrollment(models.Model):
     """Model representing student enrollment in programs"""
@@ -356,6 +620,8 @@ class ProgramEnrollment(models.Model):
         ]
     )
     current_semester = models.IntegerField(default=1, validators=[MinValueValidator(1)])
+    credits_earned = models.IntegerField(default=0, editable=False,
+                                         help_text="Curriculum credits completed, kept current from the transcript")
 
     class Meta:
         unique_together = ['student', 'program']
@@ -365,22 +631,252 @@ class ProgramEnrollment(models.Model):
         return f"{self.student.username} - {self.program.code}"
 
     def credits_completed(self):
-        completed_enrollments = Enrollment.objects.filter(
-            student=self.student,
-            course_offering__course__in=self.program.curriculum.all().values('course'),
-            status='completed'
-        )
-        return sum(
-            enrollment.credits_earned or enrollment.course_offering.course.credits
-            for enrollment in completed_enrollments
-        )
+        return self.credits_earned
 
     def progress_percentage(self):
         if self.program.total_credits > 0:
-            return (self.credits_completed() / self.program.total_credits) * 100
+            return (self.credits_earned / self.program.total_credits) * 100
         return 0
-    
-    
+
+
+class TranscriptSummaryManager(models.Manager):
+    def refresh(self, student_ids):
+        """
+        Recomputes the transcript summary and per-program progress of the
+        given students from their enrollment history, in a fixed number of
+        queries. Enrollment.save() calls it when a grade or status changes.
+        """
+        student_ids = list(student_ids)
+        history = {student_id: [] for student_id in student_ids}
+        rows = Enrollment.objects.filter(student_id__in=student_ids).values_list(
+            'student_id', 'course_offering__course_id', 'course_offering__course__credits',
+            'credits_earned', 'grade', 'status',
+        )
+        for student_id, *row in rows:
+            history[student_id].append(row)
+        summaries = {student_id: summarize(rows) for student_id, rows in history.items()}
+
+        program_enrollments = list(
+            ProgramEnrollment.objects.filter(student_id__in=student_ids).only('student_id', 'program_id', 'credits_earned')
+        )
+        curricula = {}
+        for program_id, course_id in ProgramCurriculum.objects.filter(
+            program_id__in={pe.program_id for pe in program_enrollments}
+        ).values_list('program_id', 'course_id'):
+            curricula.setdefault(program_id, set()).add(course_id)
+
+        changed = []
+        for program_enrollment in program_enrollments:
+            credits = program_credits(
+                summaries[program_enrollment.student_id].completed_courses,
+                curricula.get(program_enrollment.program_id, set()),
+            )
+            if credits != program_enrollment.credits_earned:
+                program_enrollment.credits_earned = credits
+                changed.append(program_enrollment)
+
+        now = timezone.now()
+        existing = self.in_bulk(student_ids, field_name='student_id')
+        new, updated = [], []
+        for student_id, summary in summaries.items():
+            row = existing.get(student_id) or TranscriptSummary(student_id=student_id)
+            row.credits_earned = summary.credits_earned
+            row.graded_credits = summary.graded_credits
+            row.quality_points = summary.quality_points
+            row.gpa = summary.gpa
+            row.courses_completed = summary.courses_completed
+            row.updated_at = now
+            (updated if row.pk else new).append(row)
+
+        with transaction.atomic():
+            ProgramEnrollment.objects.bulk_update(changed, ['credits_earned'])
+            self.bulk_create(new)
+            self.bulk_update(updated, [
+                'credits_earned', 'graded_credits', 'quality_points', 'gpa', 'courses_completed', 'updated_at'
+            ])
+
+
+class TranscriptSummary(models.Model):
+    """Model holding a student's precomputed credits and GPA"""
+    student = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                                   limit_choices_to={'role': 'student'},
+                                   related_name='transcript_summary')
+    credits_earned = models.IntegerField(default=0)
+    graded_credits = models.IntegerField(default=0, help_text="Credits that count towards the GPA")
+    quality_points = models.DecimalField(max_digits=8, decimal_places=2, default=0)
+    gpa = models.DecimalField(max_digits=3, decimal_places=2, default=0)
+    courses_completed = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = TranscriptSummaryManager()
+
+    class Meta:
+        verbose_name_plural = "Transcript summaries"
+
+    def __str__(self):
+        return f"{self.student.username} - GPA {self.gpa}"
+
+
+class StudentAccountManager(models.Manager):
+    def open_accounts(self, keys):
+        """
+        Returns {(student_id, program_id): account} for the given keys,
+        creating missing accounts and locking all of them for the current
+        transaction. Uses a fixed number of queries regardless of len(keys).
+        """
+        keys = set(keys)
+        student_ids = {student_id for student_id, _ in keys}
+
+        def fetch():
+            accounts = self.select_for_update().filter(student_id__in=student_ids)
+            return {
+                (a.student_id, a.program_id): a for a in accounts
+                if (a.student_id, a.program_id) in keys
+            }
+
+        accounts = fetch()
+        missing = keys - accounts.keys()
+        if missing:
+            programs = Program.objects.in_bulk({program_id for _, program_id in missing if program_id})
+            upfront = FEE_BILLING == 'program'
+            new_accounts = []
+            for student_id, program_id in missing:
+                program = programs.get(program_id)
+                opening = Decimal('0.00')
+                if program:
+                    opening = program.total_program_fee() if upfront else program.registration_fee
+                new_accounts.append(self.model(
+                    student_id=student_id, program_id=program_id,
+                    opening_balance=opening, balance=opening, billed_upfront=upfront,
+                ))
+            self.bulk_create(new_accounts, ignore_conflicts=True)
+            accounts = fetch()
+        return accounts
+
+    def reconcile(self, fix=False):
+        """
+        Recomputes every balance from the ledger in one aggregate pass.
+        Returns (key, stored_balance, expected_balance) for each account that
+        disagrees with its records; with fix=True the stored balances are
+        corrected (and missing accounts created).
+        """
+        totals = FinanceRecord.objects.values('student_id', 'program_id').annotate(
+            charges=Sum('amount', filter=Q(transaction_type__in=FinanceRecord.CHARGE_TYPES), default=0),
+            credits=Sum('amount', filter=Q(transaction_type__in=FinanceRecord.CREDIT_TYPES), default=0),
+        )
+        net = {
+            (row['student_id'], row['program_id']): row['charges'] - row['credits']
+            for row in totals
+        }
+
+        with transaction.atomic():
+            if fix and net:
+                self.open_accounts(net.keys())  # creates any missing accounts
+            accounts = {(a.student_id, a.program_id): a for a in self.select_for_update()}
+
+            mismatches, corrected = [], []
+            for key, account in accounts.items():
+                expected = account.opening_balance + net.get(key, Decimal('0.00'))
+                if account.balance != expected:
+                    mismatches.append((key, account.balance, expected))
+                    account.balance = expected
+                    corrected.append(account)
+            # Records without any account (only possible when not fixing)
+            mismatches.extend((key, None, None) for key in net.keys() - accounts.keys())
+
+            if fix and corrected:
+                self.bulk_update(corrected, ['balance'], batch_size=1000)
+        return mismatches
+
+
+class StudentAccount(models.Model):
+    """Running fee balance per student and program, moved by every FinanceRecord"""
+    student = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        limit_choices_to={'role': 'student'},
+        related_name='fee_accounts'
+    )
+    program = models.ForeignKey(
+        'Program',
+        on_delete=models.PROTECT,  # SET_NULL could merge two accounts into one key
+        null=True,
+        blank=True,
+        related_name='fee_accounts'
+    )
+    opening_balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        help_text="Fees owed when the account was opened: the whole program, or only registration"
+    )
+    billed_upfront = models.BooleanField(
+        default=True,
+        help_text="Opening balance covers every semester, so semester charges are skipped"
+    )
+    balance = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StudentAccountManager()
+
+    class Meta:
+        unique_together = ['student', 'program']
+        constraints = [
+            # NULLs are distinct in unique_together, so accounts without a program need their own rule
+            models.UniqueConstraint(
+                fields=['student'], condition=Q(program__isnull=True), name='unique_account_without_program',
+            ),
+        ]
+
+    def __str__(self):
+        program = self.program.code if self.program else "No program"
+        return f"{self.student.username} - {program}: {self.balance}"
+
+
+class FinanceRecordQuerySet(models.QuerySet):
+    GROUPED_UPDATE_LIMIT = 50
+
+    def bulk_post(self, records, batch_size=1000):
+        """
+        Appends many unsaved FinanceRecords to the ledger in a few queries.
+        balance_after is computed in one pass over the records, in order,
+        starting from each account's locked balance.
+        """
+        records = list(records)
+        if not records:
+            return []
+
+        with transaction.atomic():
+            accounts = StudentAccount.objects.open_accounts(
+                (r.student_id, r.program_id) for r in records
+            )
+            opening = {key: account.balance for key, account in accounts.items()}
+            now = timezone.now()
+            for record in records:
+                account = accounts[(record.student_id, record.program_id)]
+                account.balance += record.signed_amount()
+                account.updated_at = now
+                record.balance_after = account.balance
+
+            created = self.bulk_create(records, batch_size=batch_size)
+
+            # Uniform postings (e.g. a semester charge) share a handful of
+            # distinct deltas: one UPDATE per delta is far cheaper than a
+            # CASE-per-row bulk_update.
+            by_delta = {}
+            for key, account in accounts.items():
+                by_delta.setdefault(account.balance - opening[key], []).append(account.pk)
+            if len(by_delta) <= self.GROUPED_UPDATE_LIMIT:
+                for delta, pks in by_delta.items():
+                    for start in range(0, len(pks), batch_size):
+                        StudentAccount.objects.filter(pk__in=pks[start:start + batch_size]).update(
+                            balance=F('balance') + delta, updated_at=now
+                        )
+            else:
+                StudentAccount.objects.bulk_update(
+                    list(accounts.values()), ['balance', 'updated_at'], batch_size=batch_size
+                )
+        return created
 
 
 class FinanceRecord(models.Model):
@@ -390,6 +886,9 @@ class FinanceRecord(models.Model):
         ('refund', 'Refund'),
         ('adjustment', 'Adjustment'),
     )
+    # Charges raise the balance owed; credits lower it
+    CHARGE_TYPES = ('fee', 'adjustment')
+    CREDIT_TYPES = ('payment', 'refund')
 
     student = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -405,6 +904,14 @@ class FinanceRecord(models.Model):
         related_name='finance_records',
         help_text="Program associated with this transaction"
     )
+    semester = models.ForeignKey(
+        'Semester',
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='finance_records',
+        help_text="Semester a fee charge belongs to"
+    )
     transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
     description = models.CharField(max_length=255)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
@@ -419,36 +926,56 @@ class FinanceRecord(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = FinanceRecordQuerySet.as_manager()
+
     class Meta:
         ordering = ['id']  # Use ID to preserve insertion order
+        indexes = [
+            models.Index(fields=['student', 'program'], name='finance_student_program'),
+        ]
+        constraints = [
+            # A student is charged a semester's fees at most once per program
+            models.UniqueConstraint(
+                fields=['student', 'program', 'semester'],
+                condition=Q(transaction_type='fee', semester__isnull=False),
+                name='unique_semester_fee_charge',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.student.username} - {self.transaction_type} - {self.amount}"
 
-    def save(self, *args, **kwargs):
-        # Total program fee
-        program_total_fee = self.program.total_program_fee() if self.program else Decimal('0.00')
-
-        # Sum of previous payments (for the same student & program)
-        previous_payments = FinanceRecord.objects.filter(
-            student=self.student,
-            program=self.program
-        ).exclude(pk=self.pk)  # exclude current record if updating
-
-        total_paid = sum(
-            r.amount if r.transaction_type in ('payment', 'refund') else -r.amount
-            for r in previous_payments
-        )
+    def signed_amount(self, transaction_type=None, amount=None):
+        """Change this record makes to the balance owed."""
+        transaction_type = transaction_type or self.transaction_type
+        amount = self.amount if amount is None else amount
+        return amount if transaction_type in self.CHARGE_TYPES else -amount
 
-        # Calculate remaining balance
-        if self.transaction_type in ('payment', 'refund'):
-            total_paid += self.amount
-        elif self.transaction_type in ('fee', 'adjustment'):
-            total_paid -= self.amount
+    def _move_balance(self, student_id, program_id, delta):
+        account = StudentAccount.objects.open_accounts([(student_id, program_id)])[(student_id, program_id)]
+        StudentAccount.objects.filter(pk=account.pk).update(balance=F('balance') + delta)
+        return StudentAccount.objects.values_list('balance', flat=True).get(pk=account.pk)
 
-        self.balance_after = program_total_fee - total_paid
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            # Editing a posted record: undo its previous effect first
+            if self.pk is not None:
+                previous = FinanceRecord.objects.filter(pk=self.pk).values(
+                    'student_id', 'program_id', 'transaction_type', 'amount'
+                ).first()
+                if previous:
+                    self._move_balance(
+                        previous['student_id'], previous['program_id'],
+                        -self.signed_amount(previous['transaction_type'], previous['amount'])
+                    )
 
-        super().save(*args, **kwargs)
+            self.balance_after = self._move_balance(self.student_id, self.program_id, self.signed_amount())
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            self._move_balance(self.student_id, self.program_id, -self.signed_amount())
+            return super().delete(*args, **kwargs)
 
 
 
@@ -489,4 +1016,182 @@ class Event(models.Model):
     def __str__(self):
         return self.title
     
-    
\ No newline at end of file
+    
+
+class LibraryResourceCache(models.Model):
+    """AI library recommendations cached per course and model/prompt version"""
+    course = models.ForeignKey(Course, on_delete=models.CASCADE, related_name='cached_resources')
+    version = models.CharField(max_length=50, help_text="Model and prompt version that produced the answer")
+    resources = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['course', 'version']
+        ordering = ['-created_at']
+        verbose_name = "Library resource cache entry"
+        verbose_name_plural = "Library resource cache"
+
+    def __str__(self):
+        return f"{self.course.code} ({self.version})"
+
+    def is_expired(self):
+        return self.expires_at <= timezone.now()
+
+
+class AIJobManager(models.Manager):
+    def enqueue(self, kind, payload, user=None):
+        """Queues a job for the AI workers and returns it immediately."""
+        return self.create(kind=kind, payload=payload, user=user)
+
+    def enqueue_shared(self, kind, payload, user=None):
+        """
+        Like enqueue(), but returns the queued or running job with the same
+        kind and payload if there is one, so users waiting for the same
+        result share a single model call.
+        """
+        with transaction.atomic():
+            job = self.filter(
+                kind=kind, payload=payload, status__in=[AIJob.QUEUED, AIJob.RUNNING]
+            ).order_by('id').first()
+            return job or self.enqueue(kind, payload, user=user)
+
+    def claim(self, worker):
+        """
+        Takes the oldest runnable job for this worker, or returns None.
+        The claim is a conditional UPDATE on the job's status, so two workers
+        racing for the same row cannot both win it.
+        """
+        while True:
+            job = self.filter(
+                status=AIJob.QUEUED, available_at__lte=timezone.now()
+            ).order_by('available_at', 'id').first()
+            if job is None:
+                return None
+            now = timezone.now()
+            claimed = self.filter(pk=job.pk, status=AIJob.QUEUED).update(
+                status=AIJob.RUNNING, worker=worker, attempts=F('attempts') + 1, started_at=now,
+            )
+            if claimed:
+                job.refresh_from_db()
+                return job
+
+    def requeue_stale(self, older_than):
+        """
+        Hands back jobs whose worker died mid-run: running jobs started before
+        `older_than` return to the queue, or fail if they have no attempts
+        left. Returns how many were requeued.
+        """
+        stale = self.filter(status=AIJob.RUNNING, started_at__lt=older_than)
+        stale.filter(attempts__gte=F('max_attempts')).update(
+            status=AIJob.FAILED, worker='', error='Worker stopped before the job finished',
+            finished_at=timezone.now(),
+        )
+        return stale.update(status=AIJob.QUEUED, worker='', available_at=timezone.now())
+
+
+class AIJob(models.Model):
+    """Model representing a queued AI generation request, run by the AI workers"""
+    QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    KIND_CHOICES = [
+        ('questions', 'Revision questions'),
+        ('timetable', 'Timetable'),
+        ('library', 'Library resources'),
+    ]
+    # Kinds whose results are not personal: any signed-in user may read them
+    SHARED_KINDS = ('library',)
+
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
+                             null=True, blank=True, related_name='ai_jobs')
+    payload = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    worker = models.CharField(max_length=100, blank=True, help_text="Worker that last claimed the job")
+    created_at = models.DateTimeField(auto_now_add=True)
+    available_at = models.DateTimeField(default=timezone.now, help_text="Not claimed before this time (retry backoff)")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    run_ms = models.IntegerField(null=True, blank=True, help_text="Duration of the last attempt")
+
+    objects = AIJobManager()
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "AI job"
+        indexes = [
+            models.Index(fields=['status', 'available_at'], name='aijob_runnable'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.status})"
+
+    @property
+    def is_finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+
+    def queued_ms(self):
+        """Time from enqueue to the start of the last attempt."""
+        if self.started_at is None:
+            return None
+        return int((self.started_at - self.created_at).total_seconds() * 1000)
+
+
+class AIUsage(models.Model):
+    """Model representing one day of usage of an AI feature, summed from core.ai_metrics"""
+    date = models.DateField()
+    feature = models.CharField(max_length=30)
+    requests = models.IntegerField(default=0)
+    model_calls = models.IntegerField(default=0)
+    errors = models.IntegerField(default=0)
+    fallbacks = models.IntegerField(default=0)
+    cache_hits = models.IntegerField(default=0)
+    prompt_tokens = models.BigIntegerField(default=0)
+    response_tokens = models.BigIntegerField(default=0)
+    latency_ms_total = models.BigIntegerField(default=0)
+    latency_histogram = models.JSONField(default=list, help_text="Model call counts per core.ai_metrics latency bucket")
+    cost = models.DecimalField(max_digits=12, decimal_places=6, default=0, help_text="USD")
+
+    class Meta:
+        unique_together = ['date', 'feature']
+        ordering = ['-date', 'feature']
+        verbose_name = "AI usage"
+        verbose_name_plural = "AI usage"
+
+    def __str__(self):
+        return f"{self.feature} on {self.date}"
+
+    def add(self, row):
+        for field in ('requests', 'model_calls', 'errors', 'fallbacks', 'cache_hits',
+                      'prompt_tokens', 'response_tokens', 'latency_ms_total', 'cost'):
+            setattr(self, field, getattr(self, field) + row[field])
+        histogram = self.latency_histogram or [0] * len(row['histogram'])
+        self.latency_histogram = [a + b for a, b in zip(histogram, row['histogram'])]
+
+    def latency_percentile(self, percentile):
+        """
+        Upper bound (ms) of the histogram bucket holding the given percentile.
+        None without model calls, or when it falls in the open-ended last bucket.
+        """
+        total = sum(self.latency_histogram or [])
+        if not total:
+            return None
+        rank = total * percentile / 100
+        seen = 0
+        for index, count in enumerate(self.latency_histogram):
+            seen += count
+            if seen >= rank:
+                return LATENCY_BUCKETS_MS[index] if index < len(LATENCY_BUCKETS_MS) else None
+        return None
+
+    def average_latency(self):
+        return self.latency_ms_total // self.model_calls if self.model_calls else None
@@ -0,0 +1,311 @@
+import threading
+import time
+import uuid
+from collections import deque, namedtuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import CoursePrerequisite
+
+# A chain longer than the longest curriculum (12 semesters) can never be completed
+MAX_CHAIN_DEPTH = 12
+# Changes made by another process are seen through a version key in the shared
+# cache, checked at most every CHECK_INTERVAL seconds. The TTL bounds staleness
+# when the cache is per-process (the default LocMemCache).
+PREREQUISITE_GRAPH_TTL = getattr(settings, "PREREQUISITE_GRAPH_TTL", 300)
+PREREQUISITE_GRAPH_CHECK_INTERVAL = getattr(settings, "PREREQUISITE_GRAPH_CHECK_INTERVAL", 5)
+VERSION_KEY = "prerequisite_graph:version"
+
+Requirement = namedtuple("Requirement", ["prerequisite_id", "code", "is_mandatory", "minimum_grade"])
+
+
+def _bits(mask):
+    position = 0
+    while mask:
+        if mask & 1:
+            yield position
+        mask >>= 1
+        position += 1
+
+
+class PrerequisiteGraph:
+    """
+    In-memory prerequisite DAG over all courses. Every course gets a bit
+    position; closure[pos] is the bitset of all its direct and transitive
+    prerequisites, so ancestry and cycle checks are a single AND.
+    Built lazily and kept in sync through CoursePrerequisite signals
+    (see core/signals.py); rebuilt when another process changed the
+    prerequisites or PREREQUISITE_GRAPH_TTL has passed.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.reset()
+
+    def reset(self):
+        """Drops everything; the next call rebuilds from the database."""
+        self._built = False
+        self._version = None
+        self._expires_at = 0
+        self._checked_at = 0
+        self.index = {}        # course_id -> bit position
+        self.ids = []          # bit position -> course_id
+        self.codes = {}        # course_id -> course code
+        self.edges = {}        # course_id -> {prerequisite_id: Requirement}
+        self.edge_keys = {}    # CoursePrerequisite pk -> (course_id, prerequisite_id)
+        self.closure = []      # bit position -> bitset of all prerequisites
+        self.required = {}     # course_id -> bitset of its direct mandatory prerequisites
+        self.depth = []        # bit position -> longest prerequisite chain, None on a cycle
+        self.order = []        # course ids, prerequisites first
+        self.cyclic = set()    # course ids on (or depending on) a cycle
+
+    # Building
+
+    def _is_stale(self):
+        now = time.monotonic()
+        if now >= self._expires_at:
+            return True
+        if now - self._checked_at < PREREQUISITE_GRAPH_CHECK_INTERVAL:
+            return False
+        self._checked_at = now
+        return cache.get(VERSION_KEY) != self._version
+
+    def ensure_built(self):
+        if self._built and not self._is_stale():
+            return
+        with self._lock:
+            if self._built and not self._is_stale():
+                return
+            # Read the version first: a change committed during the build only
+            # causes one extra rebuild, never a missed one
+            version = cache.get(VERSION_KEY)
+            if version is None:
+                version = uuid.uuid4().hex
+                cache.add(VERSION_KEY, version, None)
+                version = cache.get(VERSION_KEY, version)
+
+            fresh = PrerequisiteGraph()
+            rows = CoursePrerequisite.objects.values_list(
+                'pk', 'course_id', 'course__code', 'prerequisite_id', 'prerequisite__code',
+                'is_mandatory', 'minimum_grade',
+            )
+            for pk, course_id, course_code, prereq_id, prereq_code, mandatory, minimum in rows:
+                fresh.codes[course_id] = course_code
+                fresh._add_edge(pk, course_id, Requirement(prereq_id, prereq_code, mandatory, minimum))
+            fresh._refresh()
+
+            # Swap the finished structures in; readers never see a half-built graph
+            for name in ('index', 'ids', 'codes', 'edges', 'edge_keys', 'closure', 'required',
+                         'depth', 'order', 'cyclic'):
+                setattr(self, name, getattr(fresh, name))
+            self._version = version
+            self._expires_at = time.monotonic() + PREREQUISITE_GRAPH_TTL
+            self._checked_at = time.monotonic()
+            self._built = True
+
+    def _publish(self):
+        """Tells other processes to rebuild, once the change is committed."""
+        version = uuid.uuid4().hex
+
+        def bump():
+            cache.set(VERSION_KEY, version, None)
+            if self._built:
+                self._version = version  # this process already applied the change
+
+        transaction.on_commit(bump)
+
+    def _position(self, course_id):
+        position = self.index.get(course_id)
+        if position is None:
+            position = len(self.ids)
+            self.index[course_id] = position
+            self.ids.append(course_id)
+            self.closure.append(0)
+            self.depth.append(0)
+        return position
+
+    def _add_edge(self, pk, course_id, requirement):
+        self._position(course_id)
+        self._position(requirement.prerequisite_id)
+        self.codes.setdefault(requirement.prerequisite_id, requirement.code)
+        self.edges.setdefault(course_id, {})[requirement.prerequisite_id] = requirement
+        self.edge_keys[pk] = (course_id, requirement.prerequisite_id)
+
+    def _remove_edge(self, pk):
+        key = self.edge_keys.pop(pk, None)
+        if key is None:
+            return None
+        course_id, prereq_id = key
+        self.edges.get(course_id, {}).pop(prereq_id, None)
+        return course_id
+
+    def _toposort(self):
+        """Kahn's algorithm. Courses that never become ready sit on or behind a cycle."""
+        waiting = {course_id: len(prereqs) for course_id, prereqs in self.edges.items() if prereqs}
+        dependents = {}
+        for course_id, prereqs in self.edges.items():
+            for prereq_id in prereqs:
+                dependents.setdefault(prereq_id, []).append(course_id)
+
+        ready = deque(course_id for course_id in self.ids if course_id not in waiting)
+        order = []
+        while ready:
+            course_id = ready.popleft()
+            order.append(course_id)
+            for dependent in dependents.get(course_id, ()):
+                waiting[dependent] -= 1
+                if waiting[dependent] == 0:
+                    ready.append(dependent)
+        return order
+
+    def _refresh(self, affected=None):
+        """Recomputes closure and depth for the affected courses (default: all)."""
+        self.order = self._toposort()
+        self.cyclic = set(self.ids) - set(self.order)
+
+        for course_id in self.order:
+            if affected is not None and course_id not in affected:
+                continue
+            mask, depth = 0, 0
+            for prereq_id in self.edges.get(course_id, ()):
+                position = self.index[prereq_id]
+                mask |= self.closure[position] | (1 << position)
+                depth = max(depth, self.depth[position] + 1)
+            position = self.index[course_id]
+            self.closure[position] = mask
+            self.depth[position] = depth
+            self._update_required(course_id)
+
+        # Closures on a cycle have no topological order: iterate to a fixed point
+        for course_id in self.cyclic:
+            self.closure[self.index[course_id]] = 0
+            self._update_required(course_id)
+        changed = bool(self.cyclic)
+        while changed:
+            changed = False
+            for course_id in self.cyclic:
+                position = self.index[course_id]
+                mask = self.closure[position]
+                for prereq_id in self.edges.get(course_id, ()):
+                    prereq_position = self.index[prereq_id]
+                    mask |= self.closure[prereq_position] | (1 << prereq_position)
+                if mask != self.closure[position]:
+                    self.closure[position] = mask
+                    changed = True
+        for course_id in self.cyclic:
+            self.depth[self.index[course_id]] = None
+
+    def _update_required(self, course_id):
+        mask = 0
+        for requirement in self.edges.get(course_id, {}).values():
+            if requirement.is_mandatory:
+                mask |= 1 << self.index[requirement.prerequisite_id]
+        if mask:
+            self.required[course_id] = mask
+        else:
+            self.required.pop(course_id, None)
+
+    def _dependents_of(self, course_id):
+        """The course plus every course that (transitively) requires it."""
+        bit = 1 << self.index[course_id]
+        return {course_id} | {self.ids[pos] for pos, mask in enumerate(self.closure) if mask & bit}
+
+    # Incremental updates (called from signals)
+
+    def update(self, prereq):
+        """Adds or replaces one CoursePrerequisite edge."""
+        self._publish()
+        if not self._built:
+            return  # picked up by the first full build
+        with self._lock:
+            old_course_id = self._remove_edge(prereq.pk)
+            self.codes[prereq.course_id] = prereq.course.code
+            requirement = Requirement(
+                prereq.prerequisite_id, prereq.prerequisite.code, prereq.is_mandatory, prereq.minimum_grade
+            )
+            self._add_edge(prereq.pk, prereq.course_id, requirement)
+            affected = self._dependents_of(prereq.course_id)
+            if old_course_id is not None and old_course_id != prereq.course_id:
+                affected |= self._dependents_of(old_course_id)
+            self._refresh(affected)
+
+    def remove(self, prereq):
+        self._publish()
+        if not self._built:
+            return
+        with self._lock:
+            course_id = self._remove_edge(prereq.pk)
+            if course_id is not None:
+                self._refresh(self._dependents_of(course_id))
+
+    def rename(self, course):
+        """Keeps cached course codes current when a course is edited."""
+        self._publish()
+        if not self._built or course.pk not in self.index:
+            return
+        with self._lock:
+            self.codes[course.pk] = course.code
+            for course_id, prereqs in self.edges.items():
+                if course.pk in prereqs:
+                    prereqs[course.pk] = prereqs[course.pk]._replace(code=course.code)
+
+    # Queries
+
+    def requirements(self, course_id):
+        """Direct prerequisites of a course as Requirement tuples."""
+        self.ensure_built()
+        return list(self.edges.get(course_id, {}).values())
+
+    def all_prerequisites(self, course_id):
+        """Ids of every direct and transitive prerequisite of the course."""
+        self.ensure_built()
+        position = self.index.get(course_id)
+        if position is None:
+            return set()
+        return {self.ids[bit] for bit in _bits(self.closure[position])}
+
+    def would_create_cycle(self, course_id, prereq_id):
+        """True if making prereq_id a prerequisite of course_id closes a loop."""
+        if course_id == prereq_id:
+            return True
+        self.ensure_built()
+        if course_id not in self.index or prereq_id not in self.index:
+            return False
+        return bool(self.closure[self.index[prereq_id]] & (1 << self.index[course_id]))
+
+    def chain_depth(self, course_id):
+        """Longest prerequisite chain below the course (None if it is on a cycle)."""
+        self.ensure_built()
+        position = self.index.get(course_id)
+        return 0 if position is None else self.depth[position]
+
+    def unlocked_by(self, completed_ids):
+        """
+        Courses not yet completed whose mandatory prerequisites are all in
+        completed_ids, and which require at least one of them.
+        """
+        self.ensure_built()
+        done = 0
+        for course_id in completed_ids:
+            if course_id in self.index:
+                done |= 1 << self.index[course_id]
+
+        return [
+            course_id for course_id, required in self.required.items()
+            if not required & ~done and course_id not in completed_ids
+        ]
+
+    def topological_order(self, course_ids=None):
+        """Course ids with prerequisites first, optionally limited to course_ids."""
+        self.ensure_built()
+        if course_ids is None:
+            return list(self.order)
+        course_ids = set(course_ids)
+        ordered = [course_id for course_id in self.order if course_id in course_ids]
+        seen = set(ordered)
+        return ordered + [course_id for course_id in course_ids if course_id not in seen]
+
+
+prerequisite_graph = PrerequisiteGraph()
@@ -0,0 +1,58 @@
+from collections import namedtuple
+
+from .models import Enrollment
+from .prerequisite_graph import prerequisite_graph
+
+# Higher is better. Only letter grades can satisfy a minimum grade;
+# W, I, IP and ungraded completions rank below F.
+GRADE_RANK = {'A': 5, 'B': 4, 'C': 3, 'D': 2, 'F': 1}
+
+
+def grade_rank(grade):
+    return GRADE_RANK.get((grade or '').strip().upper(), 0)
+
+
+class Eligibility(namedtuple("Eligibility", ["prerequisites", "missing"])):
+    """All Requirements of a course, and the mandatory ones the student has not met."""
+
+    @property
+    def eligible(self):
+        return not self.missing
+
+
+def load_transcript(student):
+    """{course_id: best grade rank} over the student's completed courses, in one query."""
+    transcript = {}
+    rows = Enrollment.objects.filter(
+        student=student, status='completed', is_active=True
+    ).values_list('course_offering__course_id', 'grade')
+    for course_id, grade in rows:
+        transcript[course_id] = max(transcript.get(course_id, 0), grade_rank(grade))
+    return transcript
+
+
+def is_met(requirement, transcript):
+    if requirement.prerequisite_id not in transcript:
+        return False
+    if requirement.minimum_grade:
+        return transcript[requirement.prerequisite_id] >= grade_rank(requirement.minimum_grade)
+    return True
+
+
+def check_course(requirements, transcript):
+    missing = [r for r in requirements if r.is_mandatory and not is_met(r, transcript)]
+    return Eligibility(requirements, missing)
+
+
+def evaluate_offerings(student, offerings, transcript=None):
+    """
+    Returns {offering_id: Eligibility} for every offering. Prerequisites come
+    from the cached prerequisite graph, so this costs one query (the
+    student's transcript) however many offerings there are.
+    """
+    if transcript is None:
+        transcript = load_transcript(student)
+    return {
+        offering.id: check_course(prerequisite_graph.requirements(offering.course_id), transcript)
+        for offering in offerings
+    }
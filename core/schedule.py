@@ -0,0 +1,110 @@
+import re
+from collections import namedtuple
+from datetime import time
+
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# The week is encoded as 7 days x 48 half-hour slots; bit (day * 48 + slot)
+# is set when that half hour is taken. Clash checks are then a single AND.
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+Meeting = namedtuple("Meeting", ["day", "start", "end"])
+
+_DAY_ALIASES = {
+    "mon": 0, "monday": 0,
+    "tue": 1, "tues": 1, "tuesday": 1,
+    "wed": 2, "weds": 2, "wednesday": 2,
+    "thu": 3, "thur": 3, "thurs": 3, "thursday": 3,
+    "fri": 4, "friday": 4,
+    "sat": 5, "saturday": 5,
+    "sun": 6, "sunday": 6,
+}
+
+_DAY_RE = re.compile(r"\b(" + "|".join(sorted(_DAY_ALIASES, key=len, reverse=True)) + r")\b\.?", re.IGNORECASE)
+_RANGE_RE = re.compile(
+    r"(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)?\s*(?:-|–|—|to)\s*(\d{1,2})(?:[:.](\d{2}))?\s*(am|pm)?",
+    re.IGNORECASE,
+)
+
+
+def _to_minutes(hour, minute, meridiem):
+    hour, minute = int(hour), int(minute or 0)
+    if meridiem:
+        meridiem = meridiem.lower()
+        if meridiem == "pm" and hour < 12:
+            hour += 12
+        elif meridiem == "am" and hour == 12:
+            hour = 0
+    return hour * 60 + minute
+
+
+def _parse_range(match):
+    h1, m1, ap1, h2, m2, ap2 = match.groups()
+    # "2-4pm": the start shares the end's meridiem when that keeps it before the end
+    if ap2 and not ap1 and _to_minutes(h1, m1, ap2) < _to_minutes(h2, m2, ap2):
+        ap1 = ap2
+    start, end = _to_minutes(h1, m1, ap1), _to_minutes(h2, m2, ap2)
+    if not 0 <= start < end <= 24 * 60:
+        return None
+    return start, end
+
+
+def _minutes_to_time(minutes):
+    return time(minutes // 60, minutes % 60) if minutes < 24 * 60 else time(23, 59)
+
+
+def parse_schedule(text):
+    """
+    Parses free-text schedules such as "Mon, Wed 08:00-10:00; Fri 2-4pm"
+    into Meeting tuples. Days listed without a time carry over to the next
+    time range. Text that cannot be understood is ignored.
+    """
+    meetings = []
+    pending_days = []
+
+    for segment in re.split(r"[;,\n]|\band\b|&|/", text or ""):
+        days = [_DAY_ALIASES[d.lower()] for d in _DAY_RE.findall(segment)]
+        match = _RANGE_RE.search(_DAY_RE.sub(" ", segment))
+        pending_days.extend(d for d in days if d not in pending_days)
+        if not match:
+            continue
+
+        parsed = _parse_range(match)
+        if parsed and pending_days:
+            start, end = parsed
+            for day in pending_days:
+                meeting = Meeting(day, _minutes_to_time(start), _minutes_to_time(end))
+                if meeting not in meetings:
+                    meetings.append(meeting)
+        pending_days = []
+
+    return meetings
+
+
+def slot_range(start, end):
+    """Half-hour slot indexes covered by [start, end) within a day."""
+    first = (start.hour * 60 + start.minute) // SLOT_MINUTES
+    last = -(-(end.hour * 60 + end.minute) // SLOT_MINUTES)  # round up
+    return range(first, last)
+
+
+def day_mask(start, end):
+    """Bitmask of the half-hour slots covered by [start, end) within one day."""
+    mask = 0
+    for slot in slot_range(start, end):
+        mask |= 1 << slot
+    return mask
+
+
+def week_mask(meetings):
+    """Bitmask of every half-hour slot the meetings cover across the week."""
+    mask = 0
+    for meeting in meetings:
+        mask |= day_mask(meeting.start, meeting.end) << (meeting.day * SLOTS_PER_DAY)
+    return mask
+
+
+def format_slot_time(slot):
+    minutes = slot * SLOT_MINUTES
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
@@ -0,0 +1,40 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .models import Semester
+
+# Cleared by signals whenever a Semester changes (see core/signals.py). The
+# TTL bounds staleness when another process made the change.
+CURRENT_SEMESTER_TTL = getattr(settings, "CURRENT_SEMESTER_TTL", 300)
+
+_lock = threading.Lock()
+_memo = None  # (semester or None, expires_at)
+
+
+def current_semester():
+    """The semester marked is_current, memoized for the whole process."""
+    global _memo
+    memo = _memo
+    if memo is not None and memo[1] > time.monotonic():
+        return memo[0]
+    with _lock:
+        if _memo is None or _memo[1] <= time.monotonic():
+            # Served by the one_current_semester partial unique index
+            semester = Semester.objects.filter(is_current=True).order_by().first()
+            _memo = (semester, time.monotonic() + CURRENT_SEMESTER_TTL)
+        return _memo[0]
+
+
+def registration_window():
+    """(registration_start, registration_end, add_drop_deadline) of the current semester, or None."""
+    semester = current_semester()
+    if semester is None:
+        return None
+    return semester.registration_start, semester.registration_end, semester.add_drop_deadline
+
+
+def forget_current_semester():
+    global _memo
+    _memo = None
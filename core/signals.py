@@ -0,0 +1,92 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .ai_faq_cache import faq_cache
+from .ai_retrieval import academic_index
+from .dashboard import invalidate_assignments, invalidate_student
+from .models import (
+    Assignment, Faculty, Department, Program, Course, CoursePrerequisite, Enrollment, ProgramCurriculum,
+    ProgramEnrollment, Semester, TranscriptSummary, WaitlistEntry
+)
+from .prerequisite_graph import prerequisite_graph
+from .semesters import forget_current_semester
+from .waitlist import invalidate_waitlist
+
+# Models whose content the academic assistant answers questions about
+ACADEMIC_DATA_MODELS = (Faculty, Department, Program, Course, ProgramCurriculum, Semester)
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def clear_faq_cache_on_academic_change(sender, **kwargs):
+    """Cached FAQ answers may quote stale fees or courses once the data changes."""
+    if sender in ACADEMIC_DATA_MODELS:
+        faq_cache.clear()
+
+
+@receiver(post_save)
+def update_academic_index(sender, instance, **kwargs):
+    if sender in ACADEMIC_DATA_MODELS:
+        academic_index.update(instance)
+
+
+@receiver(post_delete)
+def remove_from_academic_index(sender, instance, **kwargs):
+    if sender in ACADEMIC_DATA_MODELS:
+        academic_index.remove(instance)
+
+
+@receiver(post_save, sender=WaitlistEntry)
+@receiver(post_delete, sender=WaitlistEntry)
+def clear_cached_waitlist(sender, instance, **kwargs):
+    invalidate_waitlist(instance.offering_id)
+
+
+@receiver(post_save, sender=CoursePrerequisite)
+def update_prerequisite_graph(sender, instance, **kwargs):
+    prerequisite_graph.update(instance)
+
+
+@receiver(post_delete, sender=CoursePrerequisite)
+def remove_from_prerequisite_graph(sender, instance, **kwargs):
+    prerequisite_graph.remove(instance)
+
+
+@receiver(post_save, sender=Course)
+def rename_in_prerequisite_graph(sender, instance, **kwargs):
+    prerequisite_graph.rename(instance)
+
+
+@receiver(post_save, sender=ProgramEnrollment)
+def summarize_new_program_enrollment(sender, instance, created, **kwargs):
+    if created:
+        TranscriptSummary.objects.refresh([instance.student_id])
+
+
+@receiver(post_save, sender=ProgramCurriculum)
+@receiver(post_delete, sender=ProgramCurriculum)
+def refresh_program_progress(sender, instance, **kwargs):
+    """A curriculum change moves the progress of everyone in the program."""
+    student_ids = list(
+        ProgramEnrollment.objects.filter(program_id=instance.program_id).values_list('student_id', flat=True)
+    )
+    for start in range(0, len(student_ids), 500):
+        TranscriptSummary.objects.refresh(student_ids[start:start + 500])
+
+
+@receiver(post_save, sender=Semester)
+@receiver(post_delete, sender=Semester)
+def clear_current_semester(sender, **kwargs):
+    forget_current_semester()
+
+
+@receiver(post_save, sender=Enrollment)
+@receiver(post_delete, sender=Enrollment)
+def clear_student_dashboard(sender, instance, **kwargs):
+    invalidate_student(instance.student_id)
+
+
+@receiver(post_save, sender=Assignment)
+@receiver(post_delete, sender=Assignment)
+def clear_pending_assignments(sender, **kwargs):
+    invalidate_assignments()
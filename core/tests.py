@@ -1,3 +1,1495 @@
-from django.test import TestCase
+import asyncio
+import importlib
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import time as clock, timedelta
+from decimal import Decimal
+from io import StringIO
+from types import SimpleNamespace
+import unittest
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, OperationalError, connection, connections
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from .models import (
+    AIJob, AIUsage, Assignment, Course, CourseOffering, CoursePrerequisite, Department, Enrollment, Faculty,
+    FinanceRecord, LibraryResourceCache, OfferingMeeting, Program, StudentAccount, ProgramCurriculum, ProgramEnrollment, ProgramType, Semester,
+    TranscriptSummary, WaitlistEntry
+)
+from . import ai_care, ai_faq_cache, ai_metrics, ai_retrieval, ai_service, jobs, library_cache, models, signals, views
+from .ai_client import close_clients, get_client
+from .billing import charge_semester_fees
+from .library_cache import SingleFlight, get_course_resources
+from .ai_assignment import FALLBACK_TEXT as ASSIGNMENT_FALLBACK, AIAssignmentService
+from .ai_faq_cache import FAQCache, faq_cache
+from .ai_metrics import ACADEMIC_CHAT, ASSIGNMENT_CHAT, ModelCallRecord, UsageAggregator, record_event, set_source
+from .ai_retrieval import AcademicIndex, BM25Index, answer_fee_question
+from .ai_stream import JSONArrayStreamParser
+from .ai_memory import (
+    CONTEXT_TOKEN_BUDGET, HISTORY_TOKENS, MEMORY_WINDOW, SUMMARY_TOKENS, ConversationMemory, estimate_tokens
+)
+from .ai_limits import (
+    AdaptiveTimeout, CircuitBreaker, CircuitOpen, ModelBusy, ModelCallLimiter, TokenBucket, breaker, model_call,
+    model_calls, user_requests
+)
+from . import prerequisite_graph as graph_module
+from .prerequisite_graph import PrerequisiteGraph, prerequisite_graph
+from .schedule import Meeting, parse_schedule
+from .timetable_engine import CourseInput, build_timetable
+from .prerequisites import evaluate_offerings
+from .semesters import current_semester, forget_current_semester
+from .waitlist import waitlist_position
+
+
+def setUpModule():
+    # Model calls made anywhere in these tests must not reach the real AIUsage table at exit
+    patcher = mock.patch.object(ai_metrics, "usage", UsageAggregator())
+    patcher.start()
+    unittest.addModuleCleanup(patcher.stop)
+
+
+def make_offering(capacity=30, code="CS101"):
+    today = timezone.now().date()
+    faculty, _ = Faculty.objects.get_or_create(code="SCI", defaults={"name": "Science"})
+    department, _ = Department.objects.get_or_create(
+        faculty=faculty, code="CS", defaults={"name": "Computer Science"}
+    )
+    semester, _ = Semester.objects.get_or_create(code="S1", defaults={
+        "name": "Semester 1", "is_current": True,
+        "start_date": today, "end_date": today + timedelta(days=120),
+        "registration_start": today - timedelta(days=7), "registration_end": today + timedelta(days=7),
+        "add_drop_deadline": today + timedelta(days=14),
+    })
+    course = Course.objects.create(department=department, code=code, name=code, credits=3)
+    return CourseOffering.objects.create(course=course, semester=semester, capacity=capacity)
+
+
+def make_program(code="BSC", tuition=1000, registration=200, duration=2):
+    department = make_offering(code=f"{code}-C").course.department
+    program_type, _ = ProgramType.objects.get_or_create(
+        name="Degree", defaults={"duration_years": 4, "level": "Undergraduate"}
+    )
+    return Program.objects.create(
+        department=department, program_type=program_type, code=code, name=code, duration=duration,
+        total_credits=120, tuition_fee=tuition, registration_fee=registration,
+    )
+
+
+def make_students(count, prefix="student"):
+    User = get_user_model()
+    User.objects.bulk_create([
+        User(username=f"{prefix}{i}", role="student") for i in range(count)
+    ])
+    return list(User.objects.filter(username__startswith=prefix).order_by("id"))
+
+
+class SeatReservationTests(TestCase):
+    def test_full_offering_is_reported(self):
+        offering = make_offering(capacity=1)
+        first, second = make_students(2)
+
+        self.assertEqual(Enrollment.objects.reserve(first, offering)[1], Enrollment.RESERVED)
+        enrollment, result = Enrollment.objects.reserve(second, offering)
+
+        self.assertEqual(result, Enrollment.FULL)
+        self.assertIsNone(enrollment)
+        offering.refresh_from_db()
+        self.assertEqual(offering.enrolled, 1)
+
+    def test_duplicate_registration_keeps_one_seat(self):
+        offering = make_offering()
+        student, = make_students(1)
+
+        Enrollment.objects.reserve(student, offering)
+        result = Enrollment.objects.reserve(student, offering)[1]
+
+        self.assertEqual(result, Enrollment.ALREADY_ENROLLED)
+        offering.refresh_from_db()
+        self.assertEqual(offering.enrolled, 1)
+
+    def test_reregistering_after_drop_reuses_the_row(self):
+        offering = make_offering()
+        student, = make_students(1)
+        enrollment, _ = Enrollment.objects.reserve(student, offering)
+        enrollment.is_active = False
+        enrollment.status = 'withdrawn'
+        enrollment.save()
+        offering.release_seat()
+
+        again, result = Enrollment.objects.reserve(student, offering)
+
+        self.assertEqual(result, Enrollment.RESERVED)
+        self.assertEqual(again.pk, enrollment.pk)
+        self.assertTrue(again.is_active)
+        offering.refresh_from_db()
+        self.assertEqual(offering.enrolled, 1)
+
+
+class WaitlistTests(TestCase):
+    def test_freed_seat_goes_to_head_of_queue(self):
+        offering = make_offering(capacity=1)
+        holder, first, second = make_students(3)
+        enrollment, _ = Enrollment.objects.reserve(holder, offering)
+        WaitlistEntry.objects.join(first, offering)
+        WaitlistEntry.objects.join(second, offering)
+        self.assertEqual(waitlist_position(offering.id, second.id), (2, 2))
+
+        enrollment.is_active = False
+        enrollment.save()
+        offering.release_seat()
+        promoted = WaitlistEntry.objects.promote(offering)
+
+        self.assertEqual([e.student_id for e in promoted], [first.id])
+        self.assertEqual(waitlist_position(offering.id, second.id), (1, 1))
+        offering.refresh_from_db()
+        self.assertEqual(offering.enrolled, 1)
+
+    def test_promote_fills_added_capacity(self):
+        offering = make_offering(capacity=0)
+        students = make_students(3)
+        for student in students:
+            WaitlistEntry.objects.join(student, offering)
+
+        CourseOffering.objects.filter(pk=offering.pk).update(capacity=2)
+        promoted = WaitlistEntry.objects.promote(offering)
+
+        self.assertEqual([e.student_id for e in promoted], [s.id for s in students[:2]])
+        self.assertEqual(WaitlistEntry.objects.get().student_id, students[2].id)
+
+    def test_head_with_a_clashing_enrollment_is_passed_over(self):
+        offering = make_offering(capacity=1, code="CS101")
+        clashing = make_offering(code="CS102")
+        for section in (offering, clashing):
+            section.schedule = "Mon 08:00-10:00"
+            section.save()
+            section.sync_meetings_from_schedule()
+        holder, first, second = make_students(3)
+        enrollment, _ = Enrollment.objects.reserve(holder, offering)
+        WaitlistEntry.objects.join(first, offering)
+        WaitlistEntry.objects.join(second, offering)
+        # While waiting, the head registers for another section at the same time
+        Enrollment.objects.reserve(first, clashing)
+
+        enrollment.is_active = False
+        enrollment.save()
+        offering.release_seat()
+        promoted = WaitlistEntry.objects.promote(offering)
+
+        self.assertEqual([e.student_id for e in promoted], [second.id])
+        self.assertFalse(Enrollment.objects.filter(student=first, course_offering=offering).exists())
+        skipped = WaitlistEntry.objects.get(student=first, offering=offering)
+        self.assertEqual(skipped.skipped_reason, "CS101 clashes with CS102 in your timetable.")
+
+        self.client.force_login(first)
+        status = self.client.get(reverse('waitlist_status', args=[offering.id])).json()
+        self.assertEqual((status["position"], status["skipped_reason"]), (1, skipped.skipped_reason))
+
+
+class PrerequisiteTests(TestCase):
+    def setUp(self):
+        prerequisite_graph.reset()
+
+    def complete(self, student, offering, grade):
+        Enrollment.objects.create(student=student, course_offering=offering, status='completed', grade=grade)
+
+    def test_minimum_grade_uses_grade_ranking(self):
+        intro = make_offering(code="CS101")
+        advanced = make_offering(code="CS201")
+        CoursePrerequisite.objects.create(course=advanced.course, prerequisite=intro.course, minimum_grade='C')
+        good, weak, in_progress = make_students(3)
+        self.complete(good, intro, 'B')
+        self.complete(weak, intro, 'D')
+        self.complete(in_progress, intro, 'IP')
+
+        self.assertTrue(evaluate_offerings(good, [advanced])[advanced.id].eligible)
+        self.assertFalse(evaluate_offerings(weak, [advanced])[advanced.id].eligible)
+        self.assertFalse(evaluate_offerings(in_progress, [advanced])[advanced.id].eligible)
+
+    def test_whole_page_is_evaluated_in_one_query(self):
+        base = make_offering(code="BASE")
+        offerings = [make_offering(code=f"C{i}") for i in range(20)]
+        for offering in offerings:
+            CoursePrerequisite.objects.create(course=offering.course, prerequisite=base.course)
+        student, = make_students(1)
+        prerequisite_graph.ensure_built()
+
+        with self.assertNumQueries(1):
+            eligibility = evaluate_offerings(student, offerings)
+        self.assertEqual(eligibility[offerings[0].id].missing[0].code, "BASE")
+
+
+class PrerequisiteGraphTests(TestCase):
+    def setUp(self):
+        prerequisite_graph.reset()
+        self.a, self.b, self.c = (make_offering(code=code).course for code in ("A", "B", "C"))
+        # C requires B, B requires A
+        self.b_needs_a = CoursePrerequisite.objects.create(course=self.b, prerequisite=self.a)
+        CoursePrerequisite.objects.create(course=self.c, prerequisite=self.b)
+        prerequisite_graph.ensure_built()
+
+    def test_closure_and_cycles(self):
+        self.assertEqual(prerequisite_graph.all_prerequisites(self.c.id), {self.a.id, self.b.id})
+        self.assertEqual(prerequisite_graph.chain_depth(self.c.id), 2)
+        self.assertTrue(prerequisite_graph.would_create_cycle(self.a.id, self.c.id))
+        self.assertFalse(prerequisite_graph.would_create_cycle(self.c.id, self.a.id))
+        self.assertEqual(prerequisite_graph.topological_order([self.c.id, self.a.id, self.b.id]),
+                         [self.a.id, self.b.id, self.c.id])
+
+    def test_signals_update_the_graph_incrementally(self):
+        self.b_needs_a.delete()
+        self.assertEqual(prerequisite_graph.all_prerequisites(self.c.id), {self.b.id})
+        self.assertFalse(prerequisite_graph.would_create_cycle(self.a.id, self.c.id))
+
+        d = make_offering(code="D").course
+        CoursePrerequisite.objects.create(course=self.a, prerequisite=d)
+        CoursePrerequisite.objects.create(course=self.b, prerequisite=self.a)
+        self.assertEqual(prerequisite_graph.all_prerequisites(self.c.id), {self.a.id, self.b.id, d.id})
+
+    def test_unlocked_by(self):
+        self.assertEqual(prerequisite_graph.unlocked_by({self.a.id}), [self.b.id])
+        self.assertEqual(prerequisite_graph.unlocked_by({self.a.id, self.b.id}), [self.c.id])
+
+    def test_changes_from_another_process_are_picked_up(self):
+        other = PrerequisiteGraph()  # a worker that built the graph before the change
+        other.ensure_built()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.b_needs_a.delete()
+        self.assertEqual(prerequisite_graph.all_prerequisites(self.c.id), {self.b.id})
+
+        with mock.patch.object(graph_module, "PREREQUISITE_GRAPH_CHECK_INTERVAL", 0):
+            self.assertEqual(other.all_prerequisites(self.c.id), {self.b.id})
+            # The process that made the change does not rebuild for its own version
+            with CaptureQueriesContext(connection) as queries:
+                prerequisite_graph.all_prerequisites(self.c.id)
+            self.assertEqual(len(queries), 0)
+
+    def test_graph_expires_without_a_shared_version(self):
+        d = make_offering(code="D").course
+        with mock.patch.object(graph_module, "PREREQUISITE_GRAPH_TTL", 0):
+            other = PrerequisiteGraph()
+            other.ensure_built()
+        # update() sends no signals, as when the cache is not shared between processes
+        CoursePrerequisite.objects.filter(pk=self.b_needs_a.pk).update(course=d)
+        self.assertEqual(other.all_prerequisites(self.c.id), {self.b.id})
+
+
+class FeeLedgerTests(TestCase):
+    def setUp(self):
+        self.program = make_program()  # opens at 2 * 1000 + 200
+        self.student, self.other = make_students(2)
+
+    def post(self, transaction_type, amount, student=None, program="default"):
+        return FinanceRecord.objects.create(
+            student=student or self.student, program=self.program if program == "default" else program,
+            transaction_type=transaction_type, description=transaction_type, amount=amount,
+        )
+
+    def balance(self, student=None, program="default"):
+        program = self.program if program == "default" else program
+        return StudentAccount.objects.get(student=student or self.student, program=program).balance
+
+    def test_balance_follows_create_edit_and_delete(self):
+        fee = self.post('fee', 100)
+        self.assertEqual((fee.balance_after, self.balance()), (Decimal("2300"), Decimal("2300")))
+        payment = self.post('payment', 500)
+        self.assertEqual(payment.balance_after, Decimal("1800"))
+
+        payment.amount = 800
+        payment.save()
+        self.assertEqual(self.balance(), Decimal("1500"))
+        payment.transaction_type = 'refund'  # still a credit
+        payment.save()
+        self.assertEqual(self.balance(), Decimal("1500"))
+
+        fee.delete()
+        self.assertEqual(self.balance(), Decimal("1400"))
+        self.assertEqual(StudentAccount.objects.reconcile(), [])
+
+    def test_bulk_post_runs_balances_in_order(self):
+        self.post('payment', 200)
+        records = FinanceRecord.objects.bulk_post([
+            FinanceRecord(student=self.student, program=self.program, transaction_type=kind,
+                          description=kind, amount=amount)
+            for kind, amount in (('fee', 300), ('payment', 100), ('adjustment', 50))
+        ] + [FinanceRecord(student=self.other, program=self.program, transaction_type='fee',
+                           description='fee', amount=300)])
+
+        self.assertEqual([r.balance_after for r in records], [2300, 2200, 2250, 2500])
+        self.assertEqual((self.balance(), self.balance(self.other)), (Decimal("2250"), Decimal("2500")))
+        self.assertEqual(StudentAccount.objects.reconcile(), [])
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        self.post('fee', 100)
+        self.post('payment', 40, student=self.other, program=None)
+        StudentAccount.objects.filter(student=self.student).update(balance=0)
+        StudentAccount.objects.filter(student=self.other).delete()
+
+        mismatches = StudentAccount.objects.reconcile()
+        self.assertEqual(sorted(mismatches, key=str), sorted([
+            ((self.student.pk, self.program.pk), Decimal("0"), Decimal("2300")),
+            ((self.other.pk, None), None, None),
+        ], key=str))
+
+        StudentAccount.objects.reconcile(fix=True)
+        self.assertEqual(self.balance(), Decimal("2300"))
+        self.assertEqual(self.balance(self.other, program=None), Decimal("-40"))
+        self.assertEqual(StudentAccount.objects.reconcile(), [])
+
+    def test_one_account_per_student_without_program(self):
+        key = (self.student.pk, None)
+        first = StudentAccount.objects.open_accounts([key])[key]
+        self.assertEqual(StudentAccount.objects.open_accounts([key])[key].pk, first.pk)
+        self.post('payment', 10, program=None)
+        self.assertEqual(StudentAccount.objects.filter(student=self.student, program=None).count(), 1)
+        with self.assertRaises(IntegrityError):
+            StudentAccount.objects.create(student=self.student, program=None)
+
+
+class SemesterBillingTests(TestCase):
+    def setUp(self):
+        self.program = make_program()  # 1000 per semester, 200 registration, 2 semesters
+        self.semester = Semester.objects.get(code="S1")
+        self.students = make_students(5)
+        for student in self.students:
+            ProgramEnrollment.objects.create(student=student, program=self.program,
+                                             expected_graduation=timezone.now().date())
+
+    def balances(self):
+        return sorted(StudentAccount.objects.values_list('balance', flat=True))
+
+    def test_semester_billing_charges_each_enrollment_once(self):
+        with mock.patch.object(models, "FEE_BILLING", "semester"):
+            self.assertEqual(charge_semester_fees(self.semester, batch_size=2, dry_run=True), (5, 0, 0))
+            self.assertEqual(FinanceRecord.objects.count(), 0)
+
+            self.assertEqual(charge_semester_fees(self.semester, batch_size=2), (5, 0, 0))
+            self.assertEqual(charge_semester_fees(self.semester, batch_size=2), (0, 5, 0))
+
+        self.assertEqual(self.balances(), [Decimal("1200")] * 5)  # registration + one semester
+        self.assertEqual(FinanceRecord.objects.count(), 5)
+        self.assertEqual(StudentAccount.objects.reconcile(), [])
+
+    def test_accounts_billed_up_front_are_not_charged_again(self):
+        first, *rest = self.students
+        FinanceRecord.objects.create(student=first, program=self.program, transaction_type='payment',
+                                     description="Deposit", amount=500)
+        with mock.patch.object(models, "FEE_BILLING", "semester"):
+            # Accounts keep the billing they were opened with
+            self.assertEqual(charge_semester_fees(self.semester), (4, 1, 1))
+
+        self.assertEqual(StudentAccount.objects.get(student=first).balance, Decimal("1700"))
+        self.assertEqual(charge_semester_fees(self.semester), (0, 5, 1))
+
+    def test_command_says_when_the_billing_mode_charged_nobody(self):
+        out = StringIO()
+        call_command('charge_semester_fees', self.semester.code, stdout=out)
+        self.assertIn("charged 0 enrollment(s), skipped 5, of which 5 were billed for the whole program up front",
+                      out.getvalue())
+        self.assertIn("No accounts were charged because of the billing mode", out.getvalue())
+        self.assertFalse(FinanceRecord.objects.exists())
+
+        with mock.patch.object(models, "FEE_BILLING", "semester"):
+            StudentAccount.objects.all().delete()
+            out = StringIO()
+            call_command('charge_semester_fees', self.semester.code, '--dry-run', stdout=out)
+        self.assertEqual(out.getvalue().strip(), f"{self.semester}: would charge 5 enrollment(s), skipped 0.")
+
+    def test_admin_action_warns_when_the_billing_mode_charged_nobody(self):
+        User = get_user_model()
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        response = self.client.post(reverse('admin:core_semester_changelist'), {
+            "action": "charge_fees", "_selected_action": [self.semester.pk],
+        }, follow=True)
+        message, = response.context["messages"]
+        self.assertEqual(message.level_tag, "warning")
+        self.assertIn("No accounts were charged because of the billing mode", message.message)
+
+
+class TimetableEngineTests(TestCase):
+    def course(self, code, credits=3, meetings=(), room="R1"):
+        return CourseInput(code, f"Course {code}", credits, list(meetings), room)
+
+    def minutes(self, entry):
+        start, end = entry["time"].split("-")
+        return [int(part[:2]) * 60 + int(part[3:]) for part in (start, end)]
+
+    def test_classes_keep_their_real_meeting_times(self):
+        timetable, conflicts = build_timetable([
+            self.course("CS101", meetings=[Meeting(0, clock(8, 15), clock(9, 50))]),
+        ])
+        entry, = [e for e in timetable["Monday"] if e["kind"] == "class"]
+        self.assertEqual((entry["time"], entry["room"]), ("08:15-09:50", "R1"))
+        self.assertEqual(conflicts, [])
+
+    def test_overlapping_classes_are_reported(self):
+        _, conflicts = build_timetable([
+            self.course("CS101", meetings=[Meeting(0, clock(8, 15), clock(9, 50))]),
+            self.course("CS102", meetings=[Meeting(0, clock(9, 30), clock(11))]),
+            self.course("CS103", meetings=[Meeting(0, clock(11), clock(12))]),
+        ])
+        self.assertEqual(conflicts, [("CS101", "CS102")])
+
+    def test_study_blocks_avoid_classes_and_spread_across_days(self):
+        courses = [
+            self.course("CS101", credits=3, meetings=[Meeting(d, clock(8), clock(18)) for d in (0, 1)]),
+            self.course("CS102", credits=2),
+        ]
+        timetable, _ = build_timetable(courses)
+
+        self.assertEqual([e for e in timetable["Monday"] + timetable["Tuesday"] if e["kind"] == "study"], [])
+        study = [(day, e) for day, entries in timetable.items() for e in entries if e["kind"] == "study"]
+        for code, credits in (("CS101", 3), ("CS102", 2)):
+            blocks = [(day, self.minutes(e)) for day, e in study if e["course_code"] == code]
+            self.assertEqual(sum(end - start for _, (start, end) in blocks), credits * 60)
+            self.assertEqual(len({day for day, _ in blocks}), len(blocks))  # one block per day
+            for _, (start, end) in blocks:
+                self.assertTrue(8 * 60 <= start < end <= 18 * 60)
+
+    def test_overbooked_week_falls_back_to_what_fits(self):
+        # 60 hours of study cannot fit in the 50 weekday study hours
+        timetable, _ = build_timetable([self.course("CS101", credits=60)])
+        for entries in timetable.values():
+            spans = sorted(self.minutes(e) for e in entries)
+            for (_, end), (start, _) in zip(spans, spans[1:]):
+                self.assertLessEqual(end, start)
+        placed = sum(end - start for entries in timetable.values() for start, end in map(self.minutes, entries))
+        self.assertEqual(placed, 50 * 60)
+
+
+class OfferingScheduleTests(TestCase):
+    def test_parse_schedule_formats(self):
+        self.assertEqual(parse_schedule("Mon, Wed 08:00-10:00; Fri 2-4pm"), [
+            Meeting(0, clock(8), clock(10)), Meeting(2, clock(8), clock(10)), Meeting(4, clock(14), clock(16)),
+        ])
+        self.assertEqual(parse_schedule("Tues 11am - 12:30pm and Thurs. 9.15 to 10.45"), [
+            Meeting(1, clock(11), clock(12, 30)), Meeting(3, clock(9, 15), clock(10, 45)),
+        ])
+        for text in ("TBA", "Mon 10:00-09:00", "08:00-10:00", "", None):
+            self.assertEqual(parse_schedule(text), [])
+
+    def save_in_admin(self, offering, changed, initial=None):
+        form = SimpleNamespace(instance=offering, changed_data=changed, initial=initial or {},
+                               save_m2m=lambda: None)
+        request = mock.Mock()
+        admin.site._registry[CourseOffering].save_related(request, form, [], change=True)
+
+    def meetings(self, offering):
+        return list(offering.meetings.order_by('day').values_list('day', 'start_time', 'room'))
+
+    def test_admin_resyncs_meetings_when_schedule_or_room_changes(self):
+        offering = make_offering()
+        offering.schedule, offering.room = "Mon 08:00-10:00", "A1"
+        offering.save()
+        self.save_in_admin(offering, ['schedule', 'room'])
+        self.assertEqual(self.meetings(offering), [(0, clock(8), "A1")])
+
+        offering.schedule = "Tue 09:00-11:00; Thu 14:00-15:00"
+        offering.save()
+        self.save_in_admin(offering, ['schedule'])
+        self.assertEqual(self.meetings(offering), [(1, clock(9), "A1"), (3, clock(14), "A1")])
+
+        offering.meetings.filter(day=3).update(room="LAB")
+        offering.room = "B2"
+        offering.save()
+        self.save_in_admin(offering, ['room'], initial={'room': "A1"})
+        self.assertEqual(self.meetings(offering), [(1, clock(9), "B2"), (3, clock(14), "LAB")])
+
+    def test_data_migration_parses_existing_schedules(self):
+        migration = importlib.import_module('core.migrations.0010_parse_offering_schedules')
+        offering = make_offering()
+        CourseOffering.objects.filter(pk=offering.pk).update(schedule="Mon, Wed 08:00-10:00", room="A1")
+        make_offering(code="CS102")  # no schedule text: no meetings
+
+        migration.parse_existing_schedules(apps, None)
+        self.assertEqual(
+            list(OfferingMeeting.objects.values_list('offering', 'day', 'start_time', 'end_time', 'room', 'slot_mask')),
+            [(offering.pk, day, clock(8), clock(10), "A1", 0b1111 << 16) for day in (0, 2)]
+        )
+
+
+class CourseRegistrationQueryTests(TestCase):
+    def setUp(self):
+        prerequisite_graph.reset()
+        self.base = make_offering(code="BASE")
+        self.student, = make_students(1)
+        program = Program.objects.create(
+            department=self.base.course.department,
+            program_type=ProgramType.objects.create(name="Degree", duration_years=4, level="Undergraduate"),
+            code="BSC", name="BSc Computer Science", duration=8, total_credits=120,
+        )
+        ProgramEnrollment.objects.create(
+            student=self.student, program=program, expected_graduation=timezone.now().date()
+        )
+        self.client.force_login(self.student)
+
+    def add_offerings(self, count):
+        start = Course.objects.count()
+        courses = Course.objects.bulk_create([
+            Course(department=self.base.course.department, code=f"X{start + i}", name=f"Course {start + i}", credits=3)
+            for i in range(count)
+        ])
+        CoursePrerequisite.objects.bulk_create([
+            CoursePrerequisite(course=course, prerequisite=self.base.course, minimum_grade='C') for course in courses
+        ])
+        CourseOffering.objects.bulk_create([
+            CourseOffering(course=course, semester=self.base.semester, schedule="Mon 08:00-10:00")
+            for course in courses
+        ])
+
+    def count_queries(self):
+        prerequisite_graph.reset()
+        current_semester()  # memoized per process; keep it out of the count
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('course_registration'))
+        self.assertEqual(response.status_code, 200)
+        return len(queries), response
+
+    def test_query_count_is_independent_of_offering_count(self):
+        self.add_offerings(10)
+        small, _ = self.count_queries()
+
+        self.add_offerings(990)
+        large, response = self.count_queries()
+
+        self.assertEqual(large, small)
+        self.assertLessEqual(small, 10)
+        self.assertEqual(len(response.context['available_offerings']), 1001)
+        self.assertContains(response, "missing BASE")
+
+
+class TranscriptSummaryTests(TestCase):
+    def test_summary_follows_grade_changes(self):
+        first, second = make_offering(code="MATH1"), make_offering(code="MATH2")
+        student, = make_students(1)
+        program = Program.objects.create(
+            department=first.course.department,
+            program_type=ProgramType.objects.create(name="Degree", duration_years=4, level="Undergraduate"),
+            code="BSM", name="BSc Mathematics", duration=8, total_credits=12,
+        )
+        ProgramCurriculum.objects.create(program=program, course=first.course, semester=1, credits_contribution=3)
+        program_enrollment = ProgramEnrollment.objects.create(
+            student=student, program=program, expected_graduation=timezone.now().date()
+        )
+
+        a = Enrollment.objects.create(student=student, course_offering=first, status='completed', grade='A')
+        Enrollment.objects.create(student=student, course_offering=second, status='completed', grade='C')
+        summary = TranscriptSummary.objects.get(student=student)
+        self.assertEqual((summary.gpa, summary.credits_earned), (Decimal('3.00'), 6))
+
+        a.grade = 'B'
+        a.save()
+        summary.refresh_from_db()
+        self.assertEqual(summary.gpa, Decimal('2.50'))
+
+        program_enrollment.refresh_from_db()
+        self.assertEqual(program_enrollment.credits_completed(), 3)
+        self.assertEqual(program_enrollment.progress_percentage(), 25)
+
+    def test_unrelated_saves_do_not_recompute(self):
+        offering = make_offering()
+        student, = make_students(1)
+        enrollment, _ = Enrollment.objects.reserve(student, offering)
+        enrollment = Enrollment.objects.get(pk=enrollment.pk)
+        self.assertFalse(enrollment.affects_transcript())
+        enrollment.status = 'completed'
+        self.assertTrue(enrollment.affects_transcript())
+
+
+class AdminChangelistQueryTests(TestCase):
+    CHANGELISTS = (
+        'program', 'course', 'courseoffering', 'enrollment', 'programenrollment',
+        'financerecord', 'waitlistentry', 'department', 'programcurriculum',
+    )
+
+    def setUp(self):
+        User = get_user_model()
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        self.batch = 0
+
+    def add_rows(self, count):
+        self.batch += 1
+        offering = make_offering(capacity=count, code=f"ADM{self.batch}")
+        department = offering.course.department
+        program_type, _ = ProgramType.objects.get_or_create(
+            name="Degree", defaults={"duration_years": 4, "level": "Undergraduate"}
+        )
+        for student in make_students(count, prefix=f"batch{self.batch}-"):
+            program = Program.objects.create(
+                department=department, program_type=program_type, code=f"P{student.id}",
+                name=f"Program {student.id}", duration=8, total_credits=120,
+            )
+            course = Course.objects.create(department=department, code=f"K{student.id}", name="Course", credits=3)
+            ProgramCurriculum.objects.create(program=program, course=course, semester=1, credits_contribution=3)
+            ProgramEnrollment.objects.create(student=student, program=program, expected_graduation=timezone.now().date())
+            Enrollment.objects.reserve(student, offering)
+            WaitlistEntry.objects.join(student, offering)
+            FinanceRecord.objects.create(
+                student=student, program=program, transaction_type='fee', description="Fee", amount=100
+            )
+
+    def changelist_queries(self):
+        current_semester()  # used by the context processor, memoized per process
+        counts = {}
+        for model in self.CHANGELISTS:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(reverse(f'admin:core_{model}_changelist'))
+            self.assertEqual(response.status_code, 200, model)
+            counts[model] = len(queries)
+        return counts
+
+    def test_changelists_run_a_constant_number_of_queries(self):
+        self.add_rows(3)
+        small = self.changelist_queries()
+        self.add_rows(30)
+        self.assertEqual(self.changelist_queries(), small)
+
+    def test_annotated_columns_sort(self):
+        self.add_rows(3)
+        for model, column in (('program', 'current_students_count'), ('course', 'enrolled_students_count'),
+                              ('programenrollment', 'progress_display'), ('waitlistentry', 'position')):
+            model_admin = admin.site._registry[apps.get_model('core', model)]
+            index = model_admin.list_display.index(column) + 1  # after the action checkbox
+            response = self.client.get(reverse(f'admin:core_{model}_changelist') + f'?o={index}')
+            self.assertEqual(response.status_code, 200, model)
+            self.assertIn(index, response.context['cl'].get_ordering_field_columns(), model)
+
+
+class StudentDashboardCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        forget_current_semester()
+        self.offering = make_offering()
+        self.student, = make_students(1)
+        self.client.force_login(self.student)
+
+    def test_warm_dashboard_runs_only_session_queries(self):
+        self.client.get(reverse('dashboard'))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['current_courses_count'], 0)
+        # Session and user lookups only
+        self.assertEqual(len(queries), 2, [q['sql'] for q in queries])
+
+    def test_enrollment_and_assignment_changes_invalidate(self):
+        self.client.get(reverse('dashboard'))
+        Enrollment.objects.reserve(self.student, self.offering)
+        Assignment.objects.create(
+            title="Essay", description="", due_date=timezone.now().date() + timedelta(days=3),
+            lecturer=get_user_model().objects.create(username="lecturer", role="lecturer"), file="a.pdf",
+        )
+
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['current_courses_count'], 1)
+        self.assertEqual(response.context['pending_assignments'], 1)
+
+
+class CurrentSemesterTests(TestCase):
+    def setUp(self):
+        forget_current_semester()
+
+    def test_memo_follows_semester_changes(self):
+        first = make_offering().semester
+        with self.assertNumQueries(1):
+            self.assertEqual(current_semester(), first)
+            self.assertEqual(current_semester(), first)
+
+        today = timezone.now().date()
+        second = Semester.objects.create(
+            name="Semester 2", code="S2", is_current=True, start_date=today, end_date=today,
+            registration_start=today, registration_end=today, add_drop_deadline=today,
+        )
+        self.assertEqual(current_semester(), second)
+        first.refresh_from_db()
+        self.assertFalse(first.is_current)
+
+    def test_only_one_current_semester_in_the_database(self):
+        make_offering()
+        with self.assertRaises(IntegrityError):
+            Semester.objects.filter(code="S1").update(is_current=True)
+            today = timezone.now().date()
+            Semester.objects.bulk_create([Semester(
+                name="Other", code="S9", is_current=True, start_date=today, end_date=today,
+                registration_start=today, registration_end=today, add_drop_deadline=today,
+            )])
+
+
+class AIJobQueueTests(TestCase):
+    def setUp(self):
+        self.student, self.other = make_students(2)
+
+    def test_job_runs_once_and_records_timing(self):
+        job = AIJob.objects.enqueue('questions', {"topic": "Graphs"}, user=self.student)
+        with mock.patch.dict(jobs.HANDLERS, {'questions': lambda job: ["What is a DAG?"]}):
+            claimed = AIJob.objects.claim("w1")
+            self.assertIsNone(AIJob.objects.claim("w2"))
+            jobs.run_job(claimed)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, AIJob.SUCCEEDED)
+        self.assertEqual(job.result, ["What is a DAG?"])
+        self.assertEqual((job.attempts, job.worker), (1, "w1"))
+        self.assertIsNotNone(job.run_ms)
+        self.assertIsNotNone(job.queued_ms())
+
+    def test_failed_attempts_are_retried_with_backoff_then_fail(self):
+        job = AIJob.objects.enqueue('questions', {}, user=self.student)
+
+        def fail(job):
+            raise RuntimeError("model unavailable")
+
+        with mock.patch.dict(jobs.HANDLERS, {'questions': fail}):
+            jobs.run_job(AIJob.objects.claim("w1"))
+            job.refresh_from_db()
+            self.assertEqual(job.status, AIJob.QUEUED)
+            self.assertGreater(job.available_at, timezone.now())
+            self.assertIsNone(AIJob.objects.claim("w1"))  # still backing off
+
+            for _ in range(job.max_attempts - 1):
+                AIJob.objects.filter(pk=job.pk).update(available_at=timezone.now())
+                jobs.run_job(AIJob.objects.claim("w1"))
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (AIJob.FAILED, job.max_attempts))
+        self.assertEqual(job.error, "model unavailable")
+
+    def test_stale_running_jobs_are_requeued(self):
+        job = AIJob.objects.enqueue('library', {"course_id": 1}, user=self.student)
+        AIJob.objects.claim("dead-worker")
+        AIJob.objects.filter(pk=job.pk).update(started_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(jobs.requeue_stale_jobs(), 1)
+        self.assertEqual(AIJob.objects.claim("w1").pk, job.pk)
+
+    def test_question_view_enqueues_and_result_is_owner_only(self):
+        offering = make_offering()
+        Enrollment.objects.reserve(self.student, offering)
+        self.client.force_login(self.student)
+
+        response = self.client.post(reverse('generate_questions'), {
+            "course": offering.course_id, "topic": "Graphs", "num_questions": 3
+        })
+        job = AIJob.objects.get()
+        self.assertRedirects(response, f"{reverse('generate_questions')}?job={job.pk}")
+        self.assertEqual(job.payload, {"course_name": "CS101", "topic": "Graphs", "num_questions": 3})
+
+        status = self.client.get(reverse('ai_job_result', args=[job.pk])).json()
+        self.assertEqual(status["status"], AIJob.QUEUED)
+
+        self.client.force_login(self.other)
+        self.assertEqual(self.client.get(reverse('ai_job_result', args=[job.pk])).status_code, 404)
+
+    def test_library_misses_for_one_course_share_a_job(self):
+        offering = make_offering()
+        for student in (self.student, self.other):
+            Enrollment.objects.reserve(student, offering)
+        url = f"{reverse('library_resources')}?course_id={offering.course_id}"
+
+        job_ids = []
+        for student in (self.student, self.other):
+            self.client.force_login(student)
+            with mock.patch.object(views, "cached_course_resources", return_value=None):
+                response = self.client.get(url)
+            job_ids.append(int(response.url.rsplit("job=", 1)[1]))
+        self.assertEqual(job_ids[0], job_ids[1])
+        self.assertEqual(AIJob.objects.count(), 1)
+        self.assertEqual(self.client.get(reverse('ai_job_result', args=[job_ids[0]])).status_code, 200)
+
+        # Once it has finished, a later miss queues a fresh lookup
+        AIJob.objects.update(status=AIJob.FAILED)
+        with mock.patch.object(views, "cached_course_resources", return_value=None):
+            self.client.get(url)
+        self.assertEqual(AIJob.objects.count(), 2)
+
+
+class LibraryResourceCacheTests(TestCase):
+    RESOURCES = [{"title": "Intro to Algorithms", "description": "CLRS", "url": ""}]
+
+    def setUp(self):
+        self.course = make_offering().course
+        patcher = mock.patch.object(library_cache.library_ai, "fetch_resources", return_value=(self.RESOURCES, True))
+        self.fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fresh_entry_is_served_until_it_expires(self):
+        self.assertEqual(get_course_resources(self.course), self.RESOURCES)
+        entry = LibraryResourceCache.objects.get(course=self.course)
+        self.assertAlmostEqual(entry.expires_at - timezone.now(), library_cache.CACHE_TTL, delta=timedelta(minutes=1))
+
+        with self.assertLogs("core.ai_metrics", "INFO") as logs:
+            self.assertEqual(get_course_resources(self.course), self.RESOURCES)
+        self.assertEqual(json.loads(logs.output[0].split(":", 2)[2])["cache"], "hit")
+        self.assertEqual(self.fetch.call_count, 1)
+
+        LibraryResourceCache.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        get_course_resources(self.course)
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_fallback_answers_are_not_cached(self):
+        self.fetch.return_value = (self.RESOURCES, False)
+        get_course_resources(self.course)
+        self.assertFalse(LibraryResourceCache.objects.exists())
+
+    def test_prompt_version_bump_misses_the_old_entry(self):
+        get_course_resources(self.course)
+        old_version = library_cache.library_ai.cache_version
+        with mock.patch.object(ai_service, "PROMPT_VERSION", ai_service.PROMPT_VERSION + 1):
+            self.assertNotEqual(library_cache.library_ai.cache_version, old_version)
+            get_course_resources(self.course)
+        self.assertEqual(self.fetch.call_count, 2)
+        self.assertEqual(LibraryResourceCache.objects.filter(course=self.course).count(), 2)
+
+    def test_concurrent_misses_make_one_model_call(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def lookup():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return self.RESOURCES
+
+        with ThreadPoolExecutor(max_workers=5) as pool:
+            leader = pool.submit(flight.do, "CS101", lookup)
+            started.wait(5)
+            followers = [pool.submit(flight.do, "CS101", lookup) for _ in range(4)]
+            time.sleep(0.05)  # let the followers queue behind the leader
+            release.set()
+            results = [future.result() for future in [leader] + followers]
+
+        self.assertEqual(len(calls), 1)
+        self.assertTrue(all(result is self.RESOURCES for result in results))
+
+    def test_admin_actions_invalidate_entries(self):
+        other = make_offering(code="CS102").course
+        for course in (self.course, other):
+            LibraryResourceCache.objects.create(
+                course=course, version="test", resources=self.RESOURCES,
+                expires_at=timezone.now() + timedelta(days=1),
+            )
+        User = get_user_model()
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+
+        self.client.post(reverse('admin:core_course_changelist'), {
+            "action": "clear_library_cache", "_selected_action": [self.course.pk],
+        })
+        self.assertEqual(list(LibraryResourceCache.objects.values_list('course', flat=True)), [other.pk])
+
+        self.client.post(reverse('admin:core_libraryresourcecache_changelist'), {
+            "action": "invalidate", "_selected_action": list(LibraryResourceCache.objects.values_list('pk', flat=True)),
+        })
+        self.assertFalse(LibraryResourceCache.objects.exists())
+
+
+class FAQCacheTests(TestCase):
+    QUESTION = "What are the admission requirements for the nursing program?"
+    ANSWER = '[{"title": "Admission", "description": "KCSE C+ with C in biology.", "url": ""}]'
+
+    def setUp(self):
+        # Same settings as the shared cache, which the views and signals see
+        self.cache = FAQCache(faq_cache.threshold, faq_cache.max_age, faq_cache.max_entries)
+        for module in (ai_care, signals, views):
+            patcher = mock.patch.object(module, "faq_cache", self.cache)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_near_duplicate_question_hits(self):
+        self.cache.store(self.QUESTION, self.ANSWER)
+        self.assertEqual(self.cache.lookup("Admission requirements for nursing programs?"), self.ANSWER)
+        self.assertEqual(self.cache.lookup("What are the minimum admission requirements for the nursing program?"),
+                         self.ANSWER)
+
+    def test_different_question_misses_at_the_threshold(self):
+        self.cache.store(self.QUESTION, self.ANSWER)
+        self.assertIsNone(self.cache.lookup("What are the admission requirements for the law program?"))
+        self.assertIsNone(self.cache.lookup("How do I apply for a hostel room?"))
+        self.assertIsNone(self.cache.lookup(""))
+
+    def test_entries_expire_after_max_age(self):
+        with mock.patch.object(ai_faq_cache.time, "time", return_value=1000.0):
+            self.cache.store(self.QUESTION, self.ANSWER)
+        with mock.patch.object(ai_faq_cache.time, "time", return_value=1000.0 + self.cache.max_age - 1):
+            self.assertEqual(self.cache.lookup(self.QUESTION), self.ANSWER)
+        with mock.patch.object(ai_faq_cache.time, "time", return_value=1000.0 + self.cache.max_age + 1):
+            self.assertIsNone(self.cache.lookup(self.QUESTION))
+        self.assertEqual(self.cache.stats()["entries"], 0)
+
+    def test_full_cache_evicts_the_oldest_entry(self):
+        cache = FAQCache(max_entries=2)
+        for topic in ("hostel", "library", "chaplaincy"):
+            cache.store(f"Where is the {topic} office?", topic)
+        self.assertIsNone(cache.lookup("Where is the hostel office?"))
+        self.assertEqual(cache.lookup("Where is the chaplaincy office?"), "chaplaincy")
+        self.assertEqual(cache.stats()["entries"], 2)
+
+    def test_program_and_course_changes_clear_the_cache(self):
+        program = make_program("NURS")
+        course = Course.objects.get(code="NURS-C")
+        for change in (program.save, course.save, program.delete, course.delete):
+            self.cache.store(self.QUESTION, self.ANSWER)
+            change()
+            self.assertEqual(self.cache.stats()["entries"], 0, change)
+
+    def test_cache_stats_count_hits_and_misses(self):
+        service = ai_care.AcademicAIService()
+        client = mock.Mock()
+        client.models.generate_content.return_value = SimpleNamespace(text=self.ANSWER, usage_metadata=None)
+        with mock.patch.object(ai_care, "get_client", return_value=client), self.assertLogs("core.ai_metrics", "INFO"):
+            service.provide_guidance(self.QUESTION)
+            self.assertEqual(service.provide_guidance("Admission requirements for nursing programs?"), self.ANSWER)
+        self.assertEqual(client.models.generate_content.call_count, 1)
+
+        User = get_user_model()
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        stats = self.client.get(reverse('academic_cache_stats')).json()
+        self.assertEqual(stats, {"entries": 1, "hits": 1, "misses": 1, "hit_rate": 0.5})
+
+
+class AcademicRetrievalTests(TestCase):
+    def setUp(self):
+        # A fresh index, seen by both the signal handlers and the fee shortcut
+        self.index = AcademicIndex()
+        for module in (ai_retrieval, signals):
+            patcher = mock.patch.object(module, "academic_index", self.index)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_program(self, code, name):
+        program = make_program(code)
+        program.name = name
+        program.save()
+        return program
+
+    def test_bm25_ranks_rare_and_repeated_terms_first(self):
+        index = BM25Index()
+        index.upsert("a", "statistics and probability for data science")
+        index.upsert("b", "introduction to science")
+        index.upsert("c", "science of science communication")
+        index.upsert("d", "creative writing workshop")
+
+        self.assertEqual([hit[0] for hit in index.search("probability science")][0], "a")
+        self.assertEqual([hit[0] for hit in index.search("science")][:2], ["c", "b"])
+        self.assertEqual(index.search("astronomy"), [])
+
+        index.remove("a")
+        self.assertNotIn("a", [hit[0] for hit in index.search("probability science")])
+        self.assertEqual(len(index), 3)
+
+    def test_saves_and_deletes_keep_the_index_in_sync(self):
+        self.index.ensure_built()
+        program = self.make_program("NURS", "Bachelor of Science in Nursing")
+        self.assertEqual(self.index.search("nursing")[0][0], f"program:{program.pk}")
+
+        program.name = "Bachelor of Midwifery"
+        program.save()
+        self.assertFalse(self.index.search("nursing"))
+        self.assertEqual(self.index.search("midwifery")[0][0], f"program:{program.pk}")
+
+        program.is_active = False
+        program.save()
+        self.assertFalse(self.index.search("midwifery"))
+
+        program.is_active = True
+        program.save()
+        program.delete()
+        self.assertFalse(self.index.search("midwifery"))
+
+    def test_fee_question_naming_a_program_is_answered_from_its_row(self):
+        self.make_program("NURS", "Bachelor of Science in Nursing")
+        self.make_program("LAW", "Bachelor of Laws")
+
+        answer, = answer_fee_question("How much are the fees for Nursing?")
+        self.assertEqual(answer["title"], "Fees for NURS - Bachelor of Science in Nursing")
+        self.assertIn("registration fee of **200.00**", answer["description"])
+        self.assertIsNotNone(answer_fee_question("What is the tuition for NURS?"))
+
+    def test_fee_question_matching_two_programs_goes_to_the_model(self):
+        self.make_program("JRN", "Diploma in Journalism")
+        self.make_program("JRNX", "Diploma in Journalism")
+        self.assertIsNone(answer_fee_question("What are the fees for journalism?"))
+
+    def test_generic_fee_question_goes_to_the_model(self):
+        self.make_program("NURS", "Bachelor of Science in Nursing")
+        law = self.make_program("LAW", "Bachelor of Laws")
+        # The shortest summary would otherwise win any question that says "fees"
+        law.description = "Covers contract, tort, constitutional and criminal law with a moot court year. " * 2
+        law.save()
+        self.assertIsNone(answer_fee_question("How do I pay my fees?"))
+        self.assertIsNone(answer_fee_question("Can I pay fees in installments?"))
+        self.assertIsNone(answer_fee_question("When is the add/drop deadline?"))
+
+
+class JSONArrayStreamParserTests(TestCase):
+    def feed_all(self, parser, chunks):
+        return [item for chunk in chunks for item in parser.feed(chunk)]
+
+    def test_items_split_across_chunks(self):
+        text = '```json\n[{"title": "A", "meta": {"n": 1}}, {"title": "B"}]\n```'
+        parser = JSONArrayStreamParser()
+        self.assertEqual(parser.feed(text[:20]), [])
+        items = self.feed_all(parser, text[20:])  # one character at a time
+        self.assertEqual(items, [{"title": "A", "meta": {"n": 1}}, {"title": "B"}])
+
+    def test_braces_and_quotes_inside_strings(self):
+        text = r'[{"title": "Use {x} and \"}\" here", "url": "a\\"}, {"title": "C"}]'
+        items = self.feed_all(JSONArrayStreamParser(), [text[:25], text[25:]])
+        self.assertEqual(items, [{"title": 'Use {x} and "}" here', "url": "a\\"}, {"title": "C"}])
+
+    def test_malformed_items_are_skipped(self):
+        parser = JSONArrayStreamParser()
+        items = self.feed_all(parser, ['[{"title": oops}, ', '{"title": "ok"}, 42, ', '{"title": "cut'])
+        self.assertEqual(items, [{"title": "ok"}])
+        self.assertEqual(parser.feed("no more json"), [])
+
+
+class ChatStreamingTests(TestCase):
+    def setUp(self):
+        user_requests.reset()
+        breaker.reset()
+
+    def fake_client(self, chunks, gate):
+        async def generate_content_stream(**kwargs):
+            async def stream():
+                for i, text in enumerate(chunks):
+                    if i == 1:
+                        await gate.wait()  # the model is still "generating"
+                    yield SimpleNamespace(text=text, usage_metadata=None)
+            return stream()
+        return SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(
+            generate_content_stream=generate_content_stream
+        )))
+
+    async def test_first_card_is_sent_before_the_model_finishes(self):
+        gate = asyncio.Event()
+        chunks = ['[{"title": "First", "description": "d"},', ' {"title": "Second", "description": "d"}]']
+        with mock.patch.object(AIAssignmentService, "client", new_callable=mock.PropertyMock,
+                               return_value=self.fake_client(chunks, gate)):
+            response = await self.async_client.post(
+                reverse('assignment_chat_stream'), {"message": "help"}, content_type="application/json"
+            )
+            events = aiter(response.streaming_content)
+            first = await asyncio.wait_for(anext(events), 2)
+            self.assertIn(b'"First"', first)
+            gate.set()
+            rest = [event async for event in events]
+
+        self.assertEqual(len(rest), 2)
+        self.assertIn(b'"Second"', rest[0])
+        self.assertTrue(rest[-1].startswith(b"event: done"))
+
+
+class AsyncChatEndpointTests(TestCase):
+    ANSWER = [{"title": "Outline first", "description": "Plan the sections.", "url": ""}]
+    ENDPOINTS = (
+        ('assignment_chat_ask_async', AIAssignmentService, json.loads(ASSIGNMENT_FALLBACK)[0]["title"]),
+        ('academic_chat_ask_async', ai_care.AcademicAIService, "CUEA Guidance"),
+    )
+
+    def setUp(self):
+        user_requests.reset()
+        breaker.reset()
+        self.addCleanup(breaker.reset)
+        patcher = mock.patch.object(ai_care, "faq_cache", FAQCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fake_client(self, **generate):
+        return SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(
+            generate_content=mock.AsyncMock(**generate)
+        )))
+
+    async def post(self, name, service, client, body):
+        user_requests.reset()  # every post here comes from the same anonymous address
+        with mock.patch.object(service, "client", new_callable=mock.PropertyMock, return_value=client):
+            return await self.async_client.post(reverse(name), body, content_type="application/json")
+
+    async def test_answers_come_from_the_async_model_call(self):
+        for name, service, _ in self.ENDPOINTS:
+            client = self.fake_client(return_value=SimpleNamespace(text=json.dumps(self.ANSWER), usage_metadata=None))
+            with self.subTest(name), self.assertLogs("core.ai_metrics", "INFO"):
+                response = await self.post(name, service, client, {"message": "How do I start my essay?"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["responses"], self.ANSWER)
+            client.aio.models.generate_content.assert_awaited_once()
+
+    async def test_model_failure_returns_the_fallback_cards(self):
+        for name, service, fallback_title in self.ENDPOINTS:
+            client = self.fake_client(side_effect=TimeoutError("deadline exceeded"))
+            with self.subTest(name), self.assertLogs("core", "INFO"):
+                response = await self.post(name, service, client, {"message": "How do I start my essay?"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([card["title"] for card in response.json()["responses"]], [fallback_title])
+
+    async def test_bad_input_never_reaches_the_model(self):
+        for name, service, _ in self.ENDPOINTS:
+            client = self.fake_client()
+            for body, status in (("not json", 400), ({"message": 42}, 400), ([], 400), ({"message": "  "}, 200)):
+                with self.subTest(name, body=body):
+                    response = await self.post(name, service, client, body)
+                    self.assertEqual(response.status_code, status)
+                    self.assertEqual(response.json()["responses"], [])
+            client.aio.models.generate_content.assert_not_awaited()
+
+
+class GeminiClientPoolTests(TestCase):
+    def transports(self, client):
+        return client._api_client._httpx_client, client._api_client._async_httpx_client
+
+    def test_close_clients_closes_sync_and_async_pools(self):
+        client = get_client("test-key")
+        self.assertIs(get_client("test-key"), client)
+        close_clients()
+        self.assertEqual([t.is_closed for t in self.transports(client)], [True, True])
+        self.assertIsNot(get_client("test-key"), client)
+        close_clients()
+
+    def test_close_clients_from_async_code(self):
+        client = get_client("test-key")
+
+        async def shutdown():
+            close_clients()
+            await asyncio.sleep(0)
+
+        asyncio.run(shutdown())
+        self.assertEqual([t.is_closed for t in self.transports(client)], [True, True])
+
+
+class AILimiterTests(TestCase):
+    def setUp(self):
+        user_requests.reset()
+
+    def test_token_bucket_allows_burst_then_refills(self):
+        bucket = TokenBucket(rate=50, burst=2)
+        self.assertEqual([bucket.take("a"), bucket.take("a")], [0, 0])
+        self.assertGreater(bucket.take("a"), 0)
+        self.assertEqual(bucket.take("b"), 0)  # keys are independent
+        time.sleep(0.05)
+        self.assertEqual(bucket.take("a"), 0)
+
+    def test_model_call_limiter_rejects_when_saturated(self):
+        limiter = ModelCallLimiter(limit=1, timeout=0.01)
+        with limiter.slot():
+            with self.assertRaises(ModelBusy):
+                with limiter.slot():
+                    pass
+        with limiter.slot():
+            pass
+        self.assertEqual(limiter.stats(), {
+            "limit": 1, "active": 0, "waiting": 0, "peak_waiting": 1, "admitted": 2, "rejected": 1,
+        })
+
+    def test_saturated_service_serves_its_fallback(self):
+        for _ in range(model_calls.limit):
+            model_calls._slots.acquire()
+        try:
+            with mock.patch.object(model_calls, "timeout", 0.01):
+                guidance = AIAssignmentService().provide_guidance("Explain recursion")
+        finally:
+            for _ in range(model_calls.limit):
+                model_calls._slots.release()
+        self.assertEqual(json.loads(guidance), json.loads(ASSIGNMENT_FALLBACK))
+
+    def test_chat_endpoint_is_rate_limited_per_user(self):
+        student, = make_students(1)
+        self.client.force_login(student)
+        url = reverse('assignment_chat_ask')
+        with mock.patch.object(views.assignment_ai, "provide_guidance", return_value="[]"):
+            statuses = [
+                self.client.post(url, {"message": "help"}, content_type="application/json").status_code
+                for _ in range(user_requests.burst)
+            ]
+            limited = self.client.post(url, {"message": "help"}, content_type="application/json")
+        self.assertEqual(statuses, [200] * user_requests.burst)
+        self.assertEqual(limited.status_code, 429)
+        self.assertIn("Retry-After", limited)
+        self.assertEqual(limited.json()["responses"], json.loads(ASSIGNMENT_FALLBACK))
+
+
+class CircuitBreakerTests(TestCase):
+    def setUp(self):
+        breaker.reset()
+
+    def tearDown(self):
+        breaker.reset()
+
+    def test_opens_after_consecutive_failures_then_probes(self):
+        circuit = CircuitBreaker(failures=2, reset_timeout=0.05)
+        for _ in range(2):
+            circuit.before_call()
+            circuit.record_failure()
+        with self.assertRaises(CircuitOpen):
+            circuit.before_call()
+
+        time.sleep(0.06)
+        circuit.before_call()  # the half-open probe
+        with self.assertRaises(CircuitOpen):
+            circuit.before_call()  # only one probe at a time
+        circuit.record_success()
+        circuit.before_call()
+        self.assertEqual(circuit.stats()["state"], CircuitBreaker.CLOSED)
+
+    def test_failed_probe_reopens(self):
+        circuit = CircuitBreaker(failures=1, reset_timeout=0.05)
+        circuit.record_failure()
+        time.sleep(0.06)
+        circuit.before_call()
+        circuit.record_failure()
+        with self.assertRaises(CircuitOpen):
+            circuit.before_call()
+
+    def test_open_circuit_serves_fallback_without_calling_the_model(self):
+        for _ in range(breaker.failure_threshold):
+            with self.assertRaises(TimeoutError):
+                with model_call("test", "gemini-2.0-flash"):
+                    raise TimeoutError("deadline exceeded")
+
+        service = AIAssignmentService()
+        with mock.patch.object(AIAssignmentService, "client", new_callable=mock.PropertyMock) as client:
+            started = time.monotonic()
+            guidance = service.provide_guidance("Explain recursion")
+            self.assertLess(time.monotonic() - started, 0.05)
+        client.assert_not_called()
+        self.assertEqual(json.loads(guidance), json.loads(ASSIGNMENT_FALLBACK))
+
+    def test_adaptive_timeout_follows_latency_within_bounds(self):
+        timeout = AdaptiveTimeout(initial=20, minimum=1, maximum=30)
+        self.assertEqual(timeout.current(), 20)
+        for _ in range(20):
+            timeout.observe(0.5)
+        self.assertEqual(timeout.current(), 1)
+        for _ in range(20):
+            timeout.observe(60)
+        self.assertEqual(timeout.current(), 30)
+
+
+class ConversationMemoryTests(TestCase):
+    def answer(self, n):
+        return [{"title": f"Topic {n}", "description": "Details " * 50, "url": ""}]
+
+    def test_old_turns_fold_into_a_bounded_summary(self):
+        session = {}
+        memory = ConversationMemory(session, "assignment")
+        for n in range(MEMORY_WINDOW + 30):
+            memory.record(f"Question {n} about recursion", self.answer(n))
+
+        stored = session["ai_memory:assignment"]
+        self.assertEqual(len(stored["turns"]), MEMORY_WINDOW)
+        self.assertLessEqual(estimate_tokens("; ".join(stored["summary"])), SUMMARY_TOKENS)
+        self.assertIn("Topic 29", stored["summary"][-1])  # newest turn outside the window
+
+        message, history, shortened = memory.prepare("And what about the base case?")
+        self.assertIn("Earlier in this conversation", history)
+        self.assertTrue(history.endswith(stored["turns"][-1]["assistant"]))
+
+    def test_prepare_stays_within_the_token_budget(self):
+        memory = ConversationMemory({}, "academic")
+        for n in range(MEMORY_WINDOW):
+            memory.record("draft " * 2000, self.answer(n))
+
+        message, history, shortened = memory.prepare("word " * 300)
+        self.assertLessEqual(estimate_tokens(message) + estimate_tokens(history), CONTEXT_TOKEN_BUDGET)
+        self.assertLessEqual(estimate_tokens(history), HISTORY_TOKENS)
+        self.assertFalse(shortened)
+
+    def test_oversized_message_is_shortened_but_keeps_its_history(self):
+        memory = ConversationMemory({}, "academic")
+        memory.record("How do I cite a journal article?", self.answer(1))
+
+        message, history, shortened = memory.prepare("word " * 10 * CONTEXT_TOKEN_BUDGET)
+        self.assertTrue(shortened)
+        self.assertLessEqual(estimate_tokens(message) + estimate_tokens(history), CONTEXT_TOKEN_BUDGET)
+        self.assertGreater(estimate_tokens(message), estimate_tokens(history))
+        self.assertIn("cite a journal article", history)
+
+    def test_student_is_told_their_message_was_shortened(self):
+        user_requests.reset()
+        self.client.force_login(make_students(1)[0])
+        with mock.patch.object(views.assignment_ai, "provide_guidance",
+                               return_value=json.dumps(self.answer(1))) as guidance:
+            response = self.client.post(reverse('assignment_chat_ask'),
+                                        {"message": "word " * 10 * CONTEXT_TOKEN_BUDGET},
+                                        content_type="application/json")
+
+        titles = [card["title"] for card in response.json()["responses"]]
+        self.assertEqual(titles, ["Message shortened", "Topic 1"])
+        self.assertLess(len(guidance.call_args.args[0]), len("word " * 10 * CONTEXT_TOKEN_BUDGET))
+
+    def test_follow_up_request_carries_the_conversation(self):
+        user_requests.reset()
+        self.client.force_login(make_students(1)[0])
+        url = reverse('assignment_chat_ask')
+        with mock.patch.object(views.assignment_ai, "provide_guidance",
+                               return_value=json.dumps(self.answer(1))) as guidance:
+            self.client.post(url, {"message": "How do I structure my essay?"}, content_type="application/json")
+            self.client.post(url, {"message": "And the conclusion?"}, content_type="application/json")
+
+        first, second = guidance.call_args_list
+        self.assertEqual(first.args, ("How do I structure my essay?", ""))
+        self.assertIn("How do I structure my essay?", second.args[1])
+        self.assertIn("Topic 1", second.args[1])
+
+    async def test_streamed_turns_are_remembered_for_anonymous_users(self):
+        user_requests.reset()
+        url = reverse('academic_chat_stream')
+
+        async def cards(question, history):
+            for item in self.answer(2):
+                yield item
+
+        with mock.patch.object(views.academic_ai, "astream_guidance", side_effect=cards) as guidance:
+            for message in ("When are fees due?", "And for part-time students?"):
+                response = await self.async_client.post(url, {"message": message}, content_type="application/json")
+                [event async for event in response.streaming_content]
+
+        self.assertIn("When are fees due?", guidance.call_args_list[1].args[1])
+
+
+class AIMetricsTests(TestCase):
+    def setUp(self):
+        breaker.reset()
+        user_requests.reset()
+        self.usage = UsageAggregator()
+        patcher = mock.patch.object(ai_metrics, "usage", self.usage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(breaker.reset)
+
+    def logged(self, logs):
+        return [json.loads(line.split(":", 2)[2]) for line in logs.output]
+
+    def test_model_call_records_tokens_cost_and_source(self):
+        set_source("assignment_chat_ask")
+        response = SimpleNamespace(usage_metadata=SimpleNamespace(
+            prompt_token_count=1000, candidates_token_count=300, thoughts_token_count=200
+        ))
+        with self.assertLogs("core.ai_metrics", "INFO") as logs:
+            with model_call(ASSIGNMENT_CHAT, "gemini-2.0-flash") as call:
+                call.usage(response)
+        entry, = self.logged(logs)
+        self.assertEqual(entry["source"], "assignment_chat_ask")
+        self.assertEqual((entry["outcome"], entry["prompt_tokens"], entry["response_tokens"]), ("ok", 1000, 500))
+        self.assertIsNotNone(entry["latency_ms"])
+
+        self.usage.flush()
+        row = AIUsage.objects.get(feature=ASSIGNMENT_CHAT)
+        self.assertEqual((row.requests, row.model_calls, row.prompt_tokens, row.response_tokens), (1, 1, 1000, 500))
+        self.assertEqual(row.cost, Decimal("0.0003"))  # 1000 * $0.10/M + 500 * $0.40/M
+
+    def test_failed_call_counts_as_error_with_fallback(self):
+        with self.assertLogs("core.ai_metrics", "INFO"):
+            with self.assertRaises(TimeoutError):
+                with model_call(ASSIGNMENT_CHAT, "gemini-2.0-flash"):
+                    raise TimeoutError("deadline exceeded")
+        self.usage.flush()
+        row = AIUsage.objects.get(feature=ASSIGNMENT_CHAT)
+        self.assertEqual((row.requests, row.errors, row.fallbacks), (1, 1, 1))
+
+    def test_flushes_add_up_and_give_latency_percentiles(self):
+        for latency in [80] * 18 + [2500] * 2:
+            call = ModelCallRecord(ACADEMIC_CHAT, "gemini-2.0-flash")
+            call.latency_ms = latency
+            self.usage.add(call)
+        self.usage.flush()
+        self.usage.add(ModelCallRecord(ACADEMIC_CHAT, cache="hit"))
+        self.usage.flush()
+
+        row = AIUsage.objects.get(feature=ACADEMIC_CHAT)
+        self.assertEqual((row.requests, row.model_calls, row.cache_hits), (21, 20, 1))
+        self.assertEqual(row.latency_percentile(50), 100)
+        self.assertEqual(row.latency_percentile(95), 3000)
+        self.assertEqual(row.average_latency(), (18 * 80 + 2 * 2500) // 20)
+
+    def test_rate_limited_request_is_recorded(self):
+        student, = make_students(1)
+        self.client.force_login(student)
+        url = reverse('assignment_chat_ask')
+        with mock.patch.object(views.assignment_ai, "provide_guidance", return_value="[]"):
+            for _ in range(user_requests.burst):
+                self.client.post(url, {"message": "help"}, content_type="application/json")
+            with self.assertLogs("core.ai_metrics", "INFO") as logs:
+                self.client.post(url, {"message": "help"}, content_type="application/json")
+        entry, = self.logged(logs)
+        self.assertEqual((entry["outcome"], entry["fallback"], entry["source"]),
+                         ("rate_limited", True, "assignment_chat_ask"))
+
+    def test_admin_shows_latency_and_spend(self):
+        User = get_user_model()
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        with self.assertLogs("core.ai_metrics", "INFO"):
+            record_event(ACADEMIC_CHAT, cache="hit")
+        self.usage.flush()
+        response = self.client.get(reverse('admin:core_aiusage_changelist'))
+        self.assertContains(response, "P95 (ms)")
+        self.assertContains(response, ACADEMIC_CHAT)
+
+    def test_rows_that_fail_to_save_are_kept_for_the_next_flush(self):
+        self.usage.add(ModelCallRecord(ACADEMIC_CHAT, cache="hit"))
+        with mock.patch.object(AIUsage, "save", side_effect=OperationalError("database is locked")):
+            with self.assertLogs("core.ai_metrics", "ERROR"):
+                self.usage.flush()
+        self.assertFalse(AIUsage.objects.exists())
+
+        self.usage.add(ModelCallRecord(ACADEMIC_CHAT, cache="hit"))
+        self.usage.flush()
+        row = AIUsage.objects.get(feature=ACADEMIC_CHAT)
+        self.assertEqual((row.requests, row.cache_hits), (2, 2))
+
+
+class AsyncUsageFlushTests(TransactionTestCase):
+    def test_recording_from_async_code_flushes_off_the_event_loop(self):
+        aggregator = UsageAggregator()
+
+        async def answer_from_cache():
+            record_event(ACADEMIC_CHAT, cache="hit")
+
+        with mock.patch.object(ai_metrics, "usage", aggregator), mock.patch.object(ai_metrics, "FLUSH_INTERVAL", 0):
+            with self.assertLogs("core.ai_metrics", "INFO") as logs:
+                asyncio.run(answer_from_cache())
+                aggregator._flusher.join(timeout=5)
+
+        self.assertFalse([line for line in logs.output if line.startswith("ERROR")])
+        row = AIUsage.objects.get(feature=ACADEMIC_CHAT)
+        self.assertEqual((row.requests, row.cache_hits), (1, 1))
+
+
+class ConcurrentSeatReservationTests(TransactionTestCase):
+    STUDENTS = 500
+    CAPACITY = 40
+
+    def _reserve(self, student, offering):
+        try:
+            while True:
+                try:
+                    return Enrollment.objects.reserve(student, offering)[1]
+                except OperationalError as e:
+                    # SQLite allows one writer at a time; retry when the lock is busy
+                    if "locked" not in str(e):
+                        raise
+                    time.sleep(0.005)
+        finally:
+            connections.close_all()
+
+    def test_parallel_registrations_never_oversubscribe(self):
+        offering = make_offering(capacity=self.CAPACITY)
+        students = make_students(self.STUDENTS)
+
+        with ThreadPoolExecutor(max_workers=32) as pool:
+            results = list(pool.map(lambda s: self._reserve(s, offering), students))
+
+        offering.refresh_from_db()
+        active = Enrollment.objects.filter(course_offering=offering, is_active=True).count()
+        self.assertEqual(results.count(Enrollment.RESERVED), self.CAPACITY)
+        self.assertEqual(results.count(Enrollment.FULL), self.STUDENTS - self.CAPACITY)
+        self.assertEqual(offering.enrolled, self.CAPACITY)
+        self.assertEqual(active, self.CAPACITY)
@@ -0,0 +1,178 @@
+from collections import namedtuple
+
+from core.schedule import (
+    DAYS, SLOT_MINUTES, SLOTS_PER_DAY, format_slot_time, week_mask
+)
+from .models import Enrollment
+from .semesters import current_semester as get_current_semester
+
+WEEKDAYS = DAYS[:5]
+
+# Study blocks are placed on weekdays between 08:00 and 18:00, on the hour
+STUDY_FIRST_SLOT = 16
+STUDY_LAST_SLOT = 36
+MAX_BLOCK_SLOTS = 4      # study blocks are at most two hours long
+NODE_LIMIT = 20000       # backtracking budget before falling back to greedy
+
+CourseInput = namedtuple("CourseInput", ["code", "name", "credits", "meetings", "room"])
+
+
+def _entry(start, end, course, kind, room=None):
+    entry = {
+        "time": f"{start}-{end}",
+        "course_code": course.code,
+        "course_name": course.name,
+        "kind": kind,
+    }
+    if room:
+        entry["room"] = room
+    return entry
+
+
+def _study_blocks(courses):
+    """One hour of weekly study per credit, split into blocks of up to two hours."""
+    blocks = []
+    for index, course in enumerate(courses):
+        remaining = max(course.credits, 1) * 2
+        while remaining > 0:
+            length = min(MAX_BLOCK_SLOTS, remaining)
+            blocks.append((index, length))
+            remaining -= length
+    # Longest blocks first: they are the hardest to fit
+    blocks.sort(key=lambda block: (-block[1], courses[block[0]].code))
+    return blocks
+
+
+class _Search:
+    def __init__(self, blocks, occupied, one_per_day):
+        self.blocks = blocks
+        self.occupied = occupied
+        self.one_per_day = one_per_day
+        self.day_load = [0] * len(WEEKDAYS)
+        self.course_days = {}
+        self.placed = []
+        self.nodes = 0
+
+    def candidates(self, course_index, length):
+        used_days = self.course_days.get(course_index, set())
+        for day in sorted(range(len(WEEKDAYS)), key=lambda d: (self.day_load[d], d)):
+            if self.one_per_day and day in used_days:
+                continue
+            for start in range(STUDY_FIRST_SLOT, STUDY_LAST_SLOT - length + 1, 2):
+                mask = ((1 << length) - 1) << (day * SLOTS_PER_DAY + start)
+                if not mask & self.occupied:
+                    yield day, start, mask
+
+    def solve(self, position=0):
+        if position == len(self.blocks):
+            return True
+        self.nodes += 1
+        if self.nodes > NODE_LIMIT:
+            return False
+
+        course_index, length = self.blocks[position]
+        for day, start, mask in self.candidates(course_index, length):
+            self.occupied |= mask
+            self.day_load[day] += length
+            self.course_days.setdefault(course_index, set()).add(day)
+            self.placed.append((course_index, day, start, length))
+
+            if self.solve(position + 1):
+                return True
+
+            self.placed.pop()
+            self.course_days[course_index].discard(day)
+            self.day_load[day] -= length
+            self.occupied &= ~mask
+        return False
+
+    def greedy(self):
+        """Places whatever fits, in order, when no complete solution exists."""
+        for course_index, length in self.blocks:
+            for day, start, mask in self.candidates(course_index, length):
+                self.occupied |= mask
+                self.day_load[day] += length
+                self.course_days.setdefault(course_index, set()).add(day)
+                self.placed.append((course_index, day, start, length))
+                break
+
+
+def build_timetable(courses):
+    """
+    Builds a conflict-free weekly timetable.
+    courses: list of CourseInput; meetings are core.schedule.Meeting tuples.
+    Returns (timetable, conflicts) where timetable maps day names to
+    {"time", "course_code", "course_name", "kind", "room"} entries and
+    conflicts lists pairs of course codes whose classes overlap.
+    """
+    timetable = {day: [] for day in WEEKDAYS}
+    rows = {day: [] for day in DAYS}
+    conflicts = []
+    occupied = 0
+    class_masks = []
+
+    for course in courses:
+        mask = week_mask(course.meetings)
+        for other, other_mask in class_masks:
+            if mask & other_mask:
+                conflicts.append((other.code, course.code))
+        class_masks.append((course, mask))
+        occupied |= mask
+
+        for meeting in course.meetings:
+            # Classes show their real times; only the clash check works in half-hour slots
+            rows[DAYS[meeting.day]].append((
+                meeting.start.hour * 60 + meeting.start.minute,
+                _entry(f"{meeting.start:%H:%M}", f"{meeting.end:%H:%M}", course, "class", course.room),
+            ))
+
+    blocks = _study_blocks(courses)
+    search = _Search(blocks, occupied, one_per_day=True)
+    if not search.solve():
+        search = _Search(blocks, occupied, one_per_day=False)
+        if not search.solve():
+            search = _Search(blocks, occupied, one_per_day=False)
+            search.greedy()
+
+    for course_index, day, start, length in search.placed:
+        rows[WEEKDAYS[day]].append((
+            start * SLOT_MINUTES,
+            _entry(format_slot_time(start), format_slot_time(start + length), courses[course_index], "study"),
+        ))
+
+    for day, entries in rows.items():
+        if entries or day in timetable:
+            timetable[day] = [entry for _, entry in sorted(entries, key=lambda row: row[0])]
+    return timetable, conflicts
+
+
+def load_student_courses(student):
+    """Reads the student's active enrollments for the current semester."""
+    enrollments = Enrollment.objects.filter(
+        student=student, is_active=True
+    ).select_related('course_offering__course').prefetch_related('course_offering__meetings')
+    current_semester = get_current_semester()
+    if current_semester:
+        enrollments = enrollments.filter(course_offering__semester=current_semester)
+
+    return [
+        CourseInput(
+            code=e.course_offering.course.code,
+            name=e.course_offering.course.name,
+            credits=e.course_offering.course.credits,
+            meetings=e.course_offering.meeting_tuples(),
+            room=e.course_offering.room,
+        )
+        for e in enrollments
+    ]
+
+
+def timetable_payload(timetable, conflicts, explanation=""):
+    """The JSON body returned to the timetable page."""
+    payload = {
+        "timetable": timetable,
+        "conflicts": [{"courses": list(pair)} for pair in conflicts],
+    }
+    if explanation:
+        payload["explanation"] = explanation
+    return payload
@@ -0,0 +1,45 @@
+from collections import namedtuple
+from decimal import Decimal
+
+# Grade points on a 4.0 scale. W, I and IP carry no points and are left out of the GPA.
+GRADE_POINTS = {'A': 4, 'B': 3, 'C': 2, 'D': 1, 'F': 0}
+
+Summary = namedtuple("Summary", [
+    "credits_earned", "graded_credits", "quality_points", "gpa", "courses_completed", "completed_courses"
+])
+
+
+def summarize(rows):
+    """
+    Summarises a student's enrollment history.
+    rows: iterable of (course_id, course_credits, credits_earned, grade, status).
+    A retaken course counts once, with its best attempt. completed_courses maps
+    course_id -> credits earned, for per-program progress.
+    """
+    best = {}
+    for course_id, course_credits, credits_earned, grade, status in rows:
+        credits = credits_earned or course_credits or 0
+        points = GRADE_POINTS.get((grade or '').strip().upper())
+        completed = status == 'completed'
+        attempt = (completed, -1 if points is None else points, credits, points)
+        if course_id not in best or attempt[:2] > best[course_id][:2]:
+            best[course_id] = attempt
+
+    credits_earned = graded_credits = 0
+    quality_points = Decimal('0')
+    completed_courses = {}
+    for course_id, (completed, _, credits, points) in best.items():
+        if completed:
+            credits_earned += credits
+            completed_courses[course_id] = credits
+        if points is not None:
+            graded_credits += credits
+            quality_points += points * credits
+
+    gpa = (quality_points / graded_credits).quantize(Decimal('0.01')) if graded_credits else Decimal('0.00')
+    return Summary(credits_earned, graded_credits, quality_points, gpa, len(completed_courses), completed_courses)
+
+
+def program_credits(completed_courses, curriculum_course_ids):
+    """Credits earned towards one program's curriculum."""
+    return sum(credits for course_id, credits in completed_courses.items() if course_id in curriculum_course_ids)
@@ -9,6 +9,9 @@ urlpatterns = [
     path('courses/register/', views.course_registration, name='course_registration'),
     path('courses/register/<int:offering_id>/', views.register_course, name='register_course'),
     path('courses/drop/<int:enrollment_id>/', views.drop_course, name='drop_course'),
+    path('courses/waitlist/<int:offering_id>/join/', views.join_waitlist, name='join_waitlist'),
+    path('courses/waitlist/<int:offering_id>/leave/', views.leave_waitlist, name='leave_waitlist'),
+    path('courses/waitlist/<int:offering_id>/status/', views.waitlist_status, name='waitlist_status'),
     path("timetable/", views.student_timetable, name="student_timetable"),
     path('grades/', views.student_grades_view, name='grades'),
     path('finance/', views.student_finance_view, name='finance'),
@@ -17,10 +20,18 @@ urlpatterns = [
     path('library/resources/', views.library_resources, name='library_resources'),
     path("assignment-chat/", views.assignment_chat, name="assignment_chat"),
     path("assignment-chat/ask/", views.assignment_chat_ask, name="assignment_chat_ask"),
+    path("assignment-chat/ask/async/", views.assignment_chat_ask_async, name="assignment_chat_ask_async"),
+    path("assignment-chat/stream/", views.assignment_chat_stream, name="assignment_chat_stream"),
     path('academic-chat/', views.academic_chat, name='academic_chat'),
     path('academic-chat/ask/', views.academic_chat_ask, name='academic_chat_ask'),
+    path('academic-chat/ask/async/', views.academic_chat_ask_async, name='academic_chat_ask_async'),
+    path('academic-chat/stream/', views.academic_chat_stream, name='academic_chat_stream'),
+    path('academic-chat/cache-stats/', views.academic_cache_stats, name='academic_cache_stats'),
+    path('ai/limiter-stats/', views.ai_limiter_stats, name='ai_limiter_stats'),
     path('my-timetable/', views.my_timetable, name='my_timetable'),
     path('generate-timetable/', views.generate_timetable, name='generate_timetable'),
+    path('generate-timetable/queue/', views.queue_timetable, name='queue_timetable'),
     path('generate-questions/', views.generate_question_view, name='generate_questions'),
+    path('ai-jobs/<int:job_id>/', views.ai_job_result, name='ai_job_result'),
     path("program-enrollment/", views.program_enrollment_view, name="program_enrollment"),
 ]
\ No newline at end of file
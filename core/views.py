@@ -4,36 +4,50 @@
 # Standard Library Imports
 # =========================
 import json
+import math
 from datetime import timedelta
+from functools import wraps
 
 # =========================
 # Django Imports
 # =========================
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib import messages
+from django.db import transaction
+from django.db.models import Count, Q
 from django.utils import timezone
-from django.http import FileResponse, JsonResponse
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.safestring import mark_safe
 
 # =========================
 # Third-Party Libraries
 # =========================
-import markdown
+from asgiref.sync import iscoroutinefunction, sync_to_async
 
 # =========================
 # Local Imports
 # =========================
-from core.ai_quetions_gen import generate_questions
-from core.ai_care import AcademicAIService
+from core.ai_care import AcademicAIService, FALLBACK_TEXT as ACADEMIC_FALLBACK
+from core.ai_faq_cache import faq_cache
 from core.ai_timetable_creater import TimetableAIService
-from core.ai_assignment import AIAssignmentService
-from core.ai_service import AIService
+from core.timetable_engine import build_timetable, load_student_courses, timetable_payload
+from core.ai_assignment import AIAssignmentService, FALLBACK_TEXT as ASSIGNMENT_FALLBACK
+from core.ai_limits import breaker, deadline, model_calls, user_requests
+from core.ai_memory import ConversationMemory
+from core.ai_metrics import ACADEMIC_CHAT, ASSIGNMENT_CHAT, ai_source, record_event
+from core.library_cache import cached_course_resources
+from core.waitlist import waitlist_position, waitlist_skipped_reason
+from core.semesters import current_semester as get_current_semester
+from core.prerequisites import evaluate_offerings, load_transcript
+from core.prerequisite_graph import prerequisite_graph
 from .models import (
     Event, Program, Assignment, Course,
     CourseOffering, Enrollment, FinanceRecord,
-    Semester, ProgramEnrollment
+    ProgramEnrollment, TranscriptSummary, WaitlistEntry, AIJob
 )
 
 # =========================
@@ -49,7 +63,7 @@ def home(request):
 @login_required
 def student_courses(request):
     """Display student's enrolled courses"""
-    current_semester = Semester.objects.filter(is_current=True).first()
+    current_semester = get_current_semester()
     enrollments = Enrollment.objects.filter(
         student=request.user,
         is_active=True
@@ -66,7 +80,7 @@ def student_courses(request):
 @login_required
 def course_registration(request):
     """Display available courses for registration"""
-    current_semester = Semester.objects.filter(is_current=True).first()
+    current_semester = get_current_semester()
     if not current_semester:
         messages.warning(request, "No active semester found for registration.")
         return redirect('student_courses')
@@ -81,70 +95,146 @@ def course_registration(request):
 
     program_enrollment = ProgramEnrollment.objects.filter(
         student=request.user, is_active=True
-    ).first()
+    ).select_related('program').first()
     if not program_enrollment:
         messages.error(request, "You are not enrolled in any program.")
         return redirect('student_courses')
 
-    available_offerings = CourseOffering.objects.filter(
+    # Only the columns the page renders; the query count does not grow with
+    # the number of offerings (see core.tests.CourseRegistrationQueryTests)
+    available_offerings = list(CourseOffering.objects.filter(
         semester=current_semester, is_active=True
-    ).select_related('course', 'lecturer').prefetch_related('enrollments')
-
-    enrolled_courses = Enrollment.objects.filter(
+    ).select_related('course', 'lecturer').only(
+        'section', 'capacity', 'enrolled', 'room', 'schedule',
+        'course__code', 'course__name', 'course__credits', 'course__level', 'course__course_type',
+        'lecturer__username', 'lecturer__first_name', 'lecturer__last_name',
+    ))
+
+    # Prerequisites for the whole page, evaluated in memory
+    transcript = load_transcript(request.user)
+    eligibility = evaluate_offerings(request.user, available_offerings, transcript)
+    for offering in available_offerings:
+        offering.eligibility = eligibility[offering.id]
+    unlocked = prerequisite_graph.unlocked_by(set(transcript))
+    unlocked_courses = sorted(prerequisite_graph.codes[course_id] for course_id in unlocked)
+
+    enrolled_courses = set(Enrollment.objects.filter(
         student=request.user, course_offering__semester=current_semester, is_active=True
-    ).values_list('course_offering_id', flat=True)
+    ).values_list('course_offering_id', flat=True))
+
+    waitlisted_courses = set(WaitlistEntry.objects.filter(
+        student=request.user, offering__semester=current_semester
+    ).values_list('offering_id', flat=True))
 
     context = {
         'current_semester': current_semester,
         'program_enrollment': program_enrollment,
         'available_offerings': available_offerings,
         'enrolled_courses': enrolled_courses,
+        'waitlisted_courses': waitlisted_courses,
+        'unlocked_courses': unlocked_courses,
     }
     return render(request, 'dashboard/course_registration.html', context)
 
 
-@login_required
-def register_course(request, offering_id):
-    """Register for a course"""
-    offering = get_object_or_404(CourseOffering, id=offering_id, is_active=True)
+def _registration_error(student, offering):
+    """
+    Checks the registration window, duplicates, prerequisites and timetable
+    clashes. Returns (level, message) for the first problem, or None.
+    Used for registration and for joining a waitlist.
+    """
     current_semester = offering.semester
     today = timezone.now().date()
 
     if today < current_semester.registration_start:
-        messages.error(request, "Registration period has not started yet.")
-        return redirect('course_registration')
+        return messages.ERROR, "Registration period has not started yet."
     elif today > current_semester.add_drop_deadline:
-        messages.error(request, "Add/drop period has ended.")
-        return redirect('course_registration')
+        return messages.ERROR, "Add/drop period has ended."
+
+    if Enrollment.objects.filter(student=student, course_offering=offering, is_active=True).exists():
+        return messages.WARNING, f"You are already enrolled in {offering.course.code}."
+
+    problem = offering.eligibility_error(student)
+    if problem:
+        return messages.ERROR, problem
+    return None
+
 
-    if offering.is_full():
-        messages.error(request, f"{offering.course.code} is full.")
+@login_required
+def register_course(request, offering_id):
+    """Register for a course"""
+    offering = get_object_or_404(CourseOffering, id=offering_id, is_active=True)
+
+    error = _registration_error(request.user, offering)
+    if error:
+        messages.add_message(request, *error)
         return redirect('course_registration')
 
-    if Enrollment.objects.filter(student=request.user, course_offering=offering, is_active=True).exists():
+    enrollment, result = Enrollment.objects.reserve(request.user, offering)
+    if result == Enrollment.FULL:
+        messages.error(request, f"{offering.course.code} is full. You can join the waitlist instead.")
+        return redirect('course_registration')
+    if result == Enrollment.ALREADY_ENROLLED:
         messages.warning(request, f"You are already enrolled in {offering.course.code}.")
         return redirect('course_registration')
 
-    # Check prerequisites
-    for prereq in offering.course.required_prerequisites.all():
-        completed = Enrollment.objects.filter(
-            student=request.user,
-            course_offering__course=prereq.prerequisite,
-            status='completed',
-            is_active=True
-        )
-        if prereq.minimum_grade:
-            completed = completed.filter(grade__lte=prereq.minimum_grade)
-
-        if not completed.exists() and prereq.is_mandatory:
-            messages.error(request, f"Missing prerequisite: {prereq.prerequisite.code}")
-            return redirect('course_registration')
-
-    Enrollment.objects.create(student=request.user, course_offering=offering, status='registered')
     messages.success(request, f"Successfully enrolled in {offering.course.code}")
     return redirect('student_courses')
 
 
+@login_required
+def join_waitlist(request, offering_id):
+    """Queue for a full course"""
+    offering = get_object_or_404(CourseOffering, id=offering_id, is_active=True)
+
+    error = _registration_error(request.user, offering)
+    if error:
+        messages.add_message(request, *error)
+        return redirect('course_registration')
+
+    if not offering.is_full():
+        # A seat is free right now: take it instead of queueing
+        return register_course(request, offering_id)
+
+    entry, created = WaitlistEntry.objects.join(request.user, offering)
+    if created:
+        messages.success(request, f"You are number {entry.position()} on the waitlist for {offering.course.code}.")
+    else:
+        messages.info(request, f"You are already on the waitlist for {offering.course.code}.")
+    return redirect('course_registration')
+
+
+@login_required
+def leave_waitlist(request, offering_id):
+    """Leave a course waitlist"""
+    deleted, _ = WaitlistEntry.objects.filter(student=request.user, offering_id=offering_id).delete()
+    if deleted:
+        messages.success(request, "You have left the waitlist.")
+    return redirect('course_registration')
+
+
+@login_required
+def waitlist_status(request, offering_id):
+    """
+    Cheap polling endpoint for a student's waitlist position.
+    Reads the cached queue; only students no longer queued cost a query.
+    """
+    position, length = waitlist_position(offering_id, request.user.id)
+    if position is not None:
+        status = "waitlisted"
+    elif Enrollment.objects.filter(student=request.user, course_offering_id=offering_id, is_active=True).exists():
+        status = "enrolled"
+    else:
+        status = "not_waitlisted"
+    return JsonResponse({
+        "offering_id": offering_id,
+        "status": status,
+        "position": position,
+        "waitlist_length": length,
+        "skipped_reason": waitlist_skipped_reason(offering_id, request.user.id) if position else "",
+    })
+
+
 @login_required
 def drop_course(request, enrollment_id):
     """Drop a course"""
@@ -156,13 +246,19 @@ def drop_course(request, enrollment_id):
         messages.error(request, "Add/drop period has ended.")
         return redirect('student_courses')
 
-    enrollment.is_active = False
-    enrollment.status = 'withdrawn'
-    enrollment.save()
+    if not enrollment.is_active:
+        messages.warning(request, f"You have already dropped {enrollment.course_offering.course.code}.")
+        return redirect('student_courses')
+
+    with transaction.atomic():
+        enrollment.is_active = False
+        enrollment.status = 'withdrawn'
+        enrollment.save()
 
-    offering = enrollment.course_offering
-    offering.enrolled -= 1
-    offering.save()
+        offering = enrollment.course_offering
+        offering.release_seat()
+        # The freed seat goes straight to the head of the waitlist
+        WaitlistEntry.objects.promote(offering)
 
     messages.success(request, f"Successfully dropped {offering.course.code}")
     return redirect('student_courses')
@@ -174,7 +270,7 @@ def drop_course(request, enrollment_id):
 @login_required
 def student_timetable(request):
     """Show timetable"""
-    current_semester = Semester.objects.filter(is_current=True).first()
+    current_semester = get_current_semester()
     enrollments = Enrollment.objects.filter(
         student=request.user,
         course_offering__semester=current_semester,
@@ -191,7 +287,8 @@ def student_grades_view(request):
     enrollments = Enrollment.objects.filter(student=request.user).select_related(
         'course_offering__course', 'course_offering__semester', 'course_offering__lecturer'
     )
-    return render(request, 'dashboard/grades.html', {'enrollments': enrollments})
+    summary = TranscriptSummary.objects.filter(student=request.user).first()
+    return render(request, 'dashboard/grades.html', {'enrollments': enrollments, 'summary': summary})
 
 
 def student_finance_view(request):
@@ -220,6 +317,128 @@ def download_assignment(request, pk):
     )
 
 
+# =========================
+# AI: Streaming Helpers
+# =========================
+def _sse_response(items):
+    """
+    Wraps a list or async iterator of items as a Server-Sent Events stream,
+    one card per event. The body is an async iterator so ASGI sends each
+    event as it is produced instead of reading the whole stream first.
+    """
+    async def events():
+        if hasattr(items, "__aiter__"):
+            async for item in items:
+                yield f"data: {json.dumps(item)}\n\n"
+        else:
+            for item in items:
+                yield f"data: {json.dumps(item)}\n\n"
+        yield "event: done\ndata: {}\n\n"
+
+    response = StreamingHttpResponse(events(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # stop nginx from buffering the stream
+    return response
+
+def _posted_message(request):
+    """The stripped "message" of a JSON chat request, or None for a malformed body."""
+    try:
+        body = json.loads(request.body)
+    except ValueError:
+        return None
+    message = body.get("message", "") if isinstance(body, dict) else None
+    return message.strip() if isinstance(message, str) else None
+
+def _bad_message():
+    return JsonResponse({"responses": [], "error": 'Send a JSON object with a "message" string.'}, status=400)
+
+def _shortened_notice(shortened):
+    """A card telling the student only the start of their message was read."""
+    if not shortened:
+        return []
+    return [{
+        "title": "Message shortened",
+        "description": "Your message was too long to read in full, so only its beginning was "
+                       "used. Send the rest in a follow-up message.",
+        "url": "",
+    }]
+
+async def _remembered(request, memory, message, items, shortened=False):
+    """Passes streamed cards through, then records the finished turn in the session."""
+    # Give the session a key now, so its cookie goes out with the headers
+    if request.session.session_key is None:
+        await sync_to_async(request.session.save)()
+
+    async def remember():
+        for notice in _shortened_notice(shortened):
+            yield notice
+        collected = []
+        async for item in items:
+            collected.append(item)
+            yield item
+        await sync_to_async(memory.record)(message, collected)
+        # The session middleware ran before the stream finished
+        await sync_to_async(request.session.save)()
+
+    return remember()
+
+
+# =========================
+# AI: Rate Limiting
+# =========================
+def _rate_limit_key(request, user):
+    if user.is_authenticated:
+        return f"user:{user.pk}"
+    return f"ip:{request.META.get('REMOTE_ADDR')}"
+
+def ai_rate_limited(feature, fallback_text, stream=False):
+    """
+    Applies the per-user token bucket to a chat view's POSTs. Over the limit,
+    the view's usual fallback cards are returned with 429 and Retry-After.
+    """
+    fallback = json.loads(fallback_text)
+
+    def limited(wait):
+        record_event(feature, outcome="rate_limited", fallback=True)
+        response = _sse_response(fallback) if stream else JsonResponse({"responses": fallback})
+        response.status_code = 429
+        response["Retry-After"] = str(math.ceil(wait))
+        return response
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if request.method == "POST":
+                    wait = user_requests.take(_rate_limit_key(request, await request.auser()))
+                    if wait:
+                        return limited(wait)
+                return await view(request, *args, **kwargs)
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if request.method == "POST":
+                    wait = user_requests.take(_rate_limit_key(request, request.user))
+                    if wait:
+                        return limited(wait)
+                return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@staff_member_required
+def ai_limiter_stats(request):
+    """Model-call slot usage, breaker state, rate-limit rejections and AI job queue depth."""
+    jobs = dict(AIJob.objects.order_by().values_list('status').annotate(count=Count('id')))
+    return JsonResponse({
+        "model_calls": model_calls.stats(),
+        "breaker": breaker.stats(),
+        "deadline_seconds": round(deadline.current(), 2),
+        "rate_limited": user_requests.limited,
+        "ai_jobs": {status: jobs.get(status, 0) for status, _ in AIJob.STATUS_CHOICES},
+    })
+
+
 # =========================
 # AI: Assignment Helper
 # =========================
@@ -228,23 +447,103 @@ assignment_ai = AIAssignmentService()
 def assignment_chat(request):
     return render(request, "dashboard/assignment_chat.html")
 
+def _parse_assignment_guidance(guidance_json):
+    try:
+        return json.loads(guidance_json)
+    except Exception:
+        return [{"title": "Error", "description": "AI failed to respond.", "url": ""}]
+
 @csrf_exempt
+@ai_source
+@ai_rate_limited(ASSIGNMENT_CHAT, ASSIGNMENT_FALLBACK)
 def assignment_chat_ask(request):
     if request.method == "POST":
-        message = json.loads(request.body).get("message", "")
+        message = _posted_message(request)
+        if message is None:
+            return _bad_message()
+        if not message:
+            return JsonResponse({"responses": []})
+
+        memory = ConversationMemory(request.session, "assignment")
+        message, history, shortened = memory.prepare(message)
+        responses = _parse_assignment_guidance(assignment_ai.provide_guidance(message, history))
+        memory.record(message, responses)
+        return JsonResponse({"responses": _shortened_notice(shortened) + responses})
+
+    return JsonResponse({"responses": []})
+
+@csrf_exempt
+@ai_source
+@ai_rate_limited(ASSIGNMENT_CHAT, ASSIGNMENT_FALLBACK)
+async def assignment_chat_ask_async(request):
+    """ASGI variant: awaits Gemini without holding a worker thread."""
+    if request.method == "POST":
+        message = _posted_message(request)
+        if message is None:
+            return _bad_message()
         if not message:
             return JsonResponse({"responses": []})
 
-        guidance_json = assignment_ai.provide_guidance(message)
-        try:
-            guidance_list = json.loads(guidance_json)
-        except Exception:
-            guidance_list = [{"title": "Error", "description": "AI failed to respond.", "url": ""}]
-        return JsonResponse({"responses": guidance_list})
+        memory = ConversationMemory(request.session, "assignment")
+        message, history, shortened = await sync_to_async(memory.prepare)(message)
+        responses = _parse_assignment_guidance(await assignment_ai.aprovide_guidance(message, history))
+        await sync_to_async(memory.record)(message, responses)
+        return JsonResponse({"responses": _shortened_notice(shortened) + responses})
 
     return JsonResponse({"responses": []})
 
 
+@csrf_exempt
+@ai_source
+@ai_rate_limited(ASSIGNMENT_CHAT, ASSIGNMENT_FALLBACK, stream=True)
+async def assignment_chat_stream(request):
+    """Streams guidance cards to the browser as Gemini produces them."""
+    if request.method == "POST":
+        message = _posted_message(request)
+        if message is None:
+            return _bad_message()
+        if message:
+            memory = ConversationMemory(request.session, "assignment")
+            message, history, shortened = await sync_to_async(memory.prepare)(message)
+            items = assignment_ai.astream_guidance(message, history)
+            return _sse_response(await _remembered(request, memory, message, items, shortened))
+
+    return _sse_response([])
+
+
+# =========================
+# AI: Background Jobs
+# =========================
+def _user_job(request, kind, job_id):
+    """The requesting user's (or a shared) job of this kind, or None."""
+    if not job_id or not str(job_id).isdigit():
+        return None
+    return _visible_jobs(request).filter(pk=job_id, kind=kind).first()
+
+def _visible_jobs(request):
+    return AIJob.objects.filter(Q(user=request.user) | Q(kind__in=AIJob.SHARED_KINDS))
+
+def _job_status(job):
+    status = {
+        "job_id": job.pk,
+        "kind": job.kind,
+        "status": job.status,
+        "attempts": job.attempts,
+        "result_url": reverse("ai_job_result", args=[job.pk]),
+    }
+    if job.status == AIJob.SUCCEEDED:
+        status["result"] = job.result
+    elif job.status == AIJob.FAILED:
+        status["error"] = job.error
+    return status
+
+@login_required
+def ai_job_result(request, job_id):
+    """Status of a queued AI job, with its result once it has succeeded."""
+    job = get_object_or_404(_visible_jobs(request), pk=job_id)
+    return JsonResponse(_job_status(job))
+
+
 # =========================
 # AI: Question Generator
 # =========================
@@ -254,7 +553,6 @@ def generate_question_view(request):
         .select_related('course_offering__course')
     courses_list = [e.course_offering.course for e in current_courses]
 
-    questions = []
     if request.method == "POST":
         course_id = int(request.POST.get("course"))
         topic = request.POST.get("topic")
@@ -262,34 +560,51 @@ def generate_question_view(request):
         selected_course = next((c for c in courses_list if c.id == course_id), None)
 
         if selected_course:
-            raw_questions = generate_questions(selected_course.name, topic, num_questions)
-            questions = [mark_safe(markdown.markdown(q)) for q in raw_questions]
+            # Generation runs on the AI workers; the page polls for the result
+            job = AIJob.objects.enqueue('questions', {
+                "course_name": selected_course.name, "topic": topic, "num_questions": num_questions
+            }, user=request.user)
+            return redirect(f"{reverse('generate_questions')}?job={job.pk}")
+
+    job = _user_job(request, 'questions', request.GET.get("job"))
+    questions = []
+    if job and job.status == AIJob.SUCCEEDED:
+        questions = [mark_safe(q) for q in job.result]
 
     return render(request, "dashboard/generate_question.html", {
-        "courses": courses_list, "questions": questions
+        "courses": courses_list, "questions": questions, "job": job
     })
 
 
 # =========================
 # AI: Library Resources
 # =========================
+@login_required
+@ai_source
 def library_resources(request):
     enrolled_courses = Course.objects.filter(
         offerings__enrollments__student=request.user,
         offerings__enrollments__is_active=True
     ).distinct()
 
-    resources, selected_course = [], None
+    resources, selected_course, job = [], None, None
     course_id = request.GET.get('course_id')
 
     if course_id:
         selected_course = get_object_or_404(Course, pk=course_id)
-        ai = AIService()
-        resources = ai.fetch_online_resources(course_name=selected_course.name, student=request.user)
+        resources = cached_course_resources(selected_course)
+        if resources is None:
+            job = _user_job(request, 'library', request.GET.get('job'))
+            if job is None or job.payload.get("course_id") != selected_course.pk:
+                # Not cached yet: look it up on the AI workers (or join the lookup
+                # already running for this course) and poll for it
+                job = AIJob.objects.enqueue_shared('library', {"course_id": selected_course.pk}, user=request.user)
+                return redirect(f"{reverse('library_resources')}?course_id={selected_course.pk}&job={job.pk}")
+            resources = job.result if job.status == AIJob.SUCCEEDED else []
 
     return render(request, 'dashboard/library.html', {
         'resources': resources, 'selected_course': selected_course,
-        'enrolled_courses': enrolled_courses
+        'enrolled_courses': enrolled_courses, 'job': job
     })
 
 
@@ -302,20 +617,75 @@ academic_ai = AcademicAIService()
 def academic_chat(request):
     return render(request, "academic_ai.html")
 
+def _parse_academic_guidance(ai_response_text):
+    try:
+        return json.loads(ai_response_text)
+    except Exception:
+        return [{
+            "title": "CUEA Guidance",
+            "description": ai_response_text,
+            "url": "https://www.cuea.edu"
+        }]
+
 @csrf_exempt
+@ai_source
+@ai_rate_limited(ACADEMIC_CHAT, ACADEMIC_FALLBACK)
 def academic_chat_ask(request):
     if request.method == "POST":
-        question = json.loads(request.body).get("message", "").strip()
-        ai_response_text = academic_ai.provide_guidance(question)
-        try:
-            responses = json.loads(ai_response_text)
-        except Exception:
-            responses = [{
-                "title": "CUEA Guidance",
-                "description": ai_response_text,
-                "url": "https://www.cuea.edu"
-            }]
-        return JsonResponse({"responses": responses})
+        question = _posted_message(request)
+        if question is None:
+            return _bad_message()
+        if not question:
+            return JsonResponse({"responses": []})
+        memory = ConversationMemory(request.session, "academic")
+        question, history, shortened = memory.prepare(question)
+        responses = _parse_academic_guidance(academic_ai.provide_guidance(question, history))
+        memory.record(question, responses)
+        return JsonResponse({"responses": _shortened_notice(shortened) + responses})
+
+@csrf_exempt
+@ai_source
+@ai_rate_limited(ACADEMIC_CHAT, ACADEMIC_FALLBACK)
+async def academic_chat_ask_async(request):
+    """ASGI variant: awaits Gemini without holding a worker thread."""
+    if request.method == "POST":
+        question = _posted_message(request)
+        if question is None:
+            return _bad_message()
+        if not question:
+            return JsonResponse({"responses": []})
+        memory = ConversationMemory(request.session, "academic")
+        question, history, shortened = await sync_to_async(memory.prepare)(question)
+        responses = _parse_academic_guidance(await academic_ai.aprovide_guidance(question, history))
+        await sync_to_async(memory.record)(question, responses)
+        return JsonResponse({"responses": _shortened_notice(shortened) + responses})
+
+    return JsonResponse({"responses": []})
+
+
+@csrf_exempt
+@ai_source
+@ai_rate_limited(ACADEMIC_CHAT, ACADEMIC_FALLBACK, stream=True)
+async def academic_chat_stream(request):
+    """Streams guidance cards to the browser as Gemini produces them."""
+    if request.method == "POST":
+        question = _posted_message(request)
+        if question is None:
+            return _bad_message()
+        if not question:
+            return _sse_response([])
+        memory = ConversationMemory(request.session, "academic")
+        question, history, shortened = await sync_to_async(memory.prepare)(question)
+        items = academic_ai.astream_guidance(question, history)
+        return _sse_response(await _remembered(request, memory, question, items, shortened))
+
+    return _sse_response([])
+
+
+@staff_member_required
+def academic_cache_stats(request):
+    """Hit/miss counters for the academic assistant's FAQ cache."""
+    return JsonResponse(faq_cache.stats())
 
 
 # =========================
@@ -327,21 +697,33 @@ timetable_ai = TimetableAIService()
 def my_timetable(request):
     return render(request, "dashboard/mytimetable.html", {"days": ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]})
 
+def _wants_explanation(request):
+    try:
+        return bool(json.loads(request.body or b"{}").get("explain"))
+    except ValueError:
+        return False
+
 @csrf_exempt
+@ai_source
 def generate_timetable(request):
     if request.method == "POST":
-        courses = [{
-            "code": e.course_offering.course.code,
-            "name": e.course_offering.course.name,
-            "credits": e.course_offering.course.credits
-        } for e in Enrollment.objects.filter(student=request.user, is_active=True)]
-
-        try:
-            timetable = json.loads(timetable_ai.create_timetable(courses))
-        except Exception:
-            timetable = {day: [] for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]}
-
-        return JsonResponse({"timetable": timetable})
+        timetable, conflicts = build_timetable(load_student_courses(request.user))
+
+        explanation = ""
+        if _wants_explanation(request):
+            explanation = timetable_ai.explain_timetable(timetable, conflicts)
+
+        return JsonResponse(timetable_payload(timetable, conflicts, explanation))
+
+@csrf_exempt
+@login_required
+def queue_timetable(request):
+    """Queues timetable generation on the AI workers; poll the returned result_url."""
+    if request.method == "POST":
+        job = AIJob.objects.enqueue('timetable', {"explain": _wants_explanation(request)}, user=request.user)
+        return JsonResponse(_job_status(job), status=202)
+
+    return JsonResponse({"timetable": {}})
 
 
 # =========================
@@ -0,0 +1,44 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import WaitlistEntry
+
+# Queue snapshots are invalidated on every change (see core/signals.py);
+# the TTL only bounds staleness if another process changed the queue and
+# the cache is per-process (see CACHES in settings).
+WAITLIST_CACHE_TTL = getattr(settings, "WAITLIST_CACHE_TTL", 30)
+
+
+def _key(offering_id):
+    return f"waitlist:{offering_id}"
+
+
+def waitlist_queue(offering_id):
+    """(student id, skipped reason) pairs waiting for the offering, in queue order (cached)."""
+    queue = cache.get(_key(offering_id))
+    if queue is None:
+        queue = list(
+            WaitlistEntry.objects.filter(offering_id=offering_id).order_by('id').values_list(
+                'student_id', 'skipped_reason'
+            )
+        )
+        cache.set(_key(offering_id), queue, WAITLIST_CACHE_TTL)
+    return queue
+
+
+def waitlist_position(offering_id, student_id):
+    """Returns (position, queue length); position is None when not queued."""
+    queue = [student for student, _ in waitlist_queue(offering_id)]
+    try:
+        return queue.index(student_id) + 1, len(queue)
+    except ValueError:
+        return None, len(queue)
+
+
+def waitlist_skipped_reason(offering_id, student_id):
+    """Why a queued student was passed over at the last promotion, or ""."""
+    return dict(waitlist_queue(offering_id)).get(student_id, "")
+
+
+def invalidate_waitlist(offering_id):
+    cache.delete(_key(offering_id))
@@ -3,6 +3,11 @@ ASGI config for portal project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve with an ASGI server (e.g. ``uvicorn portal.asgi:application`` or
+``gunicorn portal.asgi:application -k uvicorn.workers.UvicornWorker``) so
+the async chat and timetable views can hold many in-flight Gemini calls
+on a single event loop.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -14,21 +19,3 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'portal.settings')
 
 application = get_asgi_application()
-
-# project/asgi.py
-import os
-from django.core.asgi import get_asgi_application
-from channels.routing import ProtocolTypeRouter, URLRouter
-from channels.auth import AuthMiddlewareStack
-import core.routing
-
-os.environ.setdefault("DJANGO_SETTINGS_MODULE", "project.settings")
-
-application = ProtocolTypeRouter({
-    "http": get_asgi_application(),
-    "websocket": AuthMiddlewareStack(
-        URLRouter(
-            project.routing.websocket_urlpatterns
-        )
-    ),
-})
@@ -17,6 +17,8 @@ from dotenv import load_dotenv
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
+load_dotenv()
+
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.2/howto/deployment/checklist/
@@ -66,6 +68,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'core.context_processors.current_semester',
             ],
         },
     },
@@ -77,12 +80,80 @@ WSGI_APPLICATION = 'portal.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# PostgreSQL when POSTGRES_DB is set (production), SQLite otherwise (development).
+if os.getenv("POSTGRES_DB"):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv("POSTGRES_DB"),
+            'USER': os.getenv("POSTGRES_USER", "postgres"),
+            'PASSWORD': os.getenv("POSTGRES_PASSWORD", ""),
+            'HOST': os.getenv("POSTGRES_HOST", "localhost"),
+            'PORT': os.getenv("POSTGRES_PORT", "5432"),
+            'CONN_HEALTH_CHECKS': True,
+        }
     }
-}
+    if os.getenv("DB_POOL", "true").lower() in ("1", "true", "yes"):
+        # psycopg 3 connection pool; Django requires CONN_MAX_AGE = 0 with it
+        DATABASES['default']['OPTIONS'] = {
+            'pool': {
+                'min_size': int(os.getenv("DB_POOL_MIN_SIZE", 2)),
+                'max_size': int(os.getenv("DB_POOL_MAX_SIZE", 20)),
+                'timeout': float(os.getenv("DB_POOL_TIMEOUT", 10)),  # seconds to wait for a free connection
+            },
+        }
+    else:
+        # Persistent connections, e.g. behind an external pooler such as PgBouncer
+        DATABASES['default']['CONN_MAX_AGE'] = int(os.getenv("DB_CONN_MAX_AGE", 60))
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                # WAL lets readers run alongside the single writer; writers queue
+                # for the lock (up to "timeout" seconds) instead of failing at once
+                'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': int(os.getenv("SQLITE_BUSY_TIMEOUT", 20)),
+            },
+        }
+    }
+
+
+# Cache
+# Dashboard summaries, waitlist queues and the version key that tells other
+# workers to rebuild the prerequisite graph live here. Signals delete entries
+# on change, which only reaches every worker through a shared backend: Redis
+# when REDIS_URL is set, else the database cache table with PostgreSQL (run
+# "python manage.py createcachetable" once). Single-process SQLite development
+# keeps the per-process memory cache, so a second worker there would see
+# other workers' changes only when the short TTLs below run out.
+if os.getenv("REDIS_URL"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv("REDIS_URL"),
+        }
+    }
+elif os.getenv("POSTGRES_DB"):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'portal_cache',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+SHARED_CACHE = CACHES['default']['BACKEND'] != 'django.core.cache.backends.locmem.LocMemCache'
+
+# Seconds before a cached entry is re-read even without an invalidating change
+DASHBOARD_CACHE_TTL = int(os.getenv("DASHBOARD_CACHE_TTL", 300 if SHARED_CACHE else 30))
+WAITLIST_CACHE_TTL = int(os.getenv("WAITLIST_CACHE_TTL", 30 if SHARED_CACHE else 10))
 
 
 # Password validation
@@ -123,9 +194,39 @@ STATIC_URL = 'static/'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
-load_dotenv()
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+# How long AI library recommendations stay cached per course (seconds)
+LIBRARY_RESOURCE_CACHE_TTL = int(os.getenv("LIBRARY_RESOURCE_CACHE_TTL", 7 * 24 * 3600))
+
+# Local FAQ cache in front of the academic assistant
+FAQ_CACHE_THRESHOLD = float(os.getenv("FAQ_CACHE_THRESHOLD", 0.85))  # cosine similarity
+FAQ_CACHE_MAX_AGE = int(os.getenv("FAQ_CACHE_MAX_AGE", 24 * 3600))  # seconds
+FAQ_CACHE_MAX_ENTRIES = int(os.getenv("FAQ_CACHE_MAX_ENTRIES", 1000))
+
+# One JSON line per model call (tokens, latency, cost) from core.ai_metrics;
+# the same records are summed per day and feature into the AIUsage table
+AI_USAGE_FLUSH_INTERVAL = int(os.getenv("AI_USAGE_FLUSH_INTERVAL", 10))  # seconds
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'plain': {'format': '%(asctime)s %(levelname)s %(name)s %(message)s'},
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'plain'},
+    },
+    'loggers': {
+        'core': {'handlers': ['console'], 'level': os.getenv("CORE_LOG_LEVEL", "INFO")},
+        'core.ai_metrics': {'level': os.getenv("AI_USAGE_LOG_LEVEL", "INFO")},
+    },
+}
+
+# "program" bills a new fee account for the whole program up front; "semester"
+# bills registration up front and leaves the rest to charge_semester_fees
+FEE_BILLING = os.getenv("FEE_BILLING", "program")
+
 LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 